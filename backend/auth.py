@@ -1,21 +1,149 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from pydantic import BaseModel
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import User
+from database import SessionLocal, ReadSessionLocal
+from models import User, UserRole, RefreshToken
+import hashlib
 import os
+import secrets
+import time
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+# Zeitfenster, in dem eine erneute Einlösung als paralleler Request (z.B. zweiter Tab) gilt
+REFRESH_REUSE_GRACE_SECONDS = 10
+
+# Fester bcrypt-Hash (gleiche Kosten wie echte Hashes) für unbekannte Benutzernamen
+DUMMY_PASSWORD_HASH = "$2b$12$XkMcxiLx5d5aMBwZfSZu6OsY0yDqXeXQVP3wX0KGSU3YDkGlkQRyK"
+
+# bcrypt läuft in einem begrenzten Thread-Pool, damit der Event-Loop frei bleibt
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/token")
 
+# Verifizierte Benutzer werden kurz zwischengespeichert, um pro Request eine Abfrage zu sparen
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+PRINCIPAL_EPOCH_FILE = os.getenv("PRINCIPAL_EPOCH_FILE", "./data/principal_epoch")
+PRINCIPAL_CACHE_MAX_ENTRIES = 1000
+
+class Principal(BaseModel):
+    """
+    Benutzerdaten für Autorisierung, Statistiken und /users/me, unabhängig von einer DB-Session
+    """
+    id: int
+    username: str
+    email: str
+    full_name: str
+    role: UserRole
+    is_active: bool
+    # Spalten sind nullable; ein NULL darf die Anmeldung nicht verhindern
+    weekly_hours: Optional[float] = None
+    additional_hours: Optional[float] = None
+    work_days_per_week: Optional[int] = None
+    vacation_days_per_year: Optional[int] = None
+    
+    class Config:
+        from_attributes = True
+        frozen = True
+
+class PrincipalCache:
+    """
+    Cache für verifizierte Benutzer, Schlüssel (username, iat des Tokens)
+
+    Invalidierung gilt für alle Worker auf dem Host: invalidate() aktualisiert die
+    mtime der Epoch-Datei, jeder Worker prüft sie vor dem Lesen (ein stat-Aufruf)
+    und verwirft bei Änderung seinen Cache. Spätestens nach der TTL werden
+    Änderungen auch ohne Invalidierung wirksam.
+    """
+    
+    def __init__(self, ttl_seconds: int, epoch_file: str, max_entries: int = PRINCIPAL_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.epoch_file = epoch_file
+        self.max_entries = max_entries
+        self._entries = {}
+        self._epoch = self._read_epoch()
+    
+    def _read_epoch(self) -> Optional[int]:
+        try:
+            return os.stat(self.epoch_file).st_mtime_ns
+        except OSError:
+            return None
+    
+    def _check_epoch(self):
+        epoch = self._read_epoch()
+        if epoch != self._epoch:
+            self._entries.clear()
+            self._epoch = epoch
+    
+    def get(self, username: str, issued_at) -> Optional[Principal]:
+        if self.ttl_seconds <= 0:
+            return None
+        self._check_epoch()
+        entry = self._entries.get((username, issued_at))
+        if entry is None:
+            return None
+        expires_at, principal = entry
+        if expires_at < time.monotonic():
+            self._entries.pop((username, issued_at), None)
+            return None
+        return principal
+    
+    def set(self, username: str, issued_at, principal: Principal):
+        if self.ttl_seconds <= 0:
+            return
+        if len(self._entries) >= self.max_entries:
+            self._entries.clear()
+        self._entries[(username, issued_at)] = (time.monotonic() + self.ttl_seconds, principal)
+    
+    def invalidate(self):
+        """
+        Cache in allen Workern verwerfen (nach Deaktivierung, Löschung, Rollenänderung)
+        """
+        self._entries.clear()
+        try:
+            os.makedirs(os.path.dirname(self.epoch_file) or ".", exist_ok=True)
+            with open(self.epoch_file, "a"):
+                pass
+            os.utime(self.epoch_file, None)
+        except OSError:
+            pass
+        self._epoch = self._read_epoch()
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_TTL_SECONDS, PRINCIPAL_EPOCH_FILE)
+
+# Änderungen an diesen Feldern eines Benutzers invalidieren den Cache nach dem Commit
+PRINCIPAL_FIELDS = tuple(Principal.model_fields)
+
+@event.listens_for(User, "after_update")
+def mark_principal_update(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[field].history.has_changes() for field in PRINCIPAL_FIELDS):
+        state.session.info["principal_changed"] = True
+
+@event.listens_for(User, "after_delete")
+def mark_principal_delete(mapper, connection, target):
+    inspect(target).session.info["principal_changed"] = True
+
+@event.listens_for(SessionLocal, "after_commit")
+def invalidate_changed_principals(session):
+    if session.info.pop("principal_changed", False):
+        principal_cache.invalidate()
+
+@event.listens_for(SessionLocal, "after_rollback")
+def discard_principal_changes(session):
+    session.info.pop("principal_changed", None)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -23,12 +151,35 @@ def get_db():
     finally:
         db.close()
 
+def get_read_db():
+    """
+    Session für reine Lesezugriffe (Replikat, falls DATABASE_REPLICA_URL gesetzt ist)
+
+    Nur für Antworten, die weder gecacht noch per ETag bestätigt werden: Das
+    Replikat kann hinter einer gerade erfolgten Änderung zurückliegen.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def verify_password_limited(plain_password, hashed_password):
+    """
+    Passwortprüfung im bcrypt-Thread-Pool (für synchrone Endpoints: blockiert nur
+    den aufrufenden Thread, gleichzeitige Prüfungen bleiben begrenzt)
+    """
+    return password_executor.submit(verify_password, plain_password, hashed_password).result()
+
+def get_password_hash_limited(password):
+    return password_executor.submit(get_password_hash, password).result()
+
 def get_user(db: Session, username: str):
     return db.query(User).filter(User.username == username).first()
 
@@ -40,33 +191,134 @@ def authenticate_user(db: Session, username: str, password: str):
         return False
     return user
 
+def authenticate_user_limited(db: Session, username: str, password: str):
+    """
+    Wie authenticate_user, die Passwortprüfung läuft im bcrypt-Thread-Pool
+
+    Für unbekannte Benutzer wird gegen einen Dummy-Hash geprüft, damit die
+    Antwortzeit nicht verrät, ob der Benutzername existiert.
+    """
+    user = get_user(db, username)
+    if not user:
+        verify_password_limited(password, DUMMY_PASSWORD_HASH)
+        return False
+    if not verify_password_limited(password, user.hashed_password):
+        return False
+    return user
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def create_refresh_token(db: Session, user_id: int, family_id: Optional[str] = None) -> str:
+    """
+    Neues Refresh-Token anlegen (ohne Commit); ohne family_id beginnt eine neue Familie
+    """
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=hash_refresh_token(token),
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+def rotate_refresh_token(db: Session, token: str):
+    """
+    Refresh-Token einlösen und durch ein neues derselben Familie ersetzen
+
+    Wird ein bereits eingelöstes Token erneut verwendet (möglicher Diebstahl),
+    wird die gesamte Familie widerrufen.
+
+    Returns:
+        (user, neues Refresh-Token) oder None, wenn das Token ungültig ist
+    """
+    now = datetime.utcnow()
+    stored = db.query(RefreshToken).filter(RefreshToken.token_hash == hash_refresh_token(token)).first()
+    if stored is None or stored.expires_at < now:
+        return None
+    
+    if stored.revoked_at is not None:
+        if stored.revoked_at < now - timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS):
+            revoke_refresh_family(db, stored.family_id)
+            db.commit()
+        return None
+    
+    # Atomar einlösen - bei parallelem Einlösen gewinnt genau ein Request
+    redeemed = db.query(RefreshToken).filter(
+        RefreshToken.id == stored.id,
+        RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: now}, synchronize_session=False)
+    if redeemed != 1:
+        db.rollback()
+        return None
+    
+    user = db.query(User).filter(User.id == stored.user_id).first()
+    if user is None or not user.is_active:
+        revoke_refresh_family(db, stored.family_id)
+        db.commit()
+        return None
+    
+    new_token = create_refresh_token(db, user.id, stored.family_id)
+    db.commit()
+    return user, new_token
+
+def revoke_refresh_family(db: Session, family_id: str):
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at.is_(None)
+    ).update({RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+
+def purge_refresh_tokens(db: Session) -> int:
+    """
+    Abgelaufene Refresh-Tokens löschen
+    """
+    deleted = db.query(RefreshToken).filter(
+        RefreshToken.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def principal_from_token(db: Session, token: str) -> Optional[Principal]:
+    """
+    Benutzer zu einem Access-Token (aus dem Cache oder der Datenbank), None bei ungültigem Token
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    user = get_user(db, username=username)
-    if user is None:
-        raise credentials_exception
-    return user
+        return None
+    username: str = payload.get("sub")
+    if username is None:
+        return None
+    
+    issued_at = payload.get("iat")
+    principal = principal_cache.get(username, issued_at)
+    if principal is None:
+        user = get_user(db, username=username)
+        if user is None:
+            return None
+        principal = Principal.model_validate(user)
+        principal_cache.set(username, issued_at, principal)
+    return principal
+
+def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    principal = principal_from_token(db, token)
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
     if not current_user.is_active:
@@ -0,0 +1,60 @@
+"""
+Gemeinsame Umgebung der Prüfskripte (*_check.py)
+
+Die Prüfungen laufen ohne MySQL und ohne laufenden Server gegen eine frische
+SQLite-Datenbank in einem temporären Verzeichnis. isolated_environment() muss
+vor dem ersten Import von database bzw. main aufgerufen werden, weil die
+Engine beim Import angelegt wird. Benötigt httpx (wie der Lasttest).
+"""
+import os
+import tempfile
+
+DEFAULT_USERS = {"admin": "admin123", "leitung": "leitung123"}
+
+def isolated_environment(**overrides) -> str:
+    """
+    Umgebungsvariablen auf ein temporäres Verzeichnis setzen
+
+    Returns:
+        Das temporäre Verzeichnis
+    """
+    directory = tempfile.mkdtemp(prefix="kita-check-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'check.db')}"
+    os.environ["EXPORT_CACHE_DIR"] = os.path.join(directory, "export_cache")
+    os.environ["PRINCIPAL_EPOCH_FILE"] = os.path.join(directory, "principal_epoch")
+    os.environ["PROFILE_DIR"] = os.path.join(directory, "profiles")
+    os.environ.pop("DATABASE_REPLICA_URL", None)
+    os.environ.setdefault("PROMETHEUS_ENABLED", "false")
+    os.environ.update({name: str(value) for name, value in overrides.items()})
+    return directory
+
+def seed_reference_data(staff: int) -> dict:
+    """
+    Schema, Standardbenutzer und ein Jahr synthetischer Daten für staff Fachkräfte
+    """
+    from datetime import date
+    from migrate import ensure_schema
+    from seed_data import seed
+
+    ensure_schema()
+    return seed(staff, 1, date.today(), 42, "test1234", False)
+
+def app_client():
+    """
+    TestClient für die App (Startup-Hooks laufen einmal)
+    """
+    from fastapi.testclient import TestClient
+    import main
+
+    client = TestClient(main.app)
+    client.__enter__()
+    return client
+
+def login(client, username: str = "admin", password: str = None) -> dict:
+    response = client.post(
+        "/api/auth/token",
+        data={"username": username, "password": password or DEFAULT_USERS.get(username, "test1234")}
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"Login as {username} failed: {response.status_code} {response.text}")
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
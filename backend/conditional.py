@@ -0,0 +1,111 @@
+"""
+Bedingte Anfragen (ETag / If-None-Match, If-Match)
+
+Router binden eine eigene Abhängigkeit ein, die einen günstigen Versionsstempel
+für den abgefragten Bereich ermittelt (Anzahl, max(id), max(updated_at)) und
+damit check_conditional() aufruft. Stimmt das ETag mit If-None-Match überein,
+wird die Anfrage mit 304 beendet, bevor die eigentliche Abfrage läuft.
+
+Für Änderungen an versionierten Models (version_id_col) prüft check_if_match()
+die vom Client gesendete Version; das ORM-Update selbst läuft als
+UPDATE ... WHERE id=? AND version=? und schlägt bei paralleler Änderung fehl.
+"""
+import hashlib
+from typing import Optional
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import Integer, cast, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+
+def version_stamp(db: Session, model, *filters) -> tuple:
+    """
+    Versionsstempel für alle Zeilen eines Models, die den Filtern entsprechen
+
+    Anzahl erkennt Löschungen, max(id) neue Zeilen und max(updated_at) Änderungen.
+    Alles in einer Aggregat-Abfrage über den Index der Filter.
+    """
+    columns = [func.count(model.id), func.max(model.id), func.max(model.updated_at)]
+    if hasattr(model, "version"):
+        # Erkennt auch mehrere Änderungen innerhalb derselben Sekunde
+        columns.append(func.sum(model.version))
+    if hasattr(model, "is_locked"):
+        # Monatsabschluss setzt is_locked per Massen-Update ohne Versionserhöhung
+        columns.append(func.sum(cast(model.is_locked, Integer)))
+    return tuple(db.execute(select(*columns).where(*filters)).one())
+
+def make_etag(request: Request, *stamp) -> str:
+    """
+    Schwaches ETag aus Pfad, Query-Parametern und Versionsstempel
+    """
+    digest = hashlib.sha256()
+    digest.update(request.url.path.encode())
+    digest.update(str(sorted(request.query_params.multi_items())).encode())
+    digest.update(repr(stamp).encode())
+    return f'W/"{digest.hexdigest()[:32]}"'
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Vergleich ohne W/-Präfix (schwacher Vergleich nach RFC 9110)
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+def check_conditional(request: Request, response: Response, *stamp) -> str:
+    """
+    ETag und Cache-Control setzen, bei passendem If-None-Match mit 304 abbrechen
+
+    Antworten werden immer mit no-cache ausgeliefert: auch abgeschlossene Monate
+    können wieder geöffnet werden, der Browser fragt daher jedes Mal mit dem ETag nach.
+
+    Args:
+        stamp: Werte, die sich bei jeder relevanten Datenänderung ändern
+            (inkl. Benutzer, falls die Antwort benutzerabhängig ist)
+
+    Returns:
+        Das berechnete ETag
+    """
+    etag = make_etag(request, *stamp)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        raise HTTPException(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return etag
+
+def version_etag(version: int) -> str:
+    return f'"{version}"'
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """
+    Version aus If-Match lesen (None, wenn kein Header oder "*")
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    value = if_match.strip().removeprefix("W/").strip('"')
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
+
+def check_if_match(if_match: Optional[str], version: int, detail: str):
+    """
+    412, wenn die im If-Match gesendete Version nicht mehr aktuell ist
+    """
+    expected = parse_if_match(if_match)
+    if expected is not None and expected != version:
+        raise HTTPException(
+            status_code=412,
+            detail=detail,
+            headers={"ETag": version_etag(version)}
+        )
+
+def flush_versioned(db: Session, detail: str):
+    """
+    Änderungen schreiben; eine zwischenzeitlich geänderte Version ergibt 412
+    """
+    try:
+        db.flush()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=412, detail=detail)
@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy import exc as sa_exc
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 import os
 import logging
+import threading
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -18,18 +22,199 @@ if not DATABASE_URL:
 else:
     logger.info(f"Using database: {DATABASE_URL.split('@')[0]}@***")
 
-# Create engine with appropriate settings
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False}  # Needed for SQLite
-    )
-else:
-    engine = create_engine(
-        DATABASE_URL,
+# Pool-Einstellungen für MySQL
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+
+# SQLite-Einstellungen (Fallback ohne DATABASE_URL)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+SQLITE_CACHE_SIZE_KB = 64 * 1024
+
+# Optionales Lese-Replikat für Statistiken und ungecachte Exporte
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+
+class PoolStats:
+    """
+    Zähler eines Connection-Pools, Änderungen unter einer Sperre (Checkouts aus vielen Threads)
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "timeouts": 0,
+        }
+    
+    def record_checkout(self, waited: float):
+        with self._lock:
+            self._values["checkouts"] += 1
+            if waited > 0:
+                self._values["waits"] += 1
+                self._values["wait_seconds_total"] += waited
+                self._values["wait_seconds_max"] = max(self._values["wait_seconds_max"], waited)
+    
+    def record_timeout(self):
+        with self._lock:
+            self._values["timeouts"] += 1
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool, der Checkouts, Wartezeiten und Timeouts mitzählt
+
+    Gemessen wird nur die Zeit, die ein Checkout in der Warteschlange des Pools
+    auf eine freie Verbindung blockiert (Condition.wait), nicht der Aufbau neuer
+    Verbindungen.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        self._checkout = threading.local()
+        
+        condition_wait = self._pool.not_empty.wait
+        def timed_wait(timeout=None):
+            started = time.perf_counter()
+            try:
+                return condition_wait(timeout)
+            finally:
+                self._checkout.waited += time.perf_counter() - started
+        self._pool.not_empty.wait = timed_wait
+    
+    def _do_get(self):
+        # QueuePool._do_get ruft sich bei Bedarf selbst auf - nur den äußersten Aufruf zählen
+        if getattr(self._checkout, "active", False):
+            return super()._do_get()
+        
+        self._checkout.active = True
+        self._checkout.waited = 0.0
+        try:
+            connection = super()._do_get()
+        except sa_exc.TimeoutError:
+            self.stats.record_timeout()
+            raise
+        finally:
+            self._checkout.active = False
+        self.stats.record_checkout(self._checkout.waited)
+        return connection
+    
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+def _sqlite_date_part(start: int, end: int):
+    """
+    MySQL-Datumsfunktion (YEAR, MONTH) für SQLite, Datumswerte sind ISO-Strings
+    """
+    def date_part(value):
+        return int(value[start:end]) if value else None
+    return date_part
+
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """
+    Pragmas für den SQLite-Betrieb mit mehreren Workern
+
+    WAL erlaubt Lesen parallel zum Schreiben, busy_timeout lässt wartende
+    Schreiber warten statt sofort mit "database is locked" abzubrechen.
+    year() und month() fehlen in SQLite, Statistiken und Monatsabschlüsse
+    verwenden sie über func.year/func.month.
+    """
+    dbapi_connection.create_function("year", 1, _sqlite_date_part(0, 4), deterministic=True)
+    dbapi_connection.create_function("month", 1, _sqlite_date_part(5, 7), deterministic=True)
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.close()
+
+def create_database_engine(url: str):
+    """Engine mit den passenden Einstellungen für SQLite bzw. MySQL erzeugen"""
+    if url.startswith("sqlite"):
+        sqlite_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False}  # Needed for SQLite
+        )
+        event.listen(sqlite_engine, "connect", configure_sqlite_connection)
+        return sqlite_engine
+    return create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
         pool_pre_ping=True,  # Verify connections before use
-        pool_recycle=3600    # Recycle connections every hour
+        pool_recycle=DB_POOL_RECYCLE
     )
 
+def pool_status(engine) -> dict:
+    """
+    Aktueller Zustand und Zähler des Connection-Pools
+    """
+    pool = engine.pool
+    status = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        status.update(pool.stats.snapshot())
+    return status
+
+# Create engine with appropriate settings
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+engine = create_database_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+
+if DATABASE_REPLICA_URL:
+    logger.info(f"Using read replica: {DATABASE_REPLICA_URL.split('@')[0]}@***")
+    replica_engine = create_database_engine(DATABASE_REPLICA_URL)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+else:
+    replica_engine = None
+    ReadSessionLocal = SessionLocal
+
+Base = declarative_base()
+
+def add_missing_columns(metadata):
+    """
+    Neue Spalten zu bestehenden Tabellen hinzufügen (create_all legt nur neue Tabellen an)
+
+    Neue Spalten werden nullable angelegt, ein server_default wird übernommen.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                
+                column_type = column.type.compile(dialect=engine.dialect)
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    ddl += f" DEFAULT {default.text}" if hasattr(default, "text") else f" DEFAULT '{default}'"
+                connection.execute(text(ddl))
+                logger.info(f"Added column {table.name}.{column.name}")
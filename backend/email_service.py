@@ -7,7 +7,6 @@ from email import encoders
 from typing import List, Optional
 from datetime import datetime, date
 import os
-from jinja2 import Template
 import logging
 
 logger = logging.getLogger(__name__)
@@ -102,6 +101,8 @@ class EmailService:
         """
         Benachrichtigung über Monatsabschluss senden
         """
+        from jinja2 import Template
+        
         month_names = [
             "Januar", "Februar", "März", "April", "Mai", "Juni",
             "Juli", "August", "September", "Oktober", "November", "Dezember"
@@ -214,6 +215,8 @@ class EmailService:
         """
         Erinnerung vor Monatsabschluss senden
         """
+        from jinja2 import Template
+        
         month_names = [
             "Januar", "Februar", "März", "April", "Mai", "Juni",
             "Juli", "August", "September", "Oktober", "November", "Dezember"
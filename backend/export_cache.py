@@ -0,0 +1,363 @@
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+import time
+import logging
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from models import User, TimeEntry, MonthlyLock
+
+logger = logging.getLogger(__name__)
+
+class ExportCache:
+    """
+    Dateibasierter Cache für Exporte vollständig abgeschlossener Monate.
+
+    Abgeschlossene Monate (MonthlyLock) ändern sich nicht mehr, daher kann das
+    fertige Export-Artefakt wiederverwendet werden. Der Schlüssel ist ein Hash über
+    Export-Typ, Zeitraum, Benutzer, Format und den Sperrstatus. Jedes Artefakt
+    liegt als Datei neben einer JSON-Metadatei, damit alle Worker denselben
+    Cache nutzen können.
+
+    Leitung und Admin dürfen auch gesperrte Monate noch ändern. Je Monat und
+    Benutzer gibt es daher eine Generation (generations/<user>-<jahr>-<monat>),
+    die invalidate() neu setzt. Ein Export merkt sich die Generationen vor
+    seiner Abfrage und wird nicht gespeichert, wenn sich eine davon geändert
+    hat. Unter scopes/<user>-<jahr>-<monat>/ liegt je Artefakt eine leere
+    Markierungsdatei, damit invalidate() nur die Artefakte dieses Monats anfasst.
+
+    Treffer werden als Hardlink unter serving/ ausgeliefert (FileResponse). Eine
+    gleichzeitige Verdrängung entfernt nur den Cache-Eintrag, der Link hält die
+    Daten bis zum Ende der Auslieferung.
+    """
+
+    def __init__(self):
+        self.cache_dir = os.getenv("EXPORT_CACHE_DIR", "./data/export_cache")
+        self.max_bytes = int(os.getenv("EXPORT_CACHE_MAX_MB", "200")) * 1024 * 1024
+        self.enabled = os.getenv("EXPORT_CACHE_ENABLED", "true").lower() == "true"
+
+    def lock_state(
+        self,
+        db: Session,
+        start_date: date,
+        end_date: date,
+        user_ids: Optional[List[int]] = None
+    ) -> Optional[List[Tuple[int, int, int, int]]]:
+        """
+        Sperrstatus für einen Zeitraum ermitteln
+
+        Returns:
+            Sortierte Liste von (user_id, year, month, lock_id), wenn jeder Monat
+            im Zeitraum für alle betroffenen Benutzer gesperrt ist, sonst None
+        """
+        if start_date > end_date:
+            return None
+
+        months = set()
+        year, month = start_date.year, start_date.month
+        while (year, month) <= (end_date.year, end_date.month):
+            months.add((year, month))
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+        if user_ids:
+            relevant_users = set(user_ids)
+        else:
+            # Aktive Benutzer könnten noch Einträge anlegen, inaktive nur mit vorhandenen Einträgen
+            relevant_users = {
+                user_id for (user_id,) in db.query(User.id).filter(User.is_active == True).all()
+            }
+            relevant_users |= {
+                user_id for (user_id,) in db.query(TimeEntry.user_id).filter(
+                    TimeEntry.date >= start_date,
+                    TimeEntry.date <= end_date
+                ).distinct().all()
+            }
+
+        if not relevant_users:
+            return None
+
+        locks = db.query(
+            MonthlyLock.user_id, MonthlyLock.year, MonthlyLock.month, MonthlyLock.id
+        ).filter(
+            MonthlyLock.user_id.in_(relevant_users),
+            MonthlyLock.year >= start_date.year,
+            MonthlyLock.year <= end_date.year
+        ).all()
+
+        state = sorted(
+            (lock.user_id, lock.year, lock.month, lock.id)
+            for lock in locks
+            if (lock.year, lock.month) in months
+        )
+        locked = {(user_id, year, month) for user_id, year, month, _ in state}
+
+        for user_id in relevant_users:
+            for year, month in months:
+                if (user_id, year, month) not in locked:
+                    return None
+
+        return state
+
+    def make_key(
+        self,
+        export_type: str,
+        start_date: date,
+        end_date: date,
+        user_ids: Optional[List[int]],
+        export_format: str,
+        lock_state: List[Tuple[int, int, int, int]]
+    ) -> str:
+        """
+        Inhaltsadressierten Cache-Schlüssel erzeugen
+        """
+        payload = json.dumps({
+            "export_type": export_type,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "user_ids": sorted(user_ids) if user_ids else None,
+            "format": export_format,
+            "locks": lock_state
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.cache_dir, key)
+        return base + ".bin", base + ".json"
+
+    def _scope_name(self, user_id: int, year: int, month: int) -> str:
+        return f"{user_id}-{year}-{month}"
+
+    def _generation_path(self, user_id: int, year: int, month: int) -> str:
+        return os.path.join(self.cache_dir, "generations", self._scope_name(user_id, year, month))
+
+    def _scope_dir(self, user_id: int, year: int, month: int) -> str:
+        return os.path.join(self.cache_dir, "scopes", self._scope_name(user_id, year, month))
+
+    def _read_generation(self, user_id: int, year: int, month: int) -> str:
+        try:
+            with open(self._generation_path(user_id, year, month), "r", encoding="utf-8") as generation_file:
+                return generation_file.read()
+        except OSError:
+            return ""
+
+    def generations(self, lock_state: List[Tuple[int, int, int, int]]) -> Dict[str, str]:
+        """
+        Generationen der Monate eines Exports, vor der Datenabfrage zu ermitteln
+        """
+        return {
+            self._scope_name(user_id, year, month): self._read_generation(user_id, year, month)
+            for user_id, year, month, _ in lock_state
+        }
+
+    def get(self, key: str) -> Optional[Tuple[str, dict]]:
+        """
+        Artefakt aus dem Cache holen
+
+        Returns:
+            (Pfad eines eigenen Hardlinks, Metadaten) bei Treffer, sonst None.
+            Der Aufrufer entfernt den Link nach der Auslieferung (release).
+        """
+        if not self.enabled:
+            return None
+
+        data_path, meta_path = self._paths(key)
+        serving_path = os.path.join(
+            self.cache_dir, "serving", f"{int(time.time())}-{secrets.token_hex(8)}.bin"
+        )
+        try:
+            with open(meta_path, "r", encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            os.makedirs(os.path.dirname(serving_path), exist_ok=True)
+            os.link(data_path, serving_path)
+        except (OSError, ValueError):
+            return None
+
+        # Zugriffszeit für LRU-Verdrängung aktualisieren
+        try:
+            os.utime(data_path)
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return serving_path, meta
+
+    def release(self, serving_path: str):
+        """
+        Hardlink eines ausgelieferten Treffers entfernen
+        """
+        try:
+            os.remove(serving_path)
+        except OSError:
+            pass
+
+    def store(
+        self,
+        key: str,
+        content: bytes,
+        filename: str,
+        media_type: str,
+        lock_state: List[Tuple[int, int, int, int]],
+        generations: Dict[str, str]
+    ) -> bool:
+        """
+        Artefakt atomar im Cache ablegen
+
+        Args:
+            generations: Ergebnis von generations() vor der Datenabfrage
+
+        Returns:
+            True, wenn das Artefakt gespeichert wurde
+        """
+        if not self.enabled or len(content) > self.max_bytes:
+            return False
+
+        data_path, meta_path = self._paths(key)
+        months = sorted({(user_id, year, month) for user_id, year, month, _ in lock_state})
+        meta = {
+            "filename": filename,
+            "media_type": media_type,
+            "size": len(content),
+            "months": months
+        }
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._write_atomic(data_path, content)
+            # Markierungen vor der Generationsprüfung: Ein invalidate() danach findet das Artefakt
+            for user_id, year, month in months:
+                scope_dir = self._scope_dir(user_id, year, month)
+                os.makedirs(scope_dir, exist_ok=True)
+                open(os.path.join(scope_dir, key), "wb").close()
+            # Metadaten zuletzt schreiben - erst dann gilt der Eintrag als vorhanden
+            self._write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"Export cache write failed: {str(e)}")
+            self._remove(key)
+            return False
+
+        # Während der Abfrage geändert (invalidate dazwischen) - Ergebnis kann veraltet sein
+        if self.generations(lock_state) != generations:
+            self._remove(key)
+            return False
+
+        self.evict()
+        return True
+
+    def _write_atomic(self, path: str, content: bytes):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(content)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return entries
+
+        for name in names:
+            if not name.endswith(".bin"):
+                continue
+            key = name[:-4]
+            data_path, _ = self._paths(key)
+            try:
+                stat = os.stat(data_path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, key))
+        return entries
+
+    def _remove(self, key: str):
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as meta_file:
+                months = json.load(meta_file).get("months", [])
+        except (OSError, ValueError):
+            months = []
+
+        paths = [meta_path, data_path]
+        paths += [os.path.join(self._scope_dir(user_id, year, month), key) for user_id, year, month in months]
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """
+        Am längsten nicht genutzte Artefakte entfernen, bis das Größenlimit eingehalten wird
+        """
+        self._remove_stale_links()
+        entries = sorted(self._entries())
+        total_size = sum(size for _, size, _ in entries)
+
+        for _, size, key in entries:
+            if total_size <= self.max_bytes:
+                break
+            self._remove(key)
+            total_size -= size
+
+    def _remove_stale_links(self, max_age: int = 3600):
+        """
+        Hardlinks abgebrochener Auslieferungen (z.B. Worker beendet) entfernen
+        """
+        serving_dir = os.path.join(self.cache_dir, "serving")
+        try:
+            names = os.listdir(serving_dir)
+        except OSError:
+            return
+        cutoff = time.time() - max_age
+        for name in names:
+            created, _, _ = name.partition("-")
+            if created.isdigit() and int(created) < cutoff:
+                self.release(os.path.join(serving_dir, name))
+
+    def invalidate(self, user_id: int, year: int, month: int) -> int:
+        """
+        Alle Artefakte entfernen, die einen Monat eines Benutzers enthalten
+
+        Die Generation wird vor dem Entfernen neu gesetzt, so dass auch ein
+        gerade laufender Export dieses Monats nicht mehr gespeichert wird.
+
+        Returns:
+            Anzahl entfernter Artefakte
+        """
+        try:
+            os.makedirs(os.path.join(self.cache_dir, "generations"), exist_ok=True)
+            self._write_atomic(
+                self._generation_path(user_id, year, month),
+                secrets.token_hex(8).encode("utf-8")
+            )
+        except OSError as e:
+            logger.warning(f"Export cache generation update failed: {str(e)}")
+
+        scope_dir = self._scope_dir(user_id, year, month)
+        try:
+            keys = os.listdir(scope_dir)
+        except OSError:
+            keys = []
+
+        removed = 0
+        for key in keys:
+            if os.path.exists(self._paths(key)[0]):
+                removed += 1
+            self._remove(key)
+            try:
+                os.remove(os.path.join(scope_dir, key))
+            except OSError:
+                pass
+
+        if removed:
+            logger.info(f"Export cache: {removed} artifacts invalidated for user {user_id} {month}/{year}")
+        return removed
+
+# Globale Export-Cache-Instanz
+export_cache = ExportCache()
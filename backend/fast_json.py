@@ -0,0 +1,57 @@
+"""
+Schneller Lesepfad für große Listen-Endpoints
+
+Statt ORM-Objekte zu laden und jedes einzeln über ein from_attributes-Model zu
+validieren, lesen die Endpoints nur die Spalten ihres Antwort-Models per
+Core-select() und serialisieren die Zeilen direkt. Das Antwort-Model steht nur
+in responses= (OpenAPI-Schema), nicht als response_model: Die Zeilen werden
+nicht dagegen validiert. Ein TypeAdapter(List[Model]) je Endpoint wäre genau
+diese Validierung und braucht für 4.000 Kinderanzahl-Zeilen rund 35-40 ms statt
+rund 5 ms mit orjson.
+
+FastJSONResponse ist die default_response_class der App. Sie nutzt orjson,
+falls installiert, sonst pydantic-core über einen vorab erzeugten TypeAdapter;
+beide serialisieren date, datetime und Enums. Endpoints mit response_model
+serialisiert FastAPI damit über Python-Objekte statt direkt über pydantic
+(dump_json), das kostet rund 50 µs je 100 Einträge.
+"""
+from typing import Any
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_json_adapter = TypeAdapter(Any)
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return _json_adapter.dump_json(content)
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON-Antwort für bereits JSON-fähige Inhalte (dict, list, date, Enum)
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def response_columns(model, response_model) -> list:
+    """
+    Spalten eines ORM-Models in der Feldreihenfolge des Antwort-Models
+    """
+    return [getattr(model, name) for name in response_model.model_fields]
+
+def rows_response(result, response: Response) -> FastJSONResponse:
+    """
+    Ergebnis eines Core-select() als Liste von Objekten
+
+    Header, die Abhängigkeiten gesetzt haben (ETag, Cache-Control), werden übernommen.
+    """
+    keys = list(result.keys())
+    items = [dict(zip(keys, row)) for row in result]
+    return FastJSONResponse(content=items, headers=dict(response.headers))
@@ -0,0 +1,257 @@
+"""
+Idempotency-Key für Schreib-Requests
+
+Mobile Clients wiederholen POST/PUT bei schlechter Verbindung. Trägt der Request
+einen Idempotency-Key-Header, wird der Schlüssel (pro Benutzer) in der Tabelle
+idempotency_keys reserviert und eine erfolgreiche Antwort (2xx) samt Headern
+dort gespeichert. Eine Wiederholung mit demselben Schlüssel liefert die
+gespeicherte Antwort, ohne den Endpoint erneut auszuführen. Bei Fehlern wird
+die Reservierung freigegeben, damit der Client es erneut versuchen kann. Da der
+Speicher in der Datenbank liegt, gilt das auch über mehrere Worker hinweg; der
+Unique-Constraint entscheidet bei gleichzeitigen Requests, welcher ausgeführt
+wird.
+
+Endet ein Worker zwischen dem Commit des Endpoints und dem Speichern der
+Antwort, bleibt die Reservierung offen. Nach PROCESSING_TIMEOUT_SECONDS ist ihr
+Ausgang unbekannt: Wiederholungen erhalten 409 statt den Endpoint ein zweites
+Mal auszuführen, der Client muss mit einem neuen Schlüssel prüfen und senden.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.base import BaseHTTPMiddleware
+from database import SessionLocal
+from models import IdempotencyKey
+from auth import SECRET_KEY, ALGORITHM
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENT_METHODS = {"POST", "PUT", "PATCH"}
+MAX_KEY_LENGTH = 255
+
+# Gespeicherte Antworten werden so lange wiederholt
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# Reservierung eines abgebrochenen Requests (z.B. Worker-Neustart) gilt danach als unbekannt
+PROCESSING_TIMEOUT_SECONDS = 60
+# Werden bei der Wiederholung aus dem gespeicherten Inhalt neu gebildet
+UNSTORED_HEADERS = {"content-length", "content-type"}
+
+def request_scope(request: Request) -> Optional[str]:
+    """
+    Benutzername aus dem Bearer-Token (None bei fehlendem/ungültigem Token)
+    """
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
+def request_fingerprint(request: Request, body: bytes) -> str:
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.url.path.encode())
+    digest.update(request.url.query.encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+def purge_idempotency_keys(db: Session) -> int:
+    """
+    Abgelaufene Schlüssel löschen
+
+    Offene Reservierungen bleiben so lange wie gespeicherte Antworten erhalten,
+    sonst würde eine späte Wiederholung den Endpoint doch noch einmal ausführen.
+    """
+    now = datetime.utcnow()
+    deleted = db.query(IdempotencyKey).filter(or_(
+        and_(IdempotencyKey.status_code.isnot(None), IdempotencyKey.expires_at < now),
+        IdempotencyKey.expires_at < now - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    )).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def claim_key(db: Session, scope: str, key: str, request_hash: str) -> Optional[Response]:
+    """
+    Schlüssel reservieren
+
+    Returns:
+        None, wenn der Request ausgeführt werden soll, sonst die Antwort
+        (gespeicherte Antwort, 409 bei laufendem oder abgebrochenem Request,
+        422 bei anderem Inhalt)
+    """
+    for _ in range(2):
+        now = datetime.utcnow()
+        db.add(IdempotencyKey(
+            scope=scope,
+            key=key,
+            request_hash=request_hash,
+            expires_at=now + timedelta(seconds=PROCESSING_TIMEOUT_SECONDS)
+        ))
+        try:
+            db.commit()
+            return None
+        except IntegrityError:
+            db.rollback()
+
+        existing = db.query(IdempotencyKey).filter(
+            IdempotencyKey.scope == scope,
+            IdempotencyKey.key == key
+        ).first()
+        if existing is None:
+            # Zwischenzeitlich freigegeben - erneut versuchen
+            continue
+
+        if existing.status_code is not None and existing.expires_at < now:
+            # Gespeicherte Antwort abgelaufen: atomar entfernen und neu reservieren
+            db.query(IdempotencyKey).filter(
+                IdempotencyKey.status_code.isnot(None),
+                IdempotencyKey.id == existing.id,
+                IdempotencyKey.expires_at < now
+            ).delete(synchronize_session=False)
+            db.commit()
+            continue
+
+        if existing.request_hash != request_hash:
+            return JSONResponse(
+                status_code=422,
+                content={"detail": "Idempotency-Key was already used for a different request"}
+            )
+
+        if existing.status_code is None and existing.expires_at < now:
+            # Abgebrochen - der Endpoint kann seine Änderung schon festgeschrieben haben
+            return JSONResponse(
+                status_code=409,
+                content={"detail": "The request with this Idempotency-Key was interrupted and its outcome is unknown"}
+            )
+
+        if existing.status_code is None:
+            return JSONResponse(
+                status_code=409,
+                content={"detail": "A request with this Idempotency-Key is still in progress"},
+                headers={"Retry-After": "1"}
+            )
+
+        replay = Response(
+            content=existing.response_body,
+            status_code=existing.status_code,
+            media_type=existing.media_type
+        )
+        headers = json.loads(existing.response_headers) if existing.response_headers else []
+        if isinstance(headers, dict):  # Format vor der Speicherung als Liste
+            headers = list(headers.items())
+        replay.raw_headers += [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+        replay.raw_headers.append((b"idempotent-replayed", b"true"))
+        return replay
+
+    return JSONResponse(
+        status_code=409,
+        content={"detail": "A request with this Idempotency-Key is still in progress"},
+        headers={"Retry-After": "1"}
+    )
+
+def store_response(db: Session, scope: str, key: str, status_code: int, body: bytes, raw_headers: list):
+    """
+    Antwort speichern, Header als Liste von Paaren (mehrfache Header wie Set-Cookie)
+    """
+    try:
+        response_body = body.decode("utf-8")
+    except UnicodeDecodeError:
+        release_key(db, scope, key)
+        return
+
+    headers = [(name.decode("latin-1").lower(), value.decode("latin-1")) for name, value in raw_headers]
+    media_type = next((value for name, value in headers if name == "content-type"), None)
+
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.scope == scope,
+        IdempotencyKey.key == key
+    ).update({
+        IdempotencyKey.status_code: status_code,
+        IdempotencyKey.response_body: response_body,
+        IdempotencyKey.media_type: media_type,
+        IdempotencyKey.response_headers: json.dumps(
+            [[name, value] for name, value in headers if name not in UNSTORED_HEADERS]
+        ),
+        IdempotencyKey.expires_at: datetime.utcnow() + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    }, synchronize_session=False)
+    db.commit()
+
+def release_key(db: Session, scope: str, key: str):
+    """
+    Reservierung freigeben, damit der Client es erneut versuchen kann
+    """
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.scope == scope,
+        IdempotencyKey.key == key
+    ).delete(synchronize_session=False)
+    db.commit()
+
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    """
+    Idempotency-Key für POST/PUT/PATCH unterhalb der angegebenen Pfade
+    """
+
+    def __init__(self, app, path_prefixes: Iterable[str]):
+        super().__init__(app)
+        self.path_prefixes = tuple(path_prefixes)
+
+    async def dispatch(self, request: Request, call_next):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if (
+            not key
+            or request.method not in IDEMPOTENT_METHODS
+            or not request.url.path.startswith(self.path_prefixes)
+        ):
+            return await call_next(request)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return JSONResponse(status_code=400, content={"detail": "Idempotency-Key is too long"})
+
+        scope = request_scope(request)
+        if scope is None:
+            # Nicht angemeldet - der Endpoint antwortet mit 401
+            return await call_next(request)
+
+        body = await request.body()
+        request_hash = request_fingerprint(request, body)
+
+        # Datenbankzugriffe im Thread-Pool, damit der Event-Loop nicht blockiert
+        db = SessionLocal()
+        try:
+            stored = await run_in_threadpool(claim_key, db, scope, key, request_hash)
+            if stored is not None:
+                return stored
+
+            try:
+                response = await call_next(request)
+                content = b"".join([chunk async for chunk in response.body_iterator])
+            except Exception:
+                await run_in_threadpool(release_key, db, scope, key)
+                raise
+
+            if 200 <= response.status_code < 300:
+                await run_in_threadpool(
+                    store_response, db, scope, key, response.status_code, content,
+                    response.raw_headers
+                )
+            else:
+                # Fehler nicht festschreiben (z.B. 412 oder 423 hängen vom Zustand ab),
+                # die Wiederholung soll erneut ausgeführt werden
+                await run_in_threadpool(release_key, db, scope, key)
+
+            passthrough = Response(content=content, status_code=response.status_code)
+            passthrough.raw_headers = list(response.raw_headers)
+            return passthrough
+        finally:
+            db.close()
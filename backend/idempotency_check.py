@@ -0,0 +1,177 @@
+"""
+Regressionsprüfung für Idempotency-Key
+
+    python idempotency_check.py
+
+Schickt CONCURRENT_REQUESTS gleichzeitige Wiederholungen desselben POST bzw.
+PUT mit einem Idempotency-Key gegen eine temporäre SQLite-Datenbank. Geprüft
+wird, dass der Endpoint genau einmal ausgeführt wird, Wiederholungen die
+gespeicherte Antwort samt ETag und mehrfachen Headern liefern, Fehlerantworten
+nicht gespeichert werden und eine abgebrochene Reservierung nicht erneut
+ausgeführt wird. Exit-Code 1 bei Abweichungen.
+"""
+import asyncio
+import os
+import sys
+import uuid
+from datetime import date
+import httpx
+from check_support import isolated_environment, seed_reference_data, app_client, login
+
+CONCURRENT_REQUESTS = int(os.getenv("IDEMPOTENCY_CHECK_REQUESTS", "50"))
+
+def send_concurrently(client, method: str, url: str, **kwargs) -> list:
+    """
+    Requests gleichzeitig im Event-Loop des TestClients ausführen
+
+    TestClient.request arbeitet Requests nacheinander ab, daher direkt über ASGI.
+    """
+    async def send_all():
+        transport = httpx.ASGITransport(app=client.app)
+        async with httpx.AsyncClient(transport=transport, base_url=str(client.base_url)) as concurrent:
+            return await asyncio.gather(*(
+                concurrent.request(method, url, **kwargs) for _ in range(CONCURRENT_REQUESTS)
+            ))
+
+    return client.portal.call(send_all)
+
+def check_responses(description: str, responses: list, failures: list) -> list:
+    """
+    Nur 2xx mit identischem Inhalt oder 409 (läuft noch) sind erlaubt
+
+    Returns:
+        Die erfolgreichen Antworten
+    """
+    succeeded = [response for response in responses if response.status_code == 200]
+    in_progress = [response for response in responses if response.status_code == 409]
+    other = sorted({response.status_code for response in responses} - {200, 409})
+    print(f"{description}: {len(succeeded)}x 200, {len(in_progress)}x 409")
+    if other:
+        failures.append(f"{description}: unexpected status {other}")
+    if not succeeded:
+        failures.append(f"{description}: no request succeeded")
+    if len({response.content for response in succeeded}) > 1:
+        failures.append(f"{description}: replayed bodies differ")
+    if any("retry-after" not in response.headers for response in in_progress):
+        failures.append(f"{description}: 409 without Retry-After")
+    return succeeded
+
+def check_interrupted(client, headers: dict, body: dict, failures: list):
+    """
+    Abgebrochene Reservierung (Worker beendet nach dem Commit des Endpoints): 409, keine zweite Ausführung
+    """
+    from datetime import datetime, timedelta
+    from database import SessionLocal
+    from idempotency import request_fingerprint
+    from models import IdempotencyKey
+    from starlette.requests import Request
+
+    key = uuid.uuid4().hex
+    body = {**body, "description": f"Abgebrochen {key[:8]}"}
+    request = client.build_request("POST", "/api/time-entries/", json=body)
+    fingerprint = request_fingerprint(
+        Request({"type": "http", "method": "POST", "path": request.url.path, "query_string": b"", "headers": []}),
+        request.content
+    )
+    db = SessionLocal()
+    db.add(IdempotencyKey(
+        scope="fachkraft001", key=key, request_hash=fingerprint,
+        expires_at=datetime.utcnow() - timedelta(seconds=1)
+    ))
+    db.commit()
+    db.close()
+
+    retry = client.post("/api/time-entries/", json=body, headers={**headers, "Idempotency-Key": key})
+    print(f"POST after interrupted reservation: {retry.status_code}")
+    if retry.status_code != 409:
+        failures.append(f"POST after interrupted reservation: status {retry.status_code}, expected 409")
+
+def check_repeated_headers(failures: list):
+    """
+    Mehrfache Header (Set-Cookie) werden vollständig gespeichert und wiederholt
+    """
+    from database import SessionLocal
+    from idempotency import claim_key, store_response
+
+    key = uuid.uuid4().hex
+    raw_headers = [
+        (b"content-type", b"application/json"), (b"set-cookie", b"a=1"), (b"set-cookie", b"b=2"), (b"etag", b'"3"')
+    ]
+    db = SessionLocal()
+    try:
+        claim_key(db, "check", key, "hash")
+        store_response(db, "check", key, 200, b"{}", raw_headers)
+        replay = claim_key(db, "check", key, "hash")
+    finally:
+        db.close()
+    cookies = [value for name, value in replay.raw_headers if name == b"set-cookie"]
+    print(f"Replayed Set-Cookie headers: {cookies}")
+    if cookies != [b"a=1", b"b=2"]:
+        failures.append(f"Replay: Set-Cookie {cookies}, expected both stored headers")
+
+def main() -> int:
+    isolated_environment()
+    seed_reference_data(1)
+    client = app_client()
+    headers = login(client, "fachkraft001")
+
+    # Tag im laufenden Monat, damit kein Monatsabschluss greift
+    day = date.today().replace(day=1).isoformat()
+    marker = f"Idempotenzprüfung {uuid.uuid4().hex[:8]}"
+    body = {"date": day, "entry_type": "arbeitszeit", "subtype": "kleinteam", "hours": 1.0, "description": marker}
+    failures = []
+
+    # Gleichzeitige Wiederholungen eines POST: genau ein Eintrag
+    key = {"Idempotency-Key": uuid.uuid4().hex}
+    check_responses(
+        "POST /api/time-entries/",
+        send_concurrently(client, "POST", "/api/time-entries/", json=body, headers={**headers, **key}),
+        failures
+    )
+    entries = client.get("/api/time-entries/", params={"start_date": day, "end_date": day}, headers=headers).json()
+    created = [entry for entry in entries if entry["description"] == marker]
+    if len(created) != 1:
+        failures.append(f"POST /api/time-entries/: {len(created)} entries created, expected 1")
+        created.append({"id": None, "version": None})
+    entry = created[0]
+
+    replay = client.post("/api/time-entries/", json=body, headers={**headers, **key})
+    if replay.status_code != 200 or replay.headers.get("idempotent-replayed") != "true":
+        failures.append(f"POST replay: status {replay.status_code}, not replayed")
+
+    # PUT mit If-Match: genau eine Änderung, Wiederholungen liefern dasselbe ETag
+    key = {"Idempotency-Key": uuid.uuid4().hex}
+    update = {**body, "hours": 2.0}
+    succeeded = check_responses(
+        f"PUT /api/time-entries/{{entry_id}}",
+        send_concurrently(
+            client, "PUT", f"/api/time-entries/{entry['id']}", json=update,
+            headers={**headers, **key, "If-Match": f'"{entry["version"]}"'}
+        ),
+        failures
+    )
+    etags = {response.headers.get("etag") for response in succeeded}
+    if etags != {f'"{entry["version"] + 1}"'}:
+        failures.append(f"PUT replay: ETag {sorted(map(str, etags))}, expected version {entry['version'] + 1}")
+
+    # Fehlerantworten werden nicht gespeichert: nach 412 wird derselbe Schlüssel erneut ausgeführt
+    key = {"Idempotency-Key": uuid.uuid4().hex}
+    update = {**body, "hours": 3.0}
+    url = f"/api/time-entries/{entry['id']}"
+    stale = client.put(url, json=update, headers={**headers, **key, "If-Match": f'"{entry["version"]}"'})
+    current = client.put(url, json=update, headers={**headers, **key, "If-Match": f'"{entry["version"] + 1}"'})
+    print(f"PUT with stale version: {stale.status_code}, retry with current version: {current.status_code}")
+    if stale.status_code != 412:
+        failures.append(f"PUT with stale If-Match: status {stale.status_code}, expected 412")
+    if current.status_code != 200 or current.headers.get("idempotent-replayed"):
+        failures.append("PUT after 412: stored error response was replayed")
+
+    check_interrupted(client, headers, body, failures)
+    check_repeated_headers(failures)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
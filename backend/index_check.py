@@ -0,0 +1,74 @@
+"""
+Regressionsprüfung für die Indizes von GET /api/time-entries
+
+    python index_check.py
+
+Legt eine temporäre SQLite-Datenbank mit synthetischen Daten an, ruft den
+Endpoint mit den typischen Filtern auf und prüft mit EXPLAIN QUERY PLAN, dass
+die tatsächlich ausgeführte Abfrage den erwarteten Index nutzt, ohne
+Tabellenscan und ohne zusätzliche Sortierung. Exit-Code 1 bei Abweichungen.
+"""
+import sys
+from datetime import date, timedelta
+from check_support import isolated_environment, seed_reference_data, app_client, login
+
+# (Beschreibung, Benutzer, Query-Parameter, erwarteter Index)
+CASES = [
+    ("Leitung, user_id and date range", "leitung", {"user_id": "{staff_id}", "start_date": "{start}", "end_date": "{end}"}, "ix_time_entries_user_date"),
+    ("Leitung, user_id only", "leitung", {"user_id": "{staff_id}"}, "ix_time_entries_user_date"),
+    ("Leitung, date range only", "leitung", {"start_date": "{start}", "end_date": "{end}"}, "ix_time_entries_date"),
+    ("Fachkraft, own entries in date range", "fachkraft001", {"start_date": "{start}", "end_date": "{end}"}, "ix_time_entries_user_date"),
+]
+
+def main() -> int:
+    isolated_environment()
+    seed_reference_data(3)
+
+    from sqlalchemy import event, select
+    from database import engine, SessionLocal
+    from models import User
+
+    db = SessionLocal()
+    staff_id = db.execute(select(User.id).where(User.username == "fachkraft001")).scalar()
+    db.close()
+    end = date.today()
+    values = {"staff_id": staff_id, "start": end - timedelta(days=90), "end": end}
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "FROM time_entries" in statement and "ORDER BY time_entries.date" in statement:
+            captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    client = app_client()
+
+    failures = []
+    for description, username, params, expected_index in CASES:
+        query = {name: value.format(**values) for name, value in params.items()}
+        captured.clear()
+        response = client.get("/api/time-entries/", params=query, headers=login(client, username))
+        if response.status_code != 200 or not captured:
+            failures.append(f"{description}: status {response.status_code}, no list query captured")
+            continue
+
+        statement, parameters = captured[-1]
+        with engine.connect() as connection:
+            plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+
+        print(f"{description} ({len(response.json())} rows)")
+        for line in plan:
+            print(f"  {line}")
+        if not any(f"USING INDEX {expected_index}" in line for line in plan):
+            failures.append(f"{description}: {expected_index} not used")
+        if any(line.startswith("SCAN time_entries") for line in plan):
+            failures.append(f"{description}: full table scan")
+        if any("TEMP B-TREE" in line for line in plan):
+            failures.append(f"{description}: extra sort step")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,519 @@
+"""
+Lasttest gegen eine laufende Instanz (SQLite oder MySQL)
+
+    python seed_data.py --staff 20 --years 2
+    uvicorn main:app --workers 4
+    python load_test.py --scenario mixed --users 30 --duration 60 --save baseline.json
+    # nach einer Änderung, vor dem Deployment:
+    python load_test.py --scenario mixed --users 30 --duration 60 --baseline baseline.json
+
+Szenarien:
+- mixed: Fachkräfte (Dashboard, Einträge anlegen/ändern/löschen) und Leitung
+  (Abschlussübersicht, Statistiken, Exporte, Monat entsperren und wieder abschließen)
+- login: parallele Anmeldungen, Durchsatz der Passwortprüfung
+- idempotency: viele gleichzeitige Wiederholungen eines POST mit demselben
+  Idempotency-Key, genau ein Eintrag darf entstehen
+- writers: viele gleichzeitige Schreib-Requests (Schreibsperre unter SQLite)
+- export-isolation: Latenz leichter Requests während eines großen Exports
+- lane-isolation: Anmeldungen und Exporte erst ohne, dann mit --users
+  gleichzeitigen Schreibern (zusammen --write-rate Schreib-Requests pro
+  Sekunde, bei jeder Version dieselbe Last); Exit-Code 1, wenn sie hinter den
+  Schreibern warten (p50 mehr als --lane-factor-mal so hoch wie ohne Schreiber)
+
+Ausgabe je Endpoint: Anzahl, Fehler, Requests/s und p50/p95/p99/Maximum.
+Mit --baseline endet das Skript mit Exit-Code 1, wenn p95 eines Endpoints um
+mehr als --max-regression schlechter ist als in der gespeicherten Messung
+oder die Fehlerquote --max-error-rate übersteigt.
+
+Die Testbenutzer (fachkraft001, ...) kommen aus seed_data.py und teilen sich
+--password. Benötigt httpx (nur für den Lasttest, nicht in requirements.txt).
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import Optional
+import httpx
+
+STAFF_PREFIX = "fachkraft"  # wie in seed_data.py
+# Unterschiede unterhalb dieser Grenze (ms) gelten nicht als Regression
+NOISE_FLOOR_MS = 5.0
+# Endpoints mit weniger Messungen werden nicht mit der Baseline verglichen
+MIN_SAMPLES = 20
+
+def percentile(values: list, q: float) -> float:
+    """Perzentil nach Nearest-Rank auf sortierten Werten"""
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+class Results:
+    """
+    Latenzen und Statuscodes je Endpoint (Methode und Pfad-Template)
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Bisherige Messungen verwerfen (z.B. Anmeldungen vor dem eigentlichen Test)"""
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, name: str, status, seconds: float):
+        self.latencies[name].append(seconds * 1000)
+        self.statuses[name][status] += 1
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def summary(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        endpoints = {}
+        for name in sorted(self.latencies):
+            values = sorted(self.latencies[name])
+            errors = sum(
+                count for status, count in self.statuses[name].items()
+                if not isinstance(status, int) or status >= 400
+            )
+            endpoints[name] = {
+                "count": len(values),
+                "errors": errors,
+                "statuses": {str(status): count for status, count in self.statuses[name].items()},
+                "rps": round(len(values) / elapsed, 2),
+                "p50": round(percentile(values, 50), 1),
+                "p95": round(percentile(values, 95), 1),
+                "p99": round(percentile(values, 99), 1),
+                "max": round(values[-1], 1),
+            }
+        return {"elapsed_seconds": round(elapsed, 1), "endpoints": endpoints}
+
+    def print_report(self):
+        summary = self.summary()
+        width = max([len(name) for name in summary["endpoints"]] + [8])
+        print(f"\n{'Endpoint':{width}s} {'count':>7s} {'errors':>6s} {'req/s':>7s} "
+              f"{'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s}")
+        for name, stats in summary["endpoints"].items():
+            print(f"{name:{width}s} {stats['count']:7d} {stats['errors']:6d} {stats['rps']:7.1f} "
+                  f"{stats['p50']:8.1f} {stats['p95']:8.1f} {stats['p99']:8.1f} {stats['max']:8.1f}")
+            if stats["errors"]:
+                print(f"{'':{width}s}   statuses: {stats['statuses']}")
+        print(f"\nLatenzen in ms, Dauer {summary['elapsed_seconds']}s")
+
+class VirtualUser:
+    """
+    Angemeldeter Client; alle Requests laufen über einen gemeinsamen Connection-Pool
+    """
+
+    def __init__(self, client: httpx.AsyncClient, results: Results, username: str, password: str):
+        self.client = client
+        self.results = results
+        self.username = username
+        self.password = password
+        self.headers = {}
+        self.user_id = None
+        self.role = None
+
+    async def login(self):
+        response = await self.request(
+            "POST /api/auth/token", "POST", "/api/auth/token",
+            data={"username": self.username, "password": self.password}
+        )
+        if response is None or response.status_code != 200:
+            raise SystemExit(f"Login failed for {self.username}")
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        me = (await self.client.get("/api/users/me", headers=self.headers)).json()
+        self.user_id = me["id"]
+        self.role = me["role"]
+
+    async def request(self, name: Optional[str], method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        """
+        Request ausführen und unter name messen (None: nicht messen, z.B. Aufräumen)
+        """
+        headers = {**self.headers, **kwargs.pop("headers", {})}
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            response = None
+            status = type(e).__name__
+        if name is not None:
+            self.results.record(name, status, time.perf_counter() - started)
+        return response
+
+def month_range(year: int, month: int):
+    first = date(year, month, 1)
+    following = date(year + (month == 12), month % 12 + 1, 1)
+    return first, following - timedelta(days=1)
+
+def previous_month(year: int, month: int):
+    return (year - 1, 12) if month == 1 else (year, month - 1)
+
+class MixedTraffic:
+    """
+    Typischer Betrieb: Fachkräfte im aktuellen (offenen) Monat, Leitung im Vormonat
+    """
+
+    def __init__(self, args, staff_ids: list):
+        self.rng = random.Random(args.seed)
+        self.think = args.think_ms / 1000
+        self.staff_ids = staff_ids
+        self.year, self.month = args.month
+        self.month_start, self.month_end = month_range(self.year, self.month)
+        self.closed_year, self.closed_month = previous_month(self.year, self.month)
+        self.closed_start, self.closed_end = month_range(self.closed_year, self.closed_month)
+
+    def _workday(self, first: date, last: date) -> date:
+        days = [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+        return self.rng.choice([day for day in days if day.weekday() < 5] or days)
+
+    async def dashboard(self, user: VirtualUser):
+        day = self._workday(self.month_start, self.month_end)
+        await user.request("GET /api/users/me", "GET", "/api/users/me")
+        await user.request("GET /api/time-entries/", "GET", "/api/time-entries/", params={
+            "start_date": self.month_start.isoformat(), "end_date": self.month_end.isoformat()
+        })
+        await user.request("GET /api/statistics/weekly", "GET", "/api/statistics/weekly", params={
+            "week_start": (day - timedelta(days=day.weekday())).isoformat()
+        })
+        await user.request("GET /api/global-events/calendar", "GET", "/api/global-events/calendar", params={
+            "year": self.year, "month": self.month
+        })
+        await user.request("GET /api/child-counts/", "GET", "/api/child-counts/", params={
+            "start_date": day.isoformat(), "end_date": day.isoformat()
+        })
+
+    async def edit_entry(self, user: VirtualUser):
+        body = {
+            "date": self._workday(self.month_start, self.month_end).isoformat(),
+            "entry_type": "arbeitszeit",
+            "subtype": self.rng.choice(["stunden_am_kind", "vorbereitungsstunden", "kleinteam"]),
+            "hours": self.rng.choice([1.0, 2.0, 4.0, 5.5]),
+            "description": "Lasttest",
+        }
+        response = await user.request("POST /api/time-entries/", "POST", "/api/time-entries/", json=body)
+        if response is None or response.status_code != 200:
+            return
+        entry_id = response.json()["id"]
+        await asyncio.sleep(self.rng.expovariate(1 / self.think) if self.think else 0)
+        await user.request(
+            "PUT /api/time-entries/{entry_id}", "PUT", f"/api/time-entries/{entry_id}",
+            json={**body, "hours": body["hours"] + 0.5}
+        )
+        await user.request("DELETE /api/time-entries/{entry_id}", "DELETE", f"/api/time-entries/{entry_id}")
+
+    async def lock_overview(self, user: VirtualUser):
+        params = {"year": self.closed_year, "month": self.closed_month}
+        await user.request("GET /api/monthly-locks/status", "GET", "/api/monthly-locks/status", params=params)
+        await user.request("GET /api/statistics/monthly", "GET", "/api/statistics/monthly", params=params)
+
+    async def reports(self, user: VirtualUser):
+        user_id = self.rng.choice(self.staff_ids)
+        await user.request(
+            "GET /api/statistics/annual/{user_id}", "GET", f"/api/statistics/annual/{user_id}",
+            params={"year": self.closed_year}
+        )
+        await user.request("GET /api/child-counts/stats", "GET", "/api/child-counts/stats", params={
+            "start_date": self.closed_start.isoformat(), "end_date": self.closed_end.isoformat()
+        })
+        await user.request("GET /api/users/", "GET", "/api/users/")
+
+    async def export(self, user: VirtualUser):
+        roll = self.rng.random()
+        if roll < 0.7:
+            body = {"export_type": "time_entries", "format": "csv"}
+        elif roll < 0.9:
+            body = {"export_type": "time_entries", "format": "excel"}
+        else:
+            body = {"export_type": "child_counts", "format": "parquet"}
+        body.update(start_date=self.closed_start.isoformat(), end_date=self.closed_end.isoformat())
+        await user.request(
+            f"POST /api/export-import/export ({body['format']})", "POST", "/api/export-import/export", json=body
+        )
+
+    async def relock(self, user: VirtualUser):
+        """Abgeschlossenen Monat für eine Korrektur entsperren und wieder abschließen"""
+        user_id = self.rng.choice(self.staff_ids)
+        params = {"year": self.closed_year, "month": self.closed_month, "user_id": user_id}
+        response = await user.request("GET /api/monthly-locks/", "GET", "/api/monthly-locks/", params=params)
+        if response is None or response.status_code != 200 or not response.json():
+            return
+        lock_id = response.json()[0]["id"]
+        response = await user.request("DELETE /api/monthly-locks/{lock_id}", "DELETE", f"/api/monthly-locks/{lock_id}")
+        if response is None or response.status_code != 200:
+            return
+        await user.request("POST /api/monthly-locks/", "POST", "/api/monthly-locks/", json={
+            "user_id": user_id, "year": self.closed_year, "month": self.closed_month
+        })
+
+    async def run(self, user: VirtualUser, deadline: float):
+        if user.role == "fachkraft":
+            actions = [(self.dashboard, 6), (self.edit_entry, 3)]
+        else:
+            actions = [(self.lock_overview, 4), (self.reports, 3), (self.export, 2), (self.relock, 1)]
+        functions = [action for action, _ in actions]
+        weights = [weight for _, weight in actions]
+        while time.monotonic() < deadline:
+            await self.rng.choices(functions, weights)[0](user)
+            if self.think:
+                await asyncio.sleep(self.rng.expovariate(1 / self.think))
+
+async def staff_users(client, results, args, count: int) -> list:
+    """Testbenutzer anmelden (reihum, falls weniger Fachkräfte als gewünscht)"""
+    leitung = VirtualUser(client, results, args.leitung_user, args.leitung_password)
+    await leitung.login()
+    users = (await client.get("/api/users/", headers=leitung.headers)).json()
+    usernames = sorted(user["username"] for user in users if user["username"].startswith(STAFF_PREFIX))
+    if not usernames:
+        raise SystemExit("No test users found, run seed_data.py first")
+    staff = [
+        VirtualUser(client, results, usernames[index % len(usernames)], args.password)
+        for index in range(count)
+    ]
+    await asyncio.gather(*(user.login() for user in staff))
+    return staff
+
+async def scenario_mixed(client, results, args):
+    leitung_count = max(1, round(args.users * 0.2))
+    staff = await staff_users(client, results, args, max(1, args.users - leitung_count))
+    leitung = [VirtualUser(client, results, args.leitung_user, args.leitung_password) for _ in range(leitung_count)]
+    await asyncio.gather(*(user.login() for user in leitung))
+
+    traffic = MixedTraffic(args, sorted({user.user_id for user in staff}))
+    results.reset()
+    deadline = time.monotonic() + args.duration
+    await asyncio.gather(*(traffic.run(user, deadline) for user in staff + leitung))
+
+async def scenario_login(client, results, args):
+    staff = await staff_users(client, results, args, args.users)
+    results.reset()
+    deadline = time.monotonic() + args.duration
+
+    async def loop(user: VirtualUser):
+        while time.monotonic() < deadline:
+            await user.request("POST /api/auth/token", "POST", "/api/auth/token", data={
+                "username": user.username, "password": user.password
+            })
+
+    await asyncio.gather(*(loop(user) for user in staff))
+
+async def scenario_idempotency(client, results, args) -> bool:
+    user = (await staff_users(client, results, args, 1))[0]
+    results.reset()
+    marker = f"Idempotenztest {uuid.uuid4().hex[:8]}"
+    day = date(*args.month, 1).isoformat()
+    body = {"date": day, "entry_type": "arbeitszeit", "subtype": "kleinteam", "hours": 1.0, "description": marker}
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+
+    responses = await asyncio.gather(*(
+        user.request("POST /api/time-entries/", "POST", "/api/time-entries/", json=body, headers=headers)
+        for _ in range(args.users)
+    ))
+    replayed = sum(1 for response in responses if response is not None and response.headers.get("Idempotent-Replayed"))
+
+    entries = (await user.request(None, "GET", "/api/time-entries/", params={
+        "start_date": day, "end_date": day, "user_id": user.user_id
+    })).json()
+    created = [entry for entry in entries if entry.get("description") == marker]
+    for entry in created:
+        await user.request(None, "DELETE", f"/api/time-entries/{entry['id']}")
+
+    print(f"{args.users} identical requests: {len(created)} entry created, {replayed} replayed")
+    return len(created) == 1
+
+async def scenario_writers(client, results, args):
+    staff = await staff_users(client, results, args, min(args.users, 20))
+    results.reset()
+    first, last = month_range(*args.month)
+    created = []
+
+    async def write(index: int):
+        user = staff[index % len(staff)]
+        day = first + timedelta(days=index % ((last - first).days + 1))
+        response = await user.request("POST /api/time-entries/", "POST", "/api/time-entries/", json={
+            "date": day.isoformat(), "entry_type": "arbeitszeit", "subtype": "stunden_am_kind",
+            "hours": 1.0 + index % 5, "description": "Lasttest"
+        })
+        if response is not None and response.status_code == 200:
+            created.append((user, response.json()["id"]))
+
+    semaphore = asyncio.Semaphore(args.users)
+
+    async def limited(index: int):
+        async with semaphore:
+            await write(index)
+
+    await asyncio.gather(*(limited(index) for index in range(args.requests)))
+    results.stop()
+    for user, entry_id in created:
+        await user.request(None, "DELETE", f"/api/time-entries/{entry_id}")
+
+async def scenario_export_isolation(client, results, args):
+    leitung = VirtualUser(client, results, args.leitung_user, args.leitung_password)
+    await leitung.login()
+    results.reset()
+    year, month = args.month
+    body = {
+        "export_type": "time_entries",
+        "format": "excel",
+        "start_date": date(year - args.export_years, month, 1).isoformat(),
+        "end_date": month_range(year, month)[1].isoformat(),
+    }
+    export = asyncio.ensure_future(
+        leitung.request("POST /api/export-import/export (large excel)", "POST", "/api/export-import/export", json=body)
+    )
+    await asyncio.sleep(0.2)
+    day = date(year, month, 1).isoformat()
+    while not export.done():
+        await leitung.request("GET /api/child-counts/ (during export)", "GET", "/api/child-counts/", params={
+            "start_date": day, "end_date": day
+        })
+        await asyncio.sleep(0.05)
+    await export
+
+async def scenario_lane_isolation(client, results, args) -> bool:
+    staff = await staff_users(client, results, args, min(args.users, 20))
+    leitung = VirtualUser(client, results, args.leitung_user, args.leitung_password)
+    await leitung.login()
+    first, last = month_range(*args.month)
+    export_body = {
+        "export_type": "time_entries", "format": "csv",
+        "start_date": first.isoformat(), "end_date": last.isoformat()
+    }
+    results.reset()
+
+    async def probe(label: str):
+        for _ in range(args.probes):
+            await staff[0].request(f"POST /api/auth/token ({label})", "POST", "/api/auth/token", data={
+                "username": staff[0].username, "password": staff[0].password
+            })
+            await leitung.request(
+                f"POST /api/export-import/export ({label})", "POST", "/api/export-import/export", json=export_body
+            )
+
+    # Feste Rate statt geschlossener Schleife: mehr Durchsatz darf nicht als mehr CPU-Last zählen
+    interval = 2 * args.users / args.write_rate
+
+    async def write(user: VirtualUser, stop: asyncio.Event):
+        loop = asyncio.get_running_loop()
+        next_start = loop.time() + random.uniform(0, interval)
+        while not stop.is_set():
+            await asyncio.sleep(max(0.0, next_start - loop.time()))
+            next_start += interval
+            response = await user.request("POST /api/time-entries/ (writer)", "POST", "/api/time-entries/", json={
+                "date": first.isoformat(), "entry_type": "arbeitszeit", "subtype": "kleinteam",
+                "hours": 1.0, "description": "Lasttest"
+            })
+            if response is not None and response.status_code == 200:
+                await user.request(
+                    "DELETE /api/time-entries/{entry_id} (writer)", "DELETE",
+                    f"/api/time-entries/{response.json()['id']}"
+                )
+
+    await probe("idle")
+    stop = asyncio.Event()
+    writers = [asyncio.ensure_future(write(staff[index % len(staff)], stop)) for index in range(args.users)]
+    await asyncio.sleep(0.5)
+    await probe("during writes")
+    stop.set()
+    await asyncio.gather(*writers)
+    results.stop()
+
+    endpoints = results.summary()["endpoints"]
+    passed = True
+    for name in ("POST /api/auth/token", "POST /api/export-import/export"):
+        idle = endpoints[f"{name} (idle)"]["p50"]
+        busy = endpoints[f"{name} (during writes)"]["p50"]
+        limit = idle * args.lane_factor + NOISE_FLOOR_MS
+        print(f"{name}: p50 {idle:.1f} ms idle, {busy:.1f} ms during writes (limit {limit:.1f} ms)")
+        passed = passed and busy <= limit
+    return passed
+
+def compare(summary: dict, baseline: dict, max_regression: float, max_error_rate: float) -> list:
+    """Regressionen gegenüber einer gespeicherten Messung"""
+    failures = []
+    endpoints = summary["endpoints"]
+    total = sum(stats["count"] for stats in endpoints.values())
+    errors = sum(stats["errors"] for stats in endpoints.values())
+    if total and errors / total > max_error_rate:
+        failures.append(f"error rate {errors / total:.1%} exceeds {max_error_rate:.1%}")
+
+    for name, stats in endpoints.items():
+        before = baseline.get("endpoints", {}).get(name)
+        if before is None or min(stats["count"], before["count"]) < MIN_SAMPLES:
+            continue
+        limit = before["p95"] * (1 + max_regression)
+        if stats["p95"] > limit and stats["p95"] - before["p95"] > NOISE_FLOOR_MS:
+            failures.append(f"{name}: p95 {stats['p95']:.1f} ms, baseline {before['p95']:.1f} ms")
+    return failures
+
+SCENARIOS = {
+    "mixed": scenario_mixed,
+    "login": scenario_login,
+    "idempotency": scenario_idempotency,
+    "writers": scenario_writers,
+    "export-isolation": scenario_export_isolation,
+    "lane-isolation": scenario_lane_isolation,
+}
+
+async def run(args) -> int:
+    results = Results()
+    limits = httpx.Limits(max_connections=args.users + 10, max_keepalive_connections=args.users + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        passed = await SCENARIOS[args.scenario](client, results, args)
+    if results.finished is None:
+        results.stop()
+    results.print_report()
+
+    summary = {"scenario": args.scenario, "users": args.users, **results.summary()}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    failures = [] if passed is not False else [f"{args.scenario} check failed"]
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += compare(summary, json.load(f), args.max_regression, args.max_error_rate)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+def parse_month(value: str):
+    year, month = value.split("-")
+    return int(year), int(month)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lasttest gegen eine laufende Instanz")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument("--users", type=int, default=20, help="Gleichzeitige Clients")
+    parser.add_argument("--duration", type=float, default=60, help="Sekunden (mixed, login)")
+    parser.add_argument("--requests", type=int, default=400, help="Anzahl Schreib-Requests (writers)")
+    parser.add_argument("--think-ms", type=float, default=500, help="Mittlere Pause zwischen Aktionen (mixed)")
+    parser.add_argument("--month", type=parse_month, default=(date.today().year, date.today().month),
+                        help="Offener Monat YYYY-MM (Standard: aktueller Monat)")
+    parser.add_argument("--export-years", type=int, default=2, help="Zeitraum des großen Exports")
+    parser.add_argument("--probes", type=int, default=20, help="Anmeldungen und Exporte je Phase (lane-isolation)")
+    parser.add_argument("--lane-factor", type=float, default=2.0,
+                        help="Erlaubter Faktor auf p50 ohne Schreiber (lane-isolation)")
+    parser.add_argument("--write-rate", type=float, default=20,
+                        help="Schreib-Requests pro Sekunde aller Schreiber (lane-isolation)")
+    parser.add_argument("--password", default="test1234", help="Passwort der Testbenutzer")
+    parser.add_argument("--leitung-user", default="leitung")
+    parser.add_argument("--leitung-password", default="leitung123")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--save", help="Ergebnis als JSON speichern (Baseline)")
+    parser.add_argument("--baseline", help="Mit gespeichertem Ergebnis vergleichen")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Erlaubte p95-Verschlechterung (Anteil)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    sys.exit(asyncio.run(run(parser.parse_args())))
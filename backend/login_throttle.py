@@ -0,0 +1,135 @@
+"""
+Drosselung von Anmeldeversuchen
+
+Anmeldeversuche werden pro Benutzername und pro IP in der Tabelle
+login_attempts gezählt (gleitendes Zeitfenster, gemeinsam für alle Worker).
+Ab einer Schwelle muss zwischen zwei Versuchen eine exponentiell wachsende
+Wartezeit liegen. Gedrosselte Requests werden vor jeder Passwortprüfung mit 429
+abgewiesen, damit falsche Passwörter keine bcrypt-Zeit mehr kosten.
+
+Jeder Versuch wird vor der Passwortprüfung eingetragen und festgeschrieben;
+danach zählt ein Request nur die Versuche mit kleinerer ID. Auch bei vielen
+gleichzeitigen Requests erreichen so nur die erlaubten bcrypt. Eine erfolgreiche
+Anmeldung entfernt ihren Eintrag wieder, ein Fehlversuch bleibt stehen.
+"""
+import ipaddress
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+from fastapi import HTTPException, Request
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import LoginAttempt
+
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", "900"))
+LOGIN_MAX_FAILURES_PER_USER = int(os.getenv("LOGIN_MAX_FAILURES_PER_USER", "5"))
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", "20"))
+LOGIN_BACKOFF_BASE_SECONDS = 1
+LOGIN_BACKOFF_MAX_SECONDS = 300
+# Hinter nginx steht die Client-IP in X-Real-IP. Der Header wird nur von diesen
+# Adressen übernommen (Standard: lokal und Docker-Netze, wie in docker-compose.prod.yml)
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(network.strip())
+    for network in os.getenv("TRUSTED_PROXIES", "127.0.0.1/32,::1/128,172.16.0.0/12").split(",")
+    if network.strip()
+]
+
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+def client_ip(request: Request) -> str:
+    peer = request.client.host if request.client else "unknown"
+    real_ip = request.headers.get("x-real-ip")
+    if real_ip and is_trusted_proxy(peer):
+        return real_ip.strip()
+    return peer
+
+def throttle_scopes(username: str, ip: str):
+    """
+    (Scope, erlaubte Fehlversuche) für Benutzername und IP
+    """
+    return [
+        (f"user:{username.lower()[:140]}", LOGIN_MAX_FAILURES_PER_USER),
+        (f"ip:{ip[:140]}", LOGIN_MAX_FAILURES_PER_IP),
+    ]
+
+def retry_after(db: Session, scope: str, max_failures: int, now: datetime, attempt_id: int) -> Optional[int]:
+    """
+    Verbleibende Wartezeit in Sekunden, None wenn der Versuch attempt_id erlaubt ist
+    """
+    failures, last_failure = db.query(
+        func.count(LoginAttempt.id), func.max(LoginAttempt.attempted_at)
+    ).filter(
+        LoginAttempt.scope == scope,
+        LoginAttempt.attempted_at > now - timedelta(seconds=LOGIN_WINDOW_SECONDS),
+        LoginAttempt.id < attempt_id
+    ).one()
+    
+    if failures < max_failures:
+        return None
+    
+    backoff = min(
+        LOGIN_BACKOFF_BASE_SECONDS * 2 ** (failures - max_failures),
+        LOGIN_BACKOFF_MAX_SECONDS
+    )
+    remaining = (last_failure + timedelta(seconds=backoff) - now).total_seconds()
+    return int(remaining) + 1 if remaining > 0 else None
+
+def reserve_login_attempt(db: Session, username: str, ip: str) -> List[int]:
+    """
+    Versuch vor der Passwortprüfung eintragen, 429 mit Retry-After, solange
+    Benutzername oder IP gedrosselt sind
+
+    Returns:
+        IDs der Einträge (für record_login_success)
+    """
+    now = datetime.utcnow()
+    scopes = throttle_scopes(username, ip)
+    # Einträge außerhalb des Fensters gleich mit aufräumen
+    db.query(LoginAttempt).filter(
+        LoginAttempt.scope.in_([scope for scope, _ in scopes]),
+        LoginAttempt.attempted_at <= now - timedelta(seconds=LOGIN_WINDOW_SECONDS)
+    ).delete(synchronize_session=False)
+    attempts = [LoginAttempt(scope=scope, attempted_at=now) for scope, _ in scopes]
+    db.add_all(attempts)
+    db.flush()
+    attempt_ids = [attempt.id for attempt in attempts]
+    db.commit()
+    
+    waits = [
+        retry_after(db, scope, max_failures, now, attempt_id)
+        for (scope, max_failures), attempt_id in zip(scopes, attempt_ids)
+    ]
+    waits = [wait for wait in waits if wait is not None]
+    if waits:
+        # Abgewiesene Versuche zählen nicht als Fehlversuch
+        db.query(LoginAttempt).filter(LoginAttempt.id.in_(attempt_ids)).delete(synchronize_session=False)
+        db.commit()
+        raise HTTPException(
+            status_code=429,
+            detail="Too many failed login attempts, please try again later",
+            headers={"Retry-After": str(max(waits))}
+        )
+    return attempt_ids
+
+def record_login_success(db: Session, username: str, attempt_ids: List[int]):
+    """
+    Fehlversuche des Benutzernamens zurücksetzen und den eigenen Eintrag
+    entfernen (Fehlversuche der IP bleiben bestehen)
+    """
+    user_scope, _ = throttle_scopes(username, "")[0]
+    db.query(LoginAttempt).filter(
+        (LoginAttempt.scope == user_scope) | LoginAttempt.id.in_(attempt_ids)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+def purge_login_attempts(db: Session) -> int:
+    deleted = db.query(LoginAttempt).filter(
+        LoginAttempt.attempted_at <= datetime.utcnow() - timedelta(seconds=LOGIN_WINDOW_SECONDS)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
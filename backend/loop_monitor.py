@@ -0,0 +1,209 @@
+"""
+Überwachung der Event-Loop-Verzögerung und Erkennung blockierender Aufrufe
+
+Ein Task auf dem Event-Loop schläft LOOP_LAG_INTERVAL_MS und misst, wie viel
+später er tatsächlich weiterläuft (Lag). Ein Watchdog-Thread prüft, ob dieser
+Task überfällig ist: Bleibt der Loop länger als LOOP_BLOCK_THRESHOLD_MS stehen,
+sichert er den Stack des Loop-Threads und die Route des gerade laufenden
+Requests, solange der blockierende Aufruf noch läuft. Die Dauer wird ergänzt,
+sobald der Loop wieder reagiert.
+
+Typische Ursachen sind synchrone Datenbank-, Datei- oder Netzwerkzugriffe
+(SMTP, Web-Push) oder CPU-lastige Arbeit (pandas, openpyxl) in async-Endpoints.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Callable, List
+from route_templates import route_templates
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "100"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+LOOP_BLOCK_LOG_SIZE = int(os.getenv("LOOP_BLOCK_LOG_SIZE", "100"))
+# Lag-Werte für die Perzentile im Bericht (bei 100 ms Intervall etwa fünf Minuten)
+LAG_WINDOW = 3000
+STACK_LIMIT = 40
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+def _short_path(filename: str) -> str:
+    if filename.startswith(BACKEND_DIR):
+        return filename[len(BACKEND_DIR):]
+    if "site-packages" + os.sep in filename:
+        return filename.split("site-packages" + os.sep, 1)[1]
+    return filename
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+class LoopMonitor:
+    """
+    Lag-Messung und Watchdog für den Event-Loop eines Workers
+    """
+
+    def __init__(self, interval_ms: float, threshold_ms: float, log_size: int):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.lags = deque(maxlen=LAG_WINDOW)
+        self.max_lag = 0.0
+        self.events = deque(maxlen=log_size)
+        self.offenders = {}
+        # Callbacks für Metriken: lag_observers(lag), block_observers(route, seconds)
+        self.lag_observers: List[Callable[[float], None]] = []
+        self.block_observers: List[Callable[[str, float], None]] = []
+        self._requests = {}  # Task -> Request-Scope
+        self._lock = threading.Lock()
+        self._loop = None
+        self._loop_thread = None
+        self._task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+        self._expected = None  # Zeitpunkt, zu dem der Mess-Task fällig ist
+        self._pending = None  # Blockade, deren Dauer noch nicht feststeht
+
+    def start(self):
+        """Im laufenden Event-Loop aufrufen (Startup)"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stopped.clear()
+        self._task = self._loop.create_task(self._measure())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _measure(self):
+        while True:
+            started = time.monotonic()
+            self._expected = started + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started - self.interval)
+            self._expected = None
+            self._record_lag(lag)
+
+    def _record_lag(self, lag: float):
+        self.lags.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        for observer in self.lag_observers:
+            observer(lag)
+
+        with self._lock:
+            event, self._pending = self._pending, None
+        if event is None:
+            return
+        event["duration_ms"] = round(lag * 1000, 1)
+        with self._lock:
+            offender = self.offenders.setdefault(
+                (event["route"], event["location"]),
+                {"route": event["route"], "location": event["location"], "count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            offender["count"] += 1
+            offender["total_ms"] += event["duration_ms"]
+            offender["max_ms"] = max(offender["max_ms"], event["duration_ms"])
+        for observer in self.block_observers:
+            observer(event["route"], lag)
+        logger.warning(
+            f"Event loop blocked for {event['duration_ms']:.0f} ms in {event['route']} at {event['location']}"
+        )
+
+    def _watch(self):
+        while not self._stopped.wait(self.threshold / 4):
+            expected = self._expected
+            if expected is None or self._pending is not None:
+                continue
+            if time.monotonic() - expected < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            event = self._capture(frame)
+            with self._lock:
+                if self._pending is None and self._expected == expected:
+                    self._pending = event
+                    self.events.append(event)
+
+    def _capture(self, frame) -> dict:
+        """Stack des blockierten Loop-Threads und Route des laufenden Requests"""
+        task = asyncio.current_task(self._loop)
+        scope = self._requests.get(task)
+        route = f"{scope['method']} {route_templates.resolve(scope)}" if scope else "-"
+
+        stack = traceback.extract_stack(frame, limit=STACK_LIMIT)
+        frames = [f"{_short_path(entry.filename)}:{entry.lineno} in {entry.name}" for entry in stack]
+        # Ort im eigenen Code (innerster Frame außerhalb der Bibliotheken und dieser Middleware)
+        location = next(
+            (
+                line for entry, line in zip(reversed(stack), reversed(frames))
+                if entry.filename.startswith(BACKEND_DIR) and entry.filename != os.path.abspath(__file__)
+            ),
+            frames[-1] if frames else "-"
+        )
+        return {
+            "timestamp": datetime.now(),
+            "route": route,
+            "location": location,
+            "duration_ms": None,
+            "stack": frames,
+            "code": stack[-1].line if stack else None,
+        }
+
+    def track(self, scope):
+        task = asyncio.current_task()
+        self._requests[task] = scope
+        return task
+
+    def untrack(self, task):
+        self._requests.pop(task, None)
+
+    def report(self) -> dict:
+        lags = list(self.lags)
+        with self._lock:
+            events = list(reversed(self.events))
+            offenders = sorted(self.offenders.values(), key=lambda offender: offender["total_ms"], reverse=True)
+        return {
+            "pid": os.getpid(),
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "lag_ms": {
+                "current": round(lags[-1] * 1000, 1) if lags else None,
+                "p50": round(_percentile(lags, 50) * 1000, 1),
+                "p99": round(_percentile(lags, 99) * 1000, 1),
+                "max": round(self.max_lag * 1000, 1),
+                "samples": len(lags),
+            },
+            "offenders": [{**offender, "total_ms": round(offender["total_ms"], 1)} for offender in offenders],
+            "events": events,
+        }
+
+loop_monitor = LoopMonitor(LOOP_LAG_INTERVAL_MS, LOOP_BLOCK_THRESHOLD_MS, LOOP_BLOCK_LOG_SIZE)
+
+class LoopMonitorMiddleware:
+    """
+    Ordnet dem laufenden Task den Request zu, damit Blockaden eine Route haben
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        task = loop_monitor.track(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            loop_monitor.untrack(task)
@@ -1,94 +1,131 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Header, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from typing import Optional
 import os
 from pathlib import Path
 
-from database import SessionLocal, engine
-from models import Base, User, UserRole
-from auth import authenticate_user, create_access_token, get_current_user, get_password_hash
-from routers import auth, users, time_entries, statistics, child_counts, monthly_locks, global_events, export_import, push_notifications
-import time
+from database import SessionLocal, engine, replica_engine, pool_status, IS_SQLITE, DATABASE_URL
+from models import User, UserRole
+from auth import authenticate_user, create_access_token, get_current_user, get_current_active_user
+from idempotency import IdempotencyMiddleware
+from migrate import SCHEMA_VERSION, current_schema_version, wait_for_database
+from write_lane import WriteLane, WriteLaneTimeout, sqlite_lock_path
+from query_counter import QueryBudgetMiddleware, DEBUG as QUERY_DEBUG
+from route_templates import route_templates
+from fast_json import FastJSONResponse
+from routers import auth, users, time_entries, statistics, child_counts, monthly_locks, global_events, export_import, push_notifications, sync
 import logging
+import anyio
 
 logger = logging.getLogger(__name__)
 
-def init_database():
-    """Initialize database tables and create default users if needed"""
-    max_retries = 30
-    retry_count = 0
-    
-    while retry_count < max_retries:
-        try:
-            # Try to create tables
-            Base.metadata.create_all(bind=engine)
-            logger.info("Database tables created successfully")
-            
-            # Create default admin user if not exists
-            db = SessionLocal()
-            try:
-                admin_user = db.query(User).filter(User.username == "admin").first()
-                if not admin_user:
-                    admin_user = User(
-                        username="admin",
-                        email="admin@kita.de",
-                        hashed_password=get_password_hash("admin123"),
-                        full_name="Administrator",
-                        role=UserRole.ADMIN,
-                        weekly_hours=40,
-                        additional_hours=0,
-                        work_days_per_week=5,
-                        vacation_days_per_year=30
-                    )
-                    db.add(admin_user)
-                    db.commit()
-                    logger.info("Default admin user created: admin / admin123")
-                else:
-                    logger.info("Admin user already exists")
-                    
-                # Create default leitung user if not exists
-                leitung_user = db.query(User).filter(User.username == "leitung").first()
-                if not leitung_user:
-                    leitung_user = User(
-                        username="leitung",
-                        email="leitung@kita.de",
-                        hashed_password=get_password_hash("leitung123"),
-                        full_name="Kita-Leitung",
-                        role=UserRole.LEITUNG,
-                        weekly_hours=30,
-                        additional_hours=14.1875,
-                        work_days_per_week=5,
-                        vacation_days_per_year=32
-                    )
-                    db.add(leitung_user)
-                    db.commit()
-                    logger.info("Default leitung user created: leitung / leitung123")
-                else:
-                    logger.info("Leitung user already exists")
-                    
-            finally:
-                db.close()
-            break
-            
-        except Exception as e:
-            retry_count += 1
-            logger.warning(f"Database connection attempt {retry_count}/{max_retries} failed: {e}")
-            if retry_count >= max_retries:
-                logger.error("Failed to connect to database after maximum retries")
-                raise
-            time.sleep(2)
-
-app = FastAPI(title="Kita Dienstplan API", version="1.0.0")
+# orjson (falls installiert) für alle JSON-Antworten, siehe fast_json.py
+app = FastAPI(title="Kita Dienstplan API", version="1.0.0", default_response_class=FastJSONResponse)
+
+# Threads für synchrone Endpoints (Datenbankzugriffe laufen außerhalb des Event-Loops)
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "40"))
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
-    init_database()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = WORKER_THREADS
+    # Routentabelle für Metriken und Logs vor dem ersten Request aufbauen
+    route_templates.load(app)
+    # Schema wird vorab mit migrate.py eingerichtet - hier nur Versionsprüfung
+    await wait_for_database()
+
+# Einzelne Requests von Admins mit "X-Profile: 1" profilieren (innerste Middleware,
+# damit der Task des Endpoints dem der Middleware entspricht)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+
+if PROFILING_ENABLED:
+    from profiling import ProfilingMiddleware, profile_store, collapsed_stacks, flamegraph_html
+
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get("/api/metrics/profiles")
+    def list_profiles(current_user: User = Depends(get_current_active_user)):
+        """
+        Gespeicherte Request-Profile, neueste zuerst
+        """
+        if current_user.role != UserRole.ADMIN:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        return profile_store.list()
+
+    @app.get("/api/metrics/profiles/{profile_id}")
+    def get_profile(
+        profile_id: str,
+        format: str = "flamegraph",
+        current_user: User = Depends(get_current_active_user)
+    ):
+        """
+        Profil als HTML-Flamegraph, Collapsed Stacks (flamegraph.pl, speedscope) oder JSON
+        """
+        if current_user.role != UserRole.ADMIN:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        if format not in ("flamegraph", "collapsed", "json"):
+            raise HTTPException(status_code=400, detail="Format must be flamegraph, collapsed or json")
+        report = profile_store.get(profile_id)
+        if report is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        if format == "collapsed":
+            return PlainTextResponse(collapsed_stacks(report))
+        if format == "flamegraph":
+            return HTMLResponse(flamegraph_html(report))
+        return report
+
+# Verzögerung des Event-Loops messen und blockierende Aufrufe mit Route und Stack erfassen
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+
+if LOOP_MONITOR_ENABLED:
+    from loop_monitor import LoopMonitorMiddleware, loop_monitor
+
+    app.add_middleware(LoopMonitorMiddleware)
+
+    @app.on_event("startup")
+    async def start_loop_monitor():
+        loop_monitor.start()
+
+    @app.on_event("shutdown")
+    async def stop_loop_monitor():
+        loop_monitor.stop()
+
+    @app.get("/api/metrics/event-loop")
+    async def event_loop_metrics(current_user: User = Depends(get_current_active_user)):
+        """
+        Lag des Event-Loops, letzte Blockaden und ihre häufigsten Verursacher in diesem Worker
+        """
+        if current_user.role != UserRole.ADMIN:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        return loop_monitor.report()
+
+# Wiederholte Schreib-Requests mit Idempotency-Key nur einmal ausführen
+app.add_middleware(
+    IdempotencyMiddleware,
+    path_prefixes=[
+        "/api/time-entries",
+        "/api/child-counts",
+        "/api/global-events",
+        "/api/monthly-locks",
+    ],
+)
+
+# SQLite: Schreib-Transaktionen aller Worker nacheinander ausführen
+if IS_SQLITE:
+    WriteLane(sqlite_lock_path(DATABASE_URL)).install(engine)
+
+    @app.exception_handler(WriteLaneTimeout)
+    async def write_lane_timeout(request, exc):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Database is busy, please retry"},
+            headers={"Retry-After": "1"}
+        )
 
 # CORS Origins aus Environment Variable
 cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
@@ -99,8 +136,53 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed", "X-Profile-Id"],
 )
 
+# Entwicklungsmodus: Query-Budgets und N+1-Muster je Request prüfen
+if QUERY_DEBUG:
+    app.add_middleware(QueryBudgetMiddleware)
+
+# Langsame Abfragen mit Route und EXPLAIN-Plan protokollieren (opt-in)
+SLOW_QUERY_LOG_ENABLED = os.getenv("SLOW_QUERY_LOG_ENABLED", "false").lower() == "true"
+
+if SLOW_QUERY_LOG_ENABLED:
+    from slow_query_log import SlowQueryMiddleware, slow_query_log
+
+    app.add_middleware(SlowQueryMiddleware)
+
+    @app.get("/api/metrics/slow-queries")
+    async def slow_queries(current_user: User = Depends(get_current_active_user)):
+        """
+        Letzte langsame Abfragen und die teuersten Abfragemuster dieses Workers
+        """
+        if current_user.role != UserRole.ADMIN:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+        return slow_query_log.report()
+
+# Prometheus-Metriken (äußerste Middleware, misst auch Wartezeiten in den anderen)
+PROMETHEUS_ENABLED = os.getenv("PROMETHEUS_ENABLED", "false").lower() == "true"
+
+if PROMETHEUS_ENABLED:
+    import metrics
+    
+    app.add_middleware(metrics.MetricsMiddleware)
+    
+    @app.get(metrics.METRICS_PATH, include_in_schema=False)
+    def prometheus_metrics(authorization: Optional[str] = Header(None)):
+        metrics.check_metrics_token(authorization)
+        return metrics.metrics_response()
+    
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.lag_observers.append(metrics.EVENT_LOOP_LAG.observe)
+        loop_monitor.block_observers.append(
+            lambda route, seconds: metrics.EVENT_LOOP_BLOCKED.labels(route).observe(seconds)
+        )
+    
+    @app.on_event("shutdown")
+    def stop_metrics():
+        metrics.mark_worker_stopped()
+
 def get_db():
     db = SessionLocal()
     try:
@@ -118,11 +200,41 @@ app.include_router(monthly_locks.router, prefix="/api/monthly-locks", tags=["mon
 app.include_router(global_events.router, prefix="/api/global-events", tags=["global-events"])
 app.include_router(export_import.router, prefix="/api/export-import", tags=["export-import"])
 app.include_router(push_notifications.router, prefix="/api/push", tags=["push-notifications"])
+app.include_router(sync.router, prefix="/api/sync", tags=["sync"])
 
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now()}
 
+@app.get("/api/ready")
+def readiness_check():
+    """
+    Bereit, wenn die Datenbank erreichbar ist und das Schema zu diesem Code passt
+    """
+    try:
+        version = current_schema_version()
+    except Exception:
+        version = None
+    if version != SCHEMA_VERSION:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Database schema version {version}, expected {SCHEMA_VERSION}"
+        )
+    return {"status": "ready", "schema_version": version}
+
+@app.get("/api/metrics/db-pool")
+async def db_pool_metrics(current_user: User = Depends(get_current_active_user)):
+    """
+    Zustand der Connection-Pools (Primär und ggf. Replikat) für diesen Worker
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    
+    pools = {"primary": pool_status(engine)}
+    if replica_engine is not None:
+        pools["replica"] = pool_status(replica_engine)
+    return {"pid": os.getpid(), "pools": pools}
+
 # Static Files (Frontend) - nur wenn static Ordner existiert
 static_dir = Path("static")
 if static_dir.exists():
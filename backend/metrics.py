@@ -0,0 +1,128 @@
+"""
+Prometheus-Metriken pro Route
+
+Die Middleware erfasst je Route (Pfad-Template wie /api/time-entries/{entry_id},
+damit die Anzahl der Label-Werte begrenzt bleibt) die Requests nach Statuscode,
+die Latenz, die Antwortgröße, die gerade laufenden Requests und die Anzahl der
+Datenbankabfragen pro Request. /api/metrics liefert alles im Prometheus-Textformat.
+
+Mit mehreren uvicorn-Workern muss PROMETHEUS_MULTIPROC_DIR beim Start auf ein
+leeres Verzeichnis zeigen: Jeder Worker schreibt seine Werte dorthin, und der
+Worker, der die Abfrage beantwortet, fasst die Werte aller Worker zusammen.
+"""
+import hmac
+import os
+import time
+from typing import Optional
+from fastapi import HTTPException, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess
+)
+from query_counter import count_queries
+from route_templates import route_templates
+
+METRICS_PATH = "/api/metrics"
+# Optionales Bearer-Token für den Scraper (sonst ist der Endpoint offen)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+REQUESTS = Counter(
+    "http_requests_total", "HTTP-Requests nach Route und Statuscode",
+    ["method", "route", "status"]
+)
+LATENCY = Histogram(
+    "http_request_duration_seconds", "Dauer bis zum letzten Byte der Antwort",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Größe des Antwort-Bodys",
+    ["method", "route"],
+    buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+)
+IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Gerade laufende Requests",
+    ["method", "route"],
+    multiprocess_mode="livesum"
+)
+DB_QUERIES = Histogram(
+    "http_request_db_queries", "Datenbankabfragen pro Request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Verspätung des Event-Loops gegenüber dem geplanten Takt",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+EVENT_LOOP_BLOCKED = Histogram(
+    "event_loop_blocked_seconds", "Dauer von Blockaden des Event-Loops über dem Schwellwert",
+    ["route"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+class MetricsMiddleware:
+    """
+    ASGI-Middleware für die Request-Metriken (misst auch gestreamte Antworten vollständig)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == METRICS_PATH:
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        route = route_templates.resolve(scope)
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            with count_queries() as queries:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            REQUESTS.labels(method, route, str(status_code)).inc()
+            LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            RESPONSE_SIZE.labels(method, route).observe(size)
+            DB_QUERIES.labels(method, route).observe(queries.count)
+
+def check_metrics_token(authorization: Optional[str]):
+    if METRICS_TOKEN is None:
+        return
+    if not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+def metrics_response() -> Response:
+    """
+    Metriken aller Worker im Prometheus-Textformat
+    """
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+def mark_worker_stopped():
+    """
+    Live-Gauges des beendeten Workers aus der Summe entfernen
+    """
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
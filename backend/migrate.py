@@ -0,0 +1,282 @@
+"""
+Schema-Einrichtung und Standardbenutzer (einmal pro Deployment)
+
+    python migrate.py          Tabellen, fehlende Spalten und Indizes anlegen,
+                               Standardbenutzer erzeugen, Aufräumarbeiten
+    python migrate.py --check  Exit-Code 0, wenn das Schema aktuell ist
+
+Der Schritt läuft vor dem Start der Worker (Dockerfile.prod) und trägt
+SCHEMA_VERSION in schema_info ein. Ein Worker prüft beim Start nur diese eine
+Zeile. Fehlt der Schritt (z.B. lokal mit --reload), führt genau ein Worker ihn
+unter einer Sperre aus (MySQL: GET_LOCK, SQLite: flock), die anderen warten und
+prüfen danach erneut.
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select, text
+from sqlalchemy.schema import CreateTable
+from sqlalchemy import exc as sa_exc
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal, engine, add_missing_columns, DATABASE_URL
+from models import Base, User, UserRole, SchemaInfo
+from auth import get_password_hash, purge_refresh_tokens
+from idempotency import purge_idempotency_keys
+from login_throttle import purge_login_attempts
+from write_lane import sqlite_lock_path
+
+try:
+    import fcntl
+except ImportError:  # Windows: keine Sperre zwischen Prozessen
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Bei jeder Änderung an models.py erhöhen, damit der Migrationsschritt erneut läuft
+SCHEMA_VERSION = 4
+
+# So lange warten Worker beim Start auf die Datenbank (Sekunden)
+DB_STARTUP_TIMEOUT = int(os.getenv("DB_STARTUP_TIMEOUT", "60"))
+MIGRATION_LOCK_NAME = "kita_dienstplan_migrate"
+
+def current_schema_version() -> Optional[int]:
+    """
+    Eingetragene Schema-Version (None, wenn noch nicht eingerichtet)
+    """
+    try:
+        with engine.connect() as connection:
+            return connection.execute(
+                select(SchemaInfo.version).where(SchemaInfo.id == 1)
+            ).scalar()
+    except sa_exc.ProgrammingError:
+        return None  # MySQL: Tabelle existiert noch nicht
+    except sa_exc.OperationalError as e:
+        if "no such table" in str(e):
+            return None  # SQLite
+        raise
+
+def schema_is_current() -> bool:
+    return current_schema_version() == SCHEMA_VERSION
+
+@contextmanager
+def migration_lock(timeout: int = DB_STARTUP_TIMEOUT):
+    """
+    Exklusive Sperre für den Migrationsschritt über alle Prozesse
+    """
+    if engine.dialect.name == "mysql":
+        with engine.connect() as connection:
+            acquired = connection.execute(
+                text("SELECT GET_LOCK(:name, :timeout)"),
+                {"name": MIGRATION_LOCK_NAME, "timeout": timeout}
+            ).scalar()
+            if acquired != 1:
+                raise TimeoutError("Timed out waiting for the migration lock")
+            try:
+                yield
+            finally:
+                connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK_NAME})
+        return
+    
+    if fcntl is None:
+        yield
+        return
+    
+    with open(sqlite_lock_path(DATABASE_URL, "migrate-lock"), "a") as lock_file:
+        # Blockiert im Thread; der Halter braucht nur wenige Sekunden
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def enable_sqlite_autoincrement():
+    """
+    SQLite: Tabellen mit sqlite_autoincrement neu aufbauen, die noch ohne
+    AUTOINCREMENT angelegt wurden
+
+    Ohne AUTOINCREMENT vergibt SQLite die höchste gelöschte ID erneut, der Sync
+    meldet sie dann gleichzeitig als gelöscht und als neu. Der Zähler startet
+    oberhalb der höchsten ID, auch der bereits gelöschten (Tombstones).
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not table.dialect_options["sqlite"]["autoincrement"]:
+                continue
+            ddl = connection.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": table.name}
+            ).scalar()
+            if ddl is None or "AUTOINCREMENT" in ddl.upper():
+                continue
+            
+            # Vorgehen nach https://www.sqlite.org/lang_altertable.html: neu anlegen, kopieren, umbenennen
+            rebuilt = f"{table.name}_rebuild"
+            create = str(CreateTable(table, include_foreign_key_constraints=None).compile(dialect=engine.dialect))
+            connection.execute(text(create.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {rebuilt} ", 1)))
+            columns = ", ".join(column.name for column in table.columns)
+            connection.execute(text(f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {table.name}"))
+            connection.execute(text(f"DROP TABLE {table.name}"))
+            connection.execute(text(f"ALTER TABLE {rebuilt} RENAME TO {table.name}"))
+            for index in table.indexes:
+                index.create(bind=connection)
+            
+            connection.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table.name})
+            connection.execute(
+                text(
+                    f"INSERT INTO sqlite_sequence (name, seq) SELECT :name, MAX("
+                    f"(SELECT COALESCE(MAX(id), 0) FROM {table.name}), "
+                    f"(SELECT COALESCE(MAX(entity_id), 0) FROM sync_tombstones WHERE entity = :name))"
+                ),
+                {"name": table.name}
+            )
+            logger.info(f"Rebuilt {table.name} with AUTOINCREMENT")
+
+def create_default_users(db):
+    """Standardbenutzer anlegen, falls sie fehlen"""
+    # Create default admin user if not exists
+    admin_user = db.query(User).filter(User.username == "admin").first()
+    if not admin_user:
+        admin_user = User(
+            username="admin",
+            email="admin@kita.de",
+            hashed_password=get_password_hash("admin123"),
+            full_name="Administrator",
+            role=UserRole.ADMIN,
+            weekly_hours=40,
+            additional_hours=0,
+            work_days_per_week=5,
+            vacation_days_per_year=30
+        )
+        db.add(admin_user)
+        db.commit()
+        logger.info("Default admin user created: admin / admin123")
+    else:
+        logger.info("Admin user already exists")
+        
+    # Create default leitung user if not exists
+    leitung_user = db.query(User).filter(User.username == "leitung").first()
+    if not leitung_user:
+        leitung_user = User(
+            username="leitung",
+            email="leitung@kita.de",
+            hashed_password=get_password_hash("leitung123"),
+            full_name="Kita-Leitung",
+            role=UserRole.LEITUNG,
+            weekly_hours=30,
+            additional_hours=14.1875,
+            work_days_per_week=5,
+            vacation_days_per_year=32
+        )
+        db.add(leitung_user)
+        db.commit()
+        logger.info("Default leitung user created: leitung / leitung123")
+    else:
+        logger.info("Leitung user already exists")
+
+def migrate():
+    """
+    Schema einrichten, Standardbenutzer anlegen, abgelaufene Daten entfernen
+    und SCHEMA_VERSION eintragen (Aufrufer hält migration_lock)
+    """
+    from routers.sync import purge_tombstones
+    
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns(Base.metadata)
+    enable_sqlite_autoincrement()
+    
+    # create_all legt Indizes nur für neue Tabellen an - fehlende nachziehen
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    logger.info("Database tables created successfully")
+    
+    db = SessionLocal()
+    try:
+        create_default_users(db)
+        
+        # Abgelaufene Sync-Tombstones, Idempotency-Keys, Refresh-Tokens und Login-Versuche entfernen
+        purge_tombstones(db)
+        purge_idempotency_keys(db)
+        purge_refresh_tokens(db)
+        purge_login_attempts(db)
+        
+        schema_info = db.get(SchemaInfo, 1)
+        if schema_info is None:
+            schema_info = SchemaInfo(id=1)
+            db.add(schema_info)
+        schema_info.version = SCHEMA_VERSION
+        schema_info.migrated_at = datetime.utcnow()
+        db.commit()
+    finally:
+        db.close()
+    logger.info(f"Database schema at version {SCHEMA_VERSION}")
+
+def ensure_schema() -> bool:
+    """
+    Migrationsschritt ausführen, falls das Schema nicht aktuell ist
+
+    Returns:
+        True, wenn dieser Prozess migriert hat
+    """
+    if schema_is_current():
+        return False
+    with migration_lock():
+        # Ein anderer Prozess könnte inzwischen migriert haben
+        if schema_is_current():
+            return False
+        migrate()
+        return True
+
+async def wait_for_database(timeout: int = DB_STARTUP_TIMEOUT):
+    """
+    Beim Worker-Start auf eine erreichbare Datenbank mit aktuellem Schema warten
+
+    Die Datenbankzugriffe laufen im Thread-Pool, zwischen den Versuchen wird
+    mit wachsendem Abstand asynchron gewartet.
+    """
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            await run_in_threadpool(ensure_schema)
+            return
+        except Exception as e:
+            if time.monotonic() + delay > deadline:
+                logger.error("Failed to connect to database after maximum retries")
+                raise
+            logger.warning(f"Database connection attempt {attempt} failed: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    
+    if "--check" in sys.argv:
+        version = current_schema_version()
+        print(f"Schema version {version}, expected {SCHEMA_VERSION}")
+        sys.exit(0 if version == SCHEMA_VERSION else 1)
+    
+    # Beim Deployment immer ausführen: neue Spalten und Indizes auch ohne Versionssprung
+    deadline = time.monotonic() + DB_STARTUP_TIMEOUT
+    delay = 0.5
+    while True:
+        try:
+            with migration_lock():
+                migrate()
+            break
+        except Exception as e:
+            if time.monotonic() + delay > deadline:
+                raise
+            logger.warning(f"Database not ready, retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Boolean, ForeignKey, Enum, Text, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -73,10 +73,23 @@ class TimeEntry(Base):
     description = Column(Text, nullable=True)
     is_locked = Column(Boolean, default=False)  # Gesperrt nach Monatsabschluss
     created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), index=True)
+    # Optimistische Sperre: jedes ORM-Update prüft und erhöht die Version
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     user = relationship("User", back_populates="time_entries")
     
+    __mapper_args__ = {"version_id_col": version}
+    
+    __table_args__ = (
+        # Einträge eines Benutzers im Zeitraum (Listen, Statistiken, Monatsabschluss)
+        Index("ix_time_entries_user_date", "user_id", "date"),
+        # Zeitraum über alle Benutzer, Keyset-Pagination auf (date, id)
+        Index("ix_time_entries_date", "date"),
+        # SQLite: IDs gelöschter Einträge nicht wiederverwenden (Tombstones im Sync)
+        {"sqlite_autoincrement": True},
+    )
+    
     @property
     def total_hours(self):
         """Gesamtstunden inklusive automatischer Vorbereitungszeit"""
@@ -100,6 +113,10 @@ class ChildCount(Base):
     under_3_count = Column(Integer, default=0)
     over_3_count = Column(Integer, default=0)
     created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    
+    __mapper_args__ = {"version_id_col": version}
 
 class GlobalEvent(Base):
     __tablename__ = "global_events"
@@ -109,6 +126,12 @@ class GlobalEvent(Base):
     event_type = Column(String(50), nullable=False)  # "early_closure_staff", "early_closure_event", "closure"
     description = Column(Text, nullable=True)
     created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now(), index=True)
+    # Versionsstempel für das Kalender-ETag: updated_at allein übersieht zwei Änderungen in derselben Sekunde
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    
+    __table_args__ = {"sqlite_autoincrement": True}
+    __mapper_args__ = {"version_id_col": version}
 
 class MonthlyLock(Base):
     __tablename__ = "monthly_locks"
@@ -121,4 +144,65 @@ class MonthlyLock(Base):
     locked_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     
     user = relationship("User", foreign_keys=[user_id])
-    locked_by_user = relationship("User", foreign_keys=[locked_by])
\ No newline at end of file
+    locked_by_user = relationship("User", foreign_keys=[locked_by])
+    
+    __table_args__ = {"sqlite_autoincrement": True}
+
+class SyncTombstone(Base):
+    """Gelöschte Datensätze für die Delta-Synchronisation der PWA"""
+    __tablename__ = "sync_tombstones"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    entity = Column(String(50), nullable=False)  # "time_entries", "global_events", "monthly_locks"
+    entity_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=True)  # Besitzer, Null = für alle sichtbar
+    deleted_at = Column(DateTime, default=func.now(), index=True)
+
+class IdempotencyKey(Base):
+    """Gespeicherte Antworten für wiederholte Schreib-Requests (Idempotency-Key)"""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("scope", "key", name="uq_idempotency_keys_scope_key"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String(100), nullable=False)  # Benutzername aus dem Token
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)  # Null = Request läuft noch
+    response_body = Column(Text, nullable=True)
+    media_type = Column(String(100), nullable=True)
+    response_headers = Column(Text, nullable=True)  # JSON, z.B. ETag und Location
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class RefreshToken(Base):
+    """Rotierende Refresh-Tokens; jede Anmeldung bildet eine Familie"""
+    __tablename__ = "refresh_tokens"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)  # SHA-256, Klartext wird nicht gespeichert
+    family_id = Column(String(32), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+
+class LoginAttempt(Base):
+    """Fehlgeschlagene Anmeldungen für die Login-Drosselung (pro Benutzername und IP)"""
+    __tablename__ = "login_attempts"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String(150), nullable=False)  # "user:<name>" oder "ip:<adresse>"
+    attempted_at = Column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_login_attempts_scope_time", "scope", "attempted_at"),
+    )
+
+class SchemaInfo(Base):
+    """Stand der Schema-Einrichtung (eine Zeile), siehe migrate.SCHEMA_VERSION"""
+    __tablename__ = "schema_info"
+    
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False)
+    migrated_at = Column(DateTime, nullable=False)
@@ -0,0 +1,344 @@
+"""
+Profiling einzelner Requests auf Anforderung eines Admins
+
+Ein Admin sendet den Header "X-Profile: 1" mit seinem Access-Token. Der Request
+läuft dann unter einem Sampling-Profiler: Ein Thread liest alle PROFILE_INTERVAL_MS
+die Stacks des Workers und zählt nur die, die zu diesem Request gehören:
+
+- Event-Loop-Thread: wenn gerade der Task des Requests läuft
+- Thread-Pool (synchrone Endpoints, Abhängigkeiten): wenn im Stack des
+  Worker-Threads eine Session dieses Requests liegt. Die Profil-ID steckt in
+  einer ContextVar, die anyio in die Worker-Threads kopiert; beim Beginn einer
+  Transaktion übernimmt die Session sie in session.info.
+
+Stichproben ohne passenden Stack (Warten auf I/O oder einen freien Thread)
+erscheinen als "(waiting)". Die Berichte liegen als JSON-Dateien in
+PROFILE_DIR (gemeinsam für alle Worker, die neuesten PROFILE_MAX_REPORTS
+bleiben erhalten) und sind über /api/metrics/profiles abrufbar, als HTML-
+Flamegraph oder als Collapsed Stacks (flamegraph.pl, speedscope).
+
+Ohne den Header prüft die Middleware nur die Header-Liste. Header von
+Nicht-Admins werden ignoriert, der Request läuft normal.
+"""
+import asyncio
+import contextvars
+import html
+import json
+import logging
+import os
+import re
+import secrets
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from models import UserRole
+from auth import principal_from_token
+from route_templates import route_templates
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./data/profiles")
+PROFILE_MAX_REPORTS = int(os.getenv("PROFILE_MAX_REPORTS", "50"))
+# Pfade in Stack-Frames relativ zum Backend bzw. zu site-packages kürzen
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+# Knoten unter diesem Anteil der Stichproben werden im Flamegraph weggelassen
+FLAMEGRAPH_MIN_SHARE = 0.005
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9a-f]{16}$")
+
+# Profil-ID des profilierten Requests, wird mit dem Kontext an den Thread-Pool weitergegeben
+_active_profile: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("active_profile", default=None)
+
+@event.listens_for(Session, "after_begin")
+def mark_profiled_session(session, transaction, connection):
+    """
+    Läuft im Thread, der die Session benutzt, und damit im Kontext des Requests
+    """
+    profile_id = _active_profile.get()
+    if profile_id is not None:
+        session.info["profile_id"] = profile_id
+
+def frame_label(code) -> str:
+    filename = code.co_filename
+    if filename.startswith(BACKEND_DIR):
+        filename = filename[len(BACKEND_DIR):]
+    elif "site-packages" + os.sep in filename:
+        filename = filename.split("site-packages" + os.sep, 1)[1]
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+def collapse(frame) -> str:
+    """Stack von der Wurzel bis zum aktuellen Frame im Collapsed-Format"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+class Sampler(threading.Thread):
+    """
+    Sampling-Profiler für einen Request, läuft bis stop() in einem eigenen Thread
+    """
+
+    def __init__(self, profile_id: str, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.profile_id = profile_id
+        self.interval = interval
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.loop_thread = threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        found = False
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self.ident:
+                continue
+            if thread_id == self.loop_thread:
+                if asyncio.current_task(self.loop) is not self.task:
+                    continue
+            elif not self._runs_request(frame):
+                continue
+            self.stacks[collapse(frame)] += 1
+            found = True
+        if not found:
+            self.stacks["(waiting)"] += 1
+        self.samples += 1
+
+    def _runs_request(self, frame) -> bool:
+        """
+        Prüft, ob ein Thread-Pool-Thread für diesen Request arbeitet
+
+        Endpoints und Abhängigkeiten halten die Session des Requests als lokale
+        Variable; mark_profiled_session hat sie mit der Profil-ID versehen.
+        Bis zur ersten Abfrage der Session zählt der Thread als "(waiting)".
+        """
+        while frame is not None:
+            for value in frame.f_locals.values():
+                if isinstance(value, Session) and value.info.get("profile_id") == self.profile_id:
+                    return True
+            frame = frame.f_back
+        return False
+
+class ProfileStore:
+    """
+    Berichte als JSON-Dateien, damit jeder Worker alle Berichte ausliefern kann
+    """
+
+    def __init__(self, directory: str, max_reports: int):
+        self.directory = directory
+        self.max_reports = max_reports
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def save(self, report: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(report, tmp_file)
+            os.replace(tmp_path, self._path(report["id"]))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def _files(self) -> list:
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith(".json")]
+        except OSError:
+            return []
+        files = []
+        for name in names:
+            try:
+                files.append((os.stat(os.path.join(self.directory, name)).st_mtime, name))
+            except OSError:
+                continue
+        return sorted(files, reverse=True)
+
+    def evict(self):
+        for _, name in self._files()[self.max_reports:]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        try:
+            with open(self._path(profile_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self) -> list:
+        """Neueste Berichte zuerst, ohne Stacks"""
+        reports = []
+        for _, name in self._files():
+            report = self.get(name[:-5])
+            if report is not None:
+                report.pop("stacks", None)
+                reports.append(report)
+        return reports
+
+profile_store = ProfileStore(PROFILE_DIR, PROFILE_MAX_REPORTS)
+
+def _authorization_token(headers) -> Optional[str]:
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                return token
+    return None
+
+def _admin_username(token: str) -> Optional[str]:
+    db = SessionLocal()
+    try:
+        principal = principal_from_token(db, token)
+    finally:
+        db.close()
+    if principal is None or not principal.is_active or principal.role != UserRole.ADMIN:
+        return None
+    return principal.username
+
+class ProfilingMiddleware:
+    """
+    Profiliert Requests mit "X-Profile: 1" von Admins und liefert X-Profile-Id zurück
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        headers = scope["headers"]
+        if not any(name == PROFILE_HEADER and value not in (b"", b"0") for name, value in headers):
+            return await self.app(scope, receive, send)
+
+        token = _authorization_token(headers)
+        username = await run_in_threadpool(_admin_username, token) if token else None
+        if username is None:
+            return await self.app(scope, receive, send)
+
+        await self.profile(scope, receive, send, username)
+
+    async def profile(self, scope, receive, send, username: str):
+        profile_id = secrets.token_hex(8)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode())
+                ]
+            await send(message)
+
+        sampler = Sampler(profile_id, PROFILE_INTERVAL_MS / 1000)
+        marker = _active_profile.set(profile_id)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            sampler.stop()
+            _active_profile.reset(marker)
+
+            report = {
+                "id": profile_id,
+                "timestamp": datetime.now().isoformat(),
+                "pid": os.getpid(),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query_string": scope.get("query_string", b"").decode("latin-1"),
+                "route": route_templates.resolve(scope),
+                "username": username,
+                "status": status_code,
+                "duration_ms": round(duration * 1000, 1),
+                "interval_ms": PROFILE_INTERVAL_MS,
+                "samples": sampler.samples,
+                "stacks": dict(sampler.stacks.most_common()),
+            }
+            try:
+                await run_in_threadpool(profile_store.save, report)
+            except OSError as e:
+                logger.warning(f"Profile {profile_id} could not be saved: {e}")
+            logger.info(f"Profiled {scope['method']} {scope['path']} for {username}: {profile_id}")
+
+def collapsed_stacks(report: dict) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in report["stacks"].items())
+
+def _stack_tree(stacks: dict) -> dict:
+    root = {"name": "all", "value": 0, "children": {}}
+    for stack, count in stacks.items():
+        root["value"] += count
+        node = root
+        for label in stack.split(";"):
+            node = node["children"].setdefault(label, {"name": label, "value": 0, "children": {}})
+            node["value"] += count
+    return root
+
+def _render_node(node: dict, parent_value: int, total: int) -> str:
+    width = 100 * node["value"] / parent_value
+    # Farbe je Datei, damit zusammengehörige Frames erkennbar sind
+    hue = zlib.crc32(node["name"].split("(")[-1].split(":")[0].encode()) % 60
+    title = f"{node['name']} - {node['value']} samples ({100 * node['value'] / total:.1f}%)"
+    children = "".join(
+        _render_node(child, node["value"], total)
+        for child in sorted(node["children"].values(), key=lambda child: -child["value"])
+        if child["value"] / total >= FLAMEGRAPH_MIN_SHARE
+    )
+    return (
+        f'<div class="node" style="width:{width:.3f}%">'
+        f'<div class="frame" style="background:hsl({hue},80%,62%)" title="{html.escape(title)}">'
+        f'{html.escape(node["name"])}</div>'
+        f'<div class="children">{children}</div></div>'
+    )
+
+def flamegraph_html(report: dict) -> str:
+    """Eigenständige HTML-Seite (ohne JavaScript), Wurzel oben"""
+    root = _stack_tree(report["stacks"])
+    heading = (
+        f"{report['method']} {report['path']} - {report['duration_ms']} ms, "
+        f"{report['samples']} samples alle {report['interval_ms']} ms, {report['timestamp']}"
+    )
+    body = _render_node(root, root["value"], root["value"]) if root["value"] else "<p>Keine Stichproben</p>"
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Profil {html.escape(report['id'])}</title>
+<style>
+body {{ font: 12px sans-serif; margin: 12px; }}
+.node {{ display: inline-block; vertical-align: top; box-sizing: border-box; }}
+.frame {{ height: 17px; line-height: 17px; margin: 0 1px 1px 0; padding: 0 3px;
+         overflow: hidden; white-space: nowrap; text-overflow: ellipsis; border-radius: 2px; }}
+.children {{ display: flex; }}
+</style></head>
+<body><h3>{html.escape(heading)}</h3>{body}</body></html>
+"""
@@ -0,0 +1,197 @@
+"""
+Regressionsprüfung für die Abfrage-Budgets (QUERY_BUDGETS)
+
+    python query_check.py
+
+Ruft die Endpoints gegen eine temporäre SQLite-Datenbank im Entwicklungsmodus
+(DEBUG=true, Abfragen je Request im Header X-Query-Count) auf, zuerst mit dem
+Referenzdatenbestand (6 Benutzer), dann mit STAFF_LARGE Fachkräften: Die
+Budgets dürfen nicht mit der Anzahl der Benutzer wachsen. Exit-Code 1, wenn ein
+Endpoint sein Budget überschreitet oder fehlschlägt oder ein Eintrag in
+QUERY_BUDGETS von keinem Fall abgedeckt ist.
+"""
+import os
+import sys
+from datetime import date, timedelta
+from check_support import isolated_environment, seed_reference_data, app_client, login
+
+STAFF_REFERENCE = 4
+STAFF_LARGE = int(os.getenv("QUERY_CHECK_STAFF", "30"))
+
+# Zehn Einträge bzw. Zeilen für die Bulk-Endpoints und den Import
+BULK_SIZE = 10
+
+# (Benutzer, Methode, URL, Request-Argumente, gemerkter Wert aus der Antwort:
+# Feld gleichen Namens, sonst id bzw. die ids einer Liste). Request-Argumente
+# als Funktion erhalten die gemerkten Werte.
+CASES = [
+    (None, "POST", "/api/auth/token", {"data": {"username": "leitung", "password": "leitung123"}}, "refresh_token"),
+    (None, "POST", "/api/auth/refresh", {"json": {"refresh_token": "{refresh_token}"}}, "refresh_token"),
+    (None, "POST", "/api/auth/logout", {"json": {"refresh_token": "{refresh_token}"}}, None),
+    ("leitung", "GET", "/api/users/me", {}, None),
+    ("leitung", "GET", "/api/users/", {}, None),
+    ("admin", "POST", "/api/users/", {"json": {
+        "username": "querycheck{users}", "email": "querycheck{users}@example.org", "full_name": "Query Check",
+        "role": "fachkraft", "weekly_hours": 30.0, "password": "test1234"
+    }}, "user_id"),
+    ("fachkraft001", "GET", "/api/time-entries/", {"params": {"start_date": "{start}", "end_date": "{end}"}}, None),
+    ("leitung", "GET", "/api/time-entries/", {"params": {"start_date": "{start}", "end_date": "{end}"}}, None),
+    ("fachkraft001", "POST", "/api/time-entries/", {"json": "{entry}"}, "entry_id"),
+    ("fachkraft001", "PUT", "/api/time-entries/{entry_id}", {"json": "{entry}"}, None),
+    ("fachkraft001", "DELETE", "/api/time-entries/{entry_id}", {}, None),
+    ("fachkraft001", "POST", "/api/time-entries/bulk", {"json": {"entries": "{bulk_entries}"}}, "bulk_ids"),
+    ("fachkraft001", "PATCH", "/api/time-entries/bulk", lambda values: {"json": {
+        "entries": [{"id": entry_id, "hours": 2.0} for entry_id in values["bulk_ids"]]
+    }}, None),
+    ("fachkraft001", "DELETE", "/api/time-entries/bulk", {"params": {"ids": "{bulk_ids}"}}, None),
+    ("leitung", "GET", "/api/statistics/weekly", {"params": {"week_start": "{week_start}"}}, None),
+    ("leitung", "GET", "/api/statistics/monthly", {"params": {"year": "{year}", "month": "{month}"}}, None),
+    ("leitung", "GET", "/api/statistics/annual/{user_id}", {"params": {"year": "{year}"}}, None),
+    ("leitung", "GET", "/api/child-counts/", {"params": {"start_date": "{start}", "end_date": "{end}"}}, None),
+    ("leitung", "GET", "/api/child-counts/stats", {"params": {"start_date": "{start}", "end_date": "{end}"}}, None),
+    ("leitung", "GET", "/api/child-counts/time-slots", {}, None),
+    ("leitung", "POST", "/api/child-counts/", {"json": "{child_count}"}, "child_count_id"),
+    ("leitung", "PUT", "/api/child-counts/{child_count_id}", {"json": "{child_count}"}, None),
+    ("leitung", "DELETE", "/api/child-counts/{child_count_id}", {}, None),
+    ("leitung", "GET", "/api/monthly-locks/", {"params": {"year": "{year}"}}, None),
+    ("leitung", "GET", "/api/monthly-locks/status", {"params": {"year": "{year}", "month": "{month}"}}, None),
+    ("leitung", "POST", "/api/monthly-locks/send-reminders", {"params": {"year": "{year}", "month": "{month}"}}, None),
+    ("admin", "POST", "/api/monthly-locks/bulk", {"json": {"year": "{year}", "month": "{month}"}}, None),
+    ("admin", "DELETE", "/api/monthly-locks/bulk", {"params": {"year": "{year}", "month": "{month}"}}, None),
+    ("leitung", "POST", "/api/monthly-locks/", {"json": {"user_id": "{staff_id}", "year": "{year}", "month": "{month}"}}, "lock_id"),
+    ("leitung", "DELETE", "/api/monthly-locks/{lock_id}", {}, None),
+    ("leitung", "GET", "/api/global-events/", {"params": {"start_date": "{start}", "end_date": "{end}"}}, None),
+    ("leitung", "GET", "/api/global-events/types", {}, None),
+    ("leitung", "GET", "/api/global-events/calendar", {"params": {"year": "{year}", "month": "{month}"}}, None),
+    ("leitung", "GET", "/api/global-events/statistics", {"params": {"year": "{year}"}}, None),
+    ("leitung", "POST", "/api/global-events/", {"json": "{event}"}, "event_id"),
+    ("leitung", "PUT", "/api/global-events/{event_id}", {"json": "{event}"}, None),
+    ("leitung", "DELETE", "/api/global-events/{event_id}", {}, None),
+    ("leitung", "POST", "/api/export-import/export", {"json": {
+        "export_type": "time_entries", "format": "csv", "start_date": "{start}", "end_date": "{end}"
+    }}, None),
+    ("leitung", "GET", "/api/export-import/template/time-entries", {}, None),
+    ("leitung", "POST", "/api/export-import/import/time-entries", lambda values: {
+        "files": {"file": ("zeiten.csv", values["import_csv"], "text/csv")}
+    }, None),
+    ("fachkraft001", "POST", "/api/push/subscribe", {"json": {"subscription": {
+        "endpoint": "{push_endpoint}", "keys": {"p256dh": "query-check", "auth": "query-check"}
+    }}}, None),
+    ("fachkraft001", "GET", "/api/push/subscriptions", {}, None),
+    ("fachkraft001", "DELETE", "/api/push/unsubscribe", {"params": {"endpoint": "{push_endpoint}"}}, None),
+    ("leitung", "GET", "/api/push/notifications", {}, None),
+    (None, "GET", "/api/push/vapid-public-key", {}, None),
+    ("fachkraft001", "GET", "/api/sync/", {}, None),
+    (None, "GET", "/api/health", {}, None),
+    (None, "GET", "/api/ready", {}, None),
+    ("admin", "GET", "/api/metrics/db-pool", {}, None),
+    ("admin", "DELETE", "/api/users/{user_id}", {}, None),  # Benutzer aus POST /api/users/
+]
+
+def fill(value, values: dict):
+    """
+    Platzhalter wie "{year}" in URL, Parametern und Body ersetzen
+    """
+    if callable(value):
+        return value(values)
+    if isinstance(value, dict):
+        return {name: fill(item, values) for name, item in value.items()}
+    if isinstance(value, str) and value.startswith("{") and value.endswith("}") and value[1:-1] in values:
+        return values[value[1:-1]]
+    if isinstance(value, str):
+        return value.format(**values)
+    return value
+
+def uncovered_budgets() -> list:
+    """
+    Einträge in QUERY_BUDGETS ohne Fall in CASES
+    """
+    from query_counter import QUERY_BUDGETS
+
+    covered = {(method, url) for _, method, url, _, _ in CASES}
+    return sorted(set(QUERY_BUDGETS) - covered)
+
+def run_cases(client, values: dict, users: int, failures: list):
+    from query_counter import query_budget
+
+    headers = {username: login(client, username) for username in {case[0] for case in CASES} if username}
+    values["users"] = users
+    print(f"{users} active users")
+    for username, method, url, kwargs, remember in CASES:
+        route = url
+        url = fill(url, values)
+        response = client.request(method, url, headers=headers.get(username, {}), **fill(kwargs, values))
+        count = int(response.headers.get("x-query-count", -1))
+        budget = query_budget(method, route)
+        print(f"  {method:6} {route:45} {count:4} queries (budget {budget})")
+
+        if response.status_code >= 300:
+            failures.append(f"{method} {route} with {users} users: status {response.status_code} {response.text[:200]}")
+            if remember:
+                values[remember] = 0  # Folgende Requests scheitern mit 404 statt abzubrechen
+        elif remember:
+            body = response.json()
+            if isinstance(body, list):
+                values[remember] = [item["id"] for item in body]
+            else:
+                values[remember] = body.get(remember, body.get("id"))
+        if budget is None:
+            failures.append(f"{method} {route}: no budget in QUERY_BUDGETS")
+        elif count > budget:
+            failures.append(f"{method} {route} with {users} users: {count} queries, budget {budget}")
+
+def main() -> int:
+    # Nur der öffentliche Schlüssel: Benachrichtigungen werden ohne privaten übersprungen
+    isolated_environment(DEBUG="true", VAPID_PUBLIC_KEY="query-check")
+    seed_reference_data(STAFF_REFERENCE)
+
+    from sqlalchemy import func, select
+    from database import SessionLocal
+    from models import User
+    from seed_data import seed
+
+    def active_users() -> int:
+        db = SessionLocal()
+        try:
+            return db.execute(select(func.count(User.id)).where(User.is_active == True)).scalar()
+        finally:
+            db.close()
+
+    today = date.today()
+    first = today.replace(day=1)
+    client = app_client()
+    db = SessionLocal()
+    staff_id, staff_name = db.execute(
+        select(User.id, User.full_name).where(User.username == "fachkraft001")
+    ).one()
+    db.close()
+    days = [first + timedelta(days=offset) for offset in range(BULK_SIZE)]
+    next_year = date(today.year + 1, 1, 1).isoformat()
+    values = {
+        "year": today.year, "month": today.month, "staff_id": staff_id,
+        "start": first.isoformat(), "end": today.isoformat(),
+        "week_start": (today - timedelta(days=today.weekday())).isoformat(),
+        "entry": {"date": first.isoformat(), "entry_type": "arbeitszeit", "subtype": "kleinteam", "hours": 1.0},
+        "bulk_entries": [
+            {"date": day.isoformat(), "entry_type": "arbeitszeit", "subtype": "kleinteam", "hours": 1.0} for day in days
+        ],
+        "import_csv": "Datum;Mitarbeiter;Typ;Stunden\n" + "".join(
+            f"{day.isoformat()};{staff_name};arbeitszeit;1.5\n" for day in days
+        ),
+        "child_count": {"date": next_year, "time_slot": "08:00", "under_3_count": 4, "over_3_count": 12},
+        "event": {"date": next_year, "event_type": "closure", "description": "Query-Check"},
+        "push_endpoint": "https://push.example.org/query-check",
+    }
+
+    failures = [f"{method} {route}: no case in CASES" for method, route in uncovered_budgets()]
+    run_cases(client, values, active_users(), failures)
+    # Weitere Fachkräfte anhängen: gleiche Budgets mit 32 Benutzern
+    seed(STAFF_LARGE - STAFF_REFERENCE, 1, today, 43, "test1234", True)
+    run_cases(client, values, active_users(), failures)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
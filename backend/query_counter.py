@@ -0,0 +1,200 @@
+"""
+Zählung der Datenbankabfragen und Erkennung von N+1-Mustern
+
+Ein before_cursor_execute-Listener auf allen Engines meldet jede Abfrage an die
+Zähler, die im aktuellen Kontext aktiv sind (count_queries). Der Kontext wird
+an den Thread-Pool weitergegeben, daher zählen auch synchrone Endpoints mit.
+
+- assert_max_queries(n): Prüfung für Tests und Skripte
+- QueryBudgetMiddleware: im Entwicklungsmodus (DEBUG=true) Warnung im Log, wenn
+  ein Request sein Budget aus QUERY_BUDGETS überschreitet oder dieselbe Abfrage
+  (gleicher Fingerprint) mehr als N_PLUS_ONE_THRESHOLD-mal ausführt.
+"""
+import logging
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from route_templates import route_templates
+
+logger = logging.getLogger(__name__)
+
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+# Ab so vielen gleichen Abfragen in einem Request wird ein N+1-Muster gemeldet
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+# Abfragen pro Endpoint inkl. Benutzerabfrage bei leerem Anmelde-Cache, gemessen
+# mit dem Referenzdatenbestand: 6 Benutzer (2 Standardbenutzer, 4 Fachkräfte),
+# ein Monat Zeiteinträge, 30 Kinderanzahl-Zeilen und 3 Events.
+# Endpoints über alle aktiven Benutzer fragen gruppiert bzw. mit IN ab, ihr
+# Budget gilt unabhängig von der Anzahl (geprüft von query_check.py mit 6 und
+# 32 Benutzern). "pro Zeile": Schleife mit Abfragen, wächst mit den Daten.
+#
+# Bekannte Schuld: Push-Benachrichtigungen (Monatsabschluss, Erinnerungen) lesen
+# die Subscriptions je Empfänger, aber nur mit konfigurierten VAPID-Schlüsseln.
+# Die Budgets sind ohne VAPID gemessen.
+#
+# Ohne Budget: GET /api/export-import/snapshot (Abfragen laufen erst beim
+# Streamen, nach dem Header, und wachsen seitenweise mit den Daten) und
+# POST /api/push/send (braucht einen erreichbaren Push-Dienst).
+QUERY_BUDGETS = {
+    ("POST", "/api/auth/token"): 9,  # inkl. Reservierung des Versuchs
+    ("POST", "/api/auth/refresh"): 5,
+    ("POST", "/api/auth/logout"): 2,
+    ("GET", "/api/users/me"): 1,
+    ("GET", "/api/users/"): 2,
+    ("POST", "/api/users/"): 4,
+    ("DELETE", "/api/users/{user_id}"): 5,
+    ("GET", "/api/time-entries/"): 3,
+    ("POST", "/api/time-entries/"): 4,
+    ("POST", "/api/time-entries/bulk"): 12,  # 10 Einträge
+    ("PATCH", "/api/time-entries/bulk"): 12,  # 10 Einträge
+    ("DELETE", "/api/time-entries/bulk"): 5,
+    ("PUT", "/api/time-entries/{entry_id}"): 4,
+    ("DELETE", "/api/time-entries/{entry_id}"): 4,
+    ("GET", "/api/statistics/weekly"): 2,
+    ("GET", "/api/statistics/monthly"): 2,
+    ("GET", "/api/statistics/annual/{user_id}"): 10,
+    ("GET", "/api/child-counts/"): 3,
+    ("POST", "/api/child-counts/"): 4,
+    ("PUT", "/api/child-counts/{child_count_id}"): 4,
+    ("DELETE", "/api/child-counts/{child_count_id}"): 3,
+    ("GET", "/api/child-counts/stats"): 2,
+    ("GET", "/api/child-counts/time-slots"): 0,
+    ("GET", "/api/monthly-locks/"): 2,
+    ("GET", "/api/monthly-locks/status"): 4,
+    ("POST", "/api/monthly-locks/"): 8,
+    ("POST", "/api/monthly-locks/bulk"): 7,  # + Push je Empfänger, siehe oben
+    ("DELETE", "/api/monthly-locks/bulk"): 4,
+    ("DELETE", "/api/monthly-locks/{lock_id}"): 5,
+    ("POST", "/api/monthly-locks/send-reminders"): 2,  # + Push je Empfänger, siehe oben
+    ("GET", "/api/global-events/"): 2,
+    ("POST", "/api/global-events/"): 4,
+    ("PUT", "/api/global-events/{event_id}"): 4,
+    ("DELETE", "/api/global-events/{event_id}"): 4,
+    ("GET", "/api/global-events/types"): 0,
+    ("GET", "/api/global-events/calendar"): 3,
+    ("GET", "/api/global-events/statistics"): 3,
+    ("POST", "/api/export-import/export"): 5,
+    ("POST", "/api/export-import/import/time-entries"): 22,  # 10 Zeilen, pro Zeile
+    ("GET", "/api/export-import/template/time-entries"): 1,
+    ("POST", "/api/push/subscribe"): 4,
+    ("DELETE", "/api/push/unsubscribe"): 3,
+    ("GET", "/api/push/subscriptions"): 2,
+    ("GET", "/api/push/notifications"): 2,
+    ("GET", "/api/push/vapid-public-key"): 0,
+    ("GET", "/api/sync/"): 5,
+    ("GET", "/api/health"): 0,
+    ("GET", "/api/ready"): 1,
+    ("GET", "/api/metrics/db-pool"): 1,
+}
+
+class QueryCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def fingerprints(self) -> List[Tuple[str, int]]:
+        """
+        Gleichartige Abfragen zusammengefasst, häufigste zuerst
+        """
+        return Counter(fingerprint(statement) for statement in self.statements).most_common()
+
+    def summary(self, limit: int = 5) -> str:
+        return "\n".join(f"  {count}x {sql}" for sql, count in self.fingerprints()[:limit])
+
+# Aktive Zähler (verschachtelt möglich, z.B. Request und assert_max_queries)
+_active_counters: ContextVar[tuple] = ContextVar("active_query_counters", default=())
+
+@event.listens_for(Engine, "before_cursor_execute")
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active_counters.get():
+        counter.statements.append(statement)
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s)\s*,)+\s*(?:\?|%s|%\(\w+\)s)\s*\)")
+
+def fingerprint(statement: str) -> str:
+    """
+    SQL ohne Literale und mit zusammengefassten IN-Listen
+    """
+    sql = _WHITESPACE.sub(" ", statement).strip()
+    sql = _LITERALS.sub("?", sql)
+    return _PLACEHOLDER_LISTS.sub("(...)", sql)
+
+@contextmanager
+def count_queries():
+    """
+    Alle Abfragen innerhalb des Blocks zählen
+    """
+    counter = QueryCounter()
+    token = _active_counters.set(_active_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _active_counters.reset(token)
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """
+    AssertionError, wenn der Block mehr als limit Abfragen ausführt
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter.count > limit:
+        raise AssertionError(
+            f"Expected at most {limit} queries, got {counter.count}:\n{counter.summary()}"
+        )
+
+def query_budget(method: str, route: str) -> Optional[int]:
+    """
+    Budget eines Endpoints aus QUERY_BUDGETS, None ohne Eintrag
+    """
+    return QUERY_BUDGETS.get((method, route))
+
+class QueryBudgetMiddleware:
+    """
+    Entwicklungsmodus: Abfragen je Request prüfen und als X-Query-Count zurückgeben
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        with count_queries() as counter:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-query-count", str(counter.count).encode())
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+        self.check(scope, counter)
+
+    def check(self, scope, counter: QueryCounter):
+        method = scope["method"]
+        route = route_templates.resolve(scope)
+
+        budget = query_budget(method, route)
+        if budget is not None and counter.count > budget:
+            logger.warning(
+                f"{method} {route}: {counter.count} queries, budget {budget}\n{counter.summary()}"
+            )
+
+        repeated = [(sql, count) for sql, count in counter.fingerprints() if count > N_PLUS_ONE_THRESHOLD]
+        if repeated:
+            details = "\n".join(f"  {count}x {sql}" for sql, count in repeated)
+            logger.warning(f"{method} {route}: possible N+1 query pattern\n{details}")
@@ -0,0 +1,48 @@
+"""
+Pfad-Template (z.B. /api/time-entries/{entry_id}) zu einem Request bestimmen
+
+Wird von Metriken und Query-Budgets als Schlüssel je Endpoint verwendet.
+"""
+try:
+    from fastapi.routing import iter_route_contexts
+except ImportError:  # Ältere FastAPI-Versionen: eingebundene Router liegen flach in app.routes
+    iter_route_contexts = None
+
+class RouteTemplates:
+    """
+    Pfad-Templates aller Endpoints aus app.routes
+
+    Die Routen tragen den vollständigen Pfad inklusive Router-Präfix, so lässt
+    sich die Route schon vor der Bearbeitung des Requests bestimmen. Neuere
+    FastAPI-Versionen schachteln eingebundene Router, dort liefert
+    iter_route_contexts dieselben Routen flach. Die Tabelle wird beim Start
+    geladen (load) und in der Reihenfolge von app.routes durchsucht, wie beim
+    Routing selbst.
+    """
+
+    def __init__(self):
+        self._patterns = None
+
+    def load(self, app):
+        routes = iter_route_contexts(app.routes) if iter_route_contexts else app.routes
+        self._patterns = [
+            (route.path_regex, route.path_format, getattr(route, "methods", None))
+            for route in routes
+            if getattr(route, "path_format", None) is not None
+        ]
+
+    def resolve(self, scope) -> str:
+        if self._patterns is None:
+            self.load(scope["app"])  # App ohne Startup (z.B. Skripte)
+
+        path = scope["path"]
+        fallback = "unmatched"
+        for regex, template, methods in self._patterns:
+            if regex.match(path):
+                if methods is None or scope["method"] in methods:
+                    return template
+                if fallback == "unmatched":
+                    fallback = template  # falsche Methode (405)
+        return fallback
+
+route_templates = RouteTemplates()
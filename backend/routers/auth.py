@@ -1,30 +1,94 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
+from typing import Optional
 from pydantic import BaseModel
-from auth import authenticate_user, create_access_token, get_db, ACCESS_TOKEN_EXPIRE_MINUTES
+from models import RefreshToken
+from auth import (
+    authenticate_user_limited, create_access_token, create_refresh_token, rotate_refresh_token,
+    revoke_refresh_family, hash_refresh_token, get_db, ACCESS_TOKEN_EXPIRE_MINUTES
+)
+from login_throttle import reserve_login_attempt, record_login_success, client_ip
 
 router = APIRouter()
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
 
 class TokenData(BaseModel):
     username: str = None
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+def issue_access_token(username: str) -> str:
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    return create_access_token(
+        data={"sub": username}, expires_delta=access_token_expires
+    )
+
 @router.post("/token", response_model=Token)
-async def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(db, form_data.username, form_data.password)
+def login_for_access_token(
+    request: Request,
+    db: Session = Depends(get_db),
+    form_data: OAuth2PasswordRequestForm = Depends()
+):
+    """
+    Anmeldung mit Benutzername und Passwort
+
+    Synchron im Thread-Pool: Drosselung, Benutzerabfrage und Commits blockieren
+    den Event-Loop nicht, bcrypt läuft zusätzlich im begrenzten bcrypt-Pool.
+    """
+    # Versuch vor der Passwortprüfung eintragen, gedrosselte Anfragen abweisen
+    attempt_ids = reserve_login_attempt(db, form_data.username, client_ip(request))
+    
+    user = authenticate_user_limited(db, form_data.username, form_data.password)
     if not user:
+        # Der eingetragene Versuch bleibt als Fehlversuch stehen
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    record_login_success(db, form_data.username, attempt_ids)
+    access_token = issue_access_token(user.username)
+    refresh_token = create_refresh_token(db, user.id)
+    db.commit()
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+@router.post("/refresh", response_model=Token)
+def refresh_access_token(request: RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Neues Access-Token ohne Passwort (und ohne bcrypt) ausstellen
+
+    Das Refresh-Token wird dabei eingelöst und durch ein neues ersetzt.
+    """
+    result = rotate_refresh_token(db, request.refresh_token)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user, refresh_token = result
+    return {
+        "access_token": issue_access_token(user.username),
+        "token_type": "bearer",
+        "refresh_token": refresh_token
+    }
+
+@router.post("/logout")
+def logout(request: RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Refresh-Token (und alle daraus rotierten) widerrufen
+    """
+    stored = db.query(RefreshToken).filter(
+        RefreshToken.token_hash == hash_refresh_token(request.refresh_token)
+    ).first()
+    if stored:
+        revoke_refresh_family(db, stored.family_id)
+        db.commit()
+    return {"message": "Logged out"}
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc
+from sqlalchemy import and_, desc, select
 from typing import List, Optional
 from datetime import date
 from pydantic import BaseModel
 from models import User, UserRole, ChildCount
 from auth import get_current_active_user, get_db
+from conditional import check_conditional, version_stamp, version_etag, check_if_match, flush_versioned
+from fast_json import response_columns, rows_response
 
 router = APIRouter()
 
@@ -20,10 +22,15 @@ class ChildCountCreate(ChildCountBase):
 
 class ChildCountResponse(ChildCountBase):
     id: int
+    version: int = 1
     
     class Config:
         from_attributes = True
 
+CHILD_COUNT_COLUMNS = response_columns(ChildCount, ChildCountResponse)
+
+CONFLICT_DETAIL = "Kinderanzahl-Eintrag wurde zwischenzeitlich geändert"
+
 class ChildCountStats(BaseModel):
     date: date
     time_slot: str
@@ -34,8 +41,28 @@ class ChildCountStats(BaseModel):
     required_staff_over_3: int
     total_required_staff: int
 
-@router.get("/", response_model=List[ChildCountResponse])
-async def get_child_counts(
+def child_counts_etag(
+    request: Request,
+    response: Response,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    ETag für GET /child-counts aus Versionsstempel des Zeitraums
+    """
+    filters = []
+    if start_date:
+        filters.append(ChildCount.date >= start_date)
+    if end_date:
+        filters.append(ChildCount.date <= end_date)
+    
+    check_conditional(request, response, *version_stamp(db, ChildCount, *filters))
+
+@router.get("/", responses={200: {"model": List[ChildCountResponse]}}, dependencies=[Depends(child_counts_etag)])
+def get_child_counts(
+    response: Response,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     current_user: User = Depends(get_current_active_user),
@@ -44,20 +71,20 @@ async def get_child_counts(
     """
     Abrufen der Kinderanzahl-Daten für einen Zeitraum
     """
-    query = db.query(ChildCount)
+    query = select(*CHILD_COUNT_COLUMNS)
     
     if start_date:
-        query = query.filter(ChildCount.date >= start_date)
+        query = query.where(ChildCount.date >= start_date)
     if end_date:
-        query = query.filter(ChildCount.date <= end_date)
+        query = query.where(ChildCount.date <= end_date)
     
     # Nach Datum und Zeitslot sortieren
     query = query.order_by(ChildCount.date.desc(), ChildCount.time_slot)
     
-    return query.all()
+    return rows_response(db.execute(query), response)
 
 @router.post("/", response_model=ChildCountResponse)
-async def create_child_count(
+def create_child_count(
     child_count: ChildCountCreate,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -118,19 +145,23 @@ async def create_child_count(
     return db_child_count
 
 @router.put("/{child_count_id}", response_model=ChildCountResponse)
-async def update_child_count(
+def update_child_count(
     child_count_id: int,
     child_count: ChildCountCreate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
-    Aktualisieren eines Kinderanzahl-Eintrags
+    Aktualisieren eines Kinderanzahl-Eintrags (mit If-Match nur bei unveränderter Version)
     """
     db_child_count = db.query(ChildCount).filter(ChildCount.id == child_count_id).first()
     if not db_child_count:
         raise HTTPException(status_code=404, detail="Kinderanzahl-Eintrag nicht gefunden")
     
+    check_if_match(if_match, db_child_count.version, CONFLICT_DETAIL)
+    
     # Validierung der Eingaben
     if child_count.under_3_count < 0 or child_count.over_3_count < 0:
         raise HTTPException(
@@ -143,12 +174,14 @@ async def update_child_count(
     db_child_count.under_3_count = child_count.under_3_count
     db_child_count.over_3_count = child_count.over_3_count
     
+    flush_versioned(db, CONFLICT_DETAIL)
     db.commit()
     db.refresh(db_child_count)
+    response.headers["ETag"] = version_etag(db_child_count.version)
     return db_child_count
 
 @router.delete("/{child_count_id}")
-async def delete_child_count(
+def delete_child_count(
     child_count_id: int,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -165,7 +198,7 @@ async def delete_child_count(
     return {"message": "Kinderanzahl-Eintrag gelöscht"}
 
 @router.get("/stats", response_model=List[ChildCountStats])
-async def get_child_count_statistics(
+def get_child_count_statistics(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     current_user: User = Depends(get_current_active_user),
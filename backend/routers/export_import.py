@@ -1,180 +1,573 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func, extract
-from typing import List, Optional
+from sqlalchemy import and_, func, extract, select
+from typing import TYPE_CHECKING, List, Optional
 from datetime import date, datetime
+from calendar import monthrange
+from functools import lru_cache
 from pydantic import BaseModel
-import pandas as pd
 import io
 import csv
 import json
 from models import User, UserRole, TimeEntry, TimeEntryType, WorkTimeSubtype, ChildCount, GlobalEvent
-from auth import get_current_active_user, get_db
+from auth import get_current_active_user, get_db, get_read_db
+from export_cache import export_cache
+from routers.statistics import monthly_target_hours
+from snapshot import iter_snapshot_gzip
+
+# pandas, pyarrow und openpyxl erst beim ersten Export/Import laden (Startzeit und Speicher je Worker)
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+    from openpyxl import Workbook
 
 router = APIRouter()
 
+EXCEL_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Format -> (Dateiendung, Media-Type)
+EXPORT_FORMATS = {
+    "csv": ("csv", "text/csv"),
+    "excel": ("xlsx", EXCEL_MEDIA_TYPE),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+# Spaltenformate werden direkt aus Query-Batches geschrieben
+ARROW_FORMATS = ("parquet", "arrow")
+ARROW_BATCH_SIZE = 5000
+
+EVENT_TYPE_LABELS = {
+    "early_closure_staff": "Früher Betriebsschluss (Personalmangel)",
+    "early_closure_event": "Früher Betriebsschluss (Event)",
+    "closure": "Schließtag",
+    "team_development": "Teamentwicklung",
+    "staff_meeting": "Personalversammlung",
+    "maintenance": "Wartung/Renovierung",
+    "holiday": "Feiertag",
+    "other": "Sonstiges"
+}
+
+@lru_cache(maxsize=None)
+def time_entries_schema() -> "pa.Schema":
+    import pyarrow as pa
+    return pa.schema([
+        ("date", pa.date32()),
+        ("user_id", pa.int32()),
+        ("user_name", pa.string()),
+        ("entry_type", pa.dictionary(pa.int8(), pa.string())),
+        ("subtype", pa.dictionary(pa.int8(), pa.string())),
+        ("hours", pa.float64()),
+        ("prep_time_hours", pa.float64()),
+        ("total_hours", pa.float64()),
+        ("days", pa.float64()),
+        ("description", pa.string()),
+        ("is_locked", pa.bool_()),
+        ("created_at", pa.timestamp("s")),
+    ])
+
+@lru_cache(maxsize=None)
+def child_counts_schema() -> "pa.Schema":
+    import pyarrow as pa
+    return pa.schema([
+        ("date", pa.date32()),
+        ("time_slot", pa.dictionary(pa.int8(), pa.string())),
+        ("under_3_count", pa.int32()),
+        ("over_3_count", pa.int32()),
+        ("total_children", pa.int32()),
+        ("required_staff_under_3", pa.int32()),
+        ("required_staff_over_3", pa.int32()),
+        ("total_required_staff", pa.int32()),
+        ("created_at", pa.timestamp("s")),
+    ])
+
+@lru_cache(maxsize=None)
+def global_events_schema() -> "pa.Schema":
+    import pyarrow as pa
+    return pa.schema([
+        ("date", pa.date32()),
+        ("event_type", pa.dictionary(pa.int8(), pa.string())),
+        ("event_label", pa.string()),
+        ("description", pa.string()),
+        ("created_at", pa.timestamp("s")),
+    ])
+
+TIME_ENTRY_HEADERS = [
+    'Datum', 'Mitarbeiter', 'Typ', 'Untertyp', 'Stunden', 'Vorbereitungszeit (auto)',
+    'Gesamtstunden', 'Tage', 'Beschreibung', 'Gesperrt', 'Erstellt'
+]
+
+CHILD_COUNT_HEADERS = [
+    'Datum', 'Zeitslot', 'Unter 3 Jahre', 'Über 3 Jahre', 'Gesamt Kinder',
+    'Personal U3 (benötigt)', 'Personal Ü3 (benötigt)', 'Personal Gesamt (benötigt)', 'Erstellt'
+]
+
+GLOBAL_EVENT_HEADERS = ['Datum', 'Event-Typ', 'Event-Bezeichnung', 'Beschreibung', 'Erstellt']
+
+SUMMARY_HEADERS = [
+    'Monat', 'Mitarbeiter', 'Gearbeitete Stunden', 'Sollstunden', 'Überstunden', 'Kranktage', 'Urlaubstage'
+]
+
 class ExportRequest(BaseModel):
     start_date: date
     end_date: date
     user_ids: Optional[List[int]] = None
-    export_type: str = "time_entries"  # "time_entries", "child_counts", "global_events"
-    format: str = "csv"  # "csv", "excel"
+    export_type: str = "time_entries"  # "time_entries", "child_counts", "global_events", "bundle"
+    format: str = "csv"  # "csv", "excel", "parquet", "arrow"
 
 @router.post("/export")
-async def export_data(
+def export_data(
     export_req: ExportRequest,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db),
+    primary_db: Session = Depends(get_db)
 ):
     """
-    Daten als CSV oder Excel exportieren
+    Daten als CSV, Excel, Parquet oder Arrow IPC exportieren
+
+    Gecachte Exporte lesen vom Primärserver: Ein Replikat könnte nach einer
+    Änderung samt invalidate() noch alte Zeilen liefern, die dann unter der
+    neuen Generation gespeichert würden. Alle übrigen Exporte lesen vom Replikat.
     """
     # Nur Leitung und Admin können exportieren
     if current_user.role == UserRole.FACHKRAFT:
         raise HTTPException(status_code=403, detail="Keine Berechtigung für Export")
     
     if export_req.export_type == "time_entries":
-        return await export_time_entries(export_req, current_user, db)
+        # Vollständig abgeschlossene Monate ändern sich nicht - Artefakt aus dem Cache liefern
+        cache_key = None
+        generations = None
+        lock_state = export_cache.lock_state(
+            primary_db, export_req.start_date, export_req.end_date, export_req.user_ids
+        )
+        if lock_state is not None:
+            # Vor der Datenabfrage, sonst könnte eine parallele Änderung verloren gehen
+            generations = export_cache.generations(lock_state)
+            cache_key = export_cache.make_key(
+                export_req.export_type,
+                export_req.start_date,
+                export_req.end_date,
+                export_req.user_ids,
+                export_req.format,
+                lock_state
+            )
+            db = primary_db  # Ergebnis wird gespeichert, siehe oben
+            cached = export_cache.get(cache_key)
+            if cached:
+                serving_path, meta = cached
+                return FileResponse(
+                    serving_path,
+                    media_type=meta["media_type"],
+                    headers={"Content-Disposition": f"attachment; filename={meta['filename']}"},
+                    background=BackgroundTask(export_cache.release, serving_path)
+                )
+        
+        return export_time_entries(export_req, current_user, db, cache_key, lock_state, generations)
     elif export_req.export_type == "child_counts":
-        return await export_child_counts(export_req, current_user, db)
+        return export_child_counts(export_req, current_user, db)
     elif export_req.export_type == "global_events":
-        return await export_global_events(export_req, current_user, db)
+        return export_global_events(export_req, current_user, db)
+    elif export_req.export_type == "bundle":
+        return export_bundle(export_req, current_user, db)
     else:
         raise HTTPException(status_code=400, detail="Ungültiger Export-Typ")
 
-async def export_time_entries(export_req: ExportRequest, current_user: User, db: Session):
+def export_time_entries(
+    export_req: ExportRequest,
+    current_user: User,
+    db: Session,
+    cache_key: Optional[str] = None,
+    lock_state: Optional[list] = None,
+    generations: Optional[dict] = None
+):
     """
     Zeiterfassung exportieren
     """
-    query = db.query(TimeEntry, User.full_name).join(User)
+    import pandas as pd
     
-    # Filter anwenden
-    query = query.filter(
-        and_(
-            TimeEntry.date >= export_req.start_date,
-            TimeEntry.date <= export_req.end_date
-        )
-    )
+    filename = f"zeiterfassung_{export_req.start_date}_{export_req.end_date}"
+    stmt = time_entries_statement(export_req)
     
-    if export_req.user_ids:
-        query = query.filter(TimeEntry.user_id.in_(export_req.user_ids))
-    
-    results = query.order_by(TimeEntry.date, User.full_name).all()
+    if export_req.format in ARROW_FORMATS:
+        content = render_arrow(db, stmt, time_entries_schema(), time_entry_columns, export_req.format)
+        return export_response(content, filename, export_req.format, cache_key, lock_state, generations)
     
     # Daten für Export vorbereiten
-    export_data = []
-    for entry, user_name in results:
-        export_data.append({
-            'Datum': entry.date.strftime('%Y-%m-%d'),
-            'Mitarbeiter': user_name,
-            'Typ': entry.entry_type.value,
-            'Untertyp': entry.subtype.value if entry.subtype else '',
-            'Stunden': entry.hours,
-            'Vorbereitungszeit (auto)': entry.prep_time_hours,
-            'Gesamtstunden': entry.total_hours,
-            'Tage': entry.days,
-            'Beschreibung': entry.description or '',
-            'Gesperrt': 'Ja' if entry.is_locked else 'Nein',
-            'Erstellt': entry.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        })
-    
-    df = pd.DataFrame(export_data)
+    df = pd.DataFrame(
+        [time_entry_row(row) for row in db.execute(stmt)],
+        columns=TIME_ENTRY_HEADERS
+    )
+    
+    if cache_key:
+        content = render_excel(df) if export_req.format == "excel" else render_csv(df)
+        return export_response(content, filename, export_req.format, cache_key, lock_state, generations)
     
     if export_req.format == "excel":
-        return export_to_excel(df, f"zeiterfassung_{export_req.start_date}_{export_req.end_date}")
+        return export_to_excel(df, filename)
     else:
-        return export_to_csv(df, f"zeiterfassung_{export_req.start_date}_{export_req.end_date}")
+        return export_to_csv(df, filename)
 
-async def export_child_counts(export_req: ExportRequest, current_user: User, db: Session):
+def export_child_counts(export_req: ExportRequest, current_user: User, db: Session):
     """
     Kinderanzahl exportieren
     """
-    query = db.query(ChildCount).filter(
-        and_(
-            ChildCount.date >= export_req.start_date,
-            ChildCount.date <= export_req.end_date
-        )
-    ).order_by(ChildCount.date, ChildCount.time_slot)
+    import pandas as pd
     
-    results = query.all()
+    filename = f"kinderanzahl_{export_req.start_date}_{export_req.end_date}"
+    stmt = child_counts_statement(export_req)
     
-    export_data = []
-    for count in results:
-        # Personalbedarfsberechnung
-        required_staff_under_3 = max(1, round(count.under_3_count / 4.25)) if count.under_3_count > 0 else 0
-        required_staff_over_3 = max(1, round(count.over_3_count / 10)) if count.over_3_count > 0 else 0
-        
-        export_data.append({
-            'Datum': count.date.strftime('%Y-%m-%d'),
-            'Zeitslot': count.time_slot,
-            'Unter 3 Jahre': count.under_3_count,
-            'Über 3 Jahre': count.over_3_count,
-            'Gesamt Kinder': count.under_3_count + count.over_3_count,
-            'Personal U3 (benötigt)': required_staff_under_3,
-            'Personal Ü3 (benötigt)': required_staff_over_3,
-            'Personal Gesamt (benötigt)': required_staff_under_3 + required_staff_over_3,
-            'Erstellt': count.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        })
-    
-    df = pd.DataFrame(export_data)
+    if export_req.format in ARROW_FORMATS:
+        content = render_arrow(db, stmt, child_counts_schema(), child_count_columns, export_req.format)
+        return export_response(content, filename, export_req.format)
+    
+    df = pd.DataFrame(
+        [child_count_row(row) for row in db.execute(stmt)],
+        columns=CHILD_COUNT_HEADERS
+    )
     
     if export_req.format == "excel":
-        return export_to_excel(df, f"kinderanzahl_{export_req.start_date}_{export_req.end_date}")
+        return export_to_excel(df, filename)
     else:
-        return export_to_csv(df, f"kinderanzahl_{export_req.start_date}_{export_req.end_date}")
+        return export_to_csv(df, filename)
 
-async def export_global_events(export_req: ExportRequest, current_user: User, db: Session):
+def export_global_events(export_req: ExportRequest, current_user: User, db: Session):
     """
     Globale Events exportieren
     """
-    query = db.query(GlobalEvent).filter(
-        and_(
-            GlobalEvent.date >= export_req.start_date,
-            GlobalEvent.date <= export_req.end_date
-        )
-    ).order_by(GlobalEvent.date)
+    import pandas as pd
+    
+    filename = f"events_{export_req.start_date}_{export_req.end_date}"
+    stmt = global_events_statement(export_req)
     
-    results = query.all()
-    
-    EVENT_TYPE_LABELS = {
-        "early_closure_staff": "Früher Betriebsschluss (Personalmangel)",
-        "early_closure_event": "Früher Betriebsschluss (Event)",
-        "closure": "Schließtag",
-        "team_development": "Teamentwicklung",
-        "staff_meeting": "Personalversammlung",
-        "maintenance": "Wartung/Renovierung",
-        "holiday": "Feiertag",
-        "other": "Sonstiges"
-    }
-    
-    export_data = []
-    for event in results:
-        export_data.append({
-            'Datum': event.date.strftime('%Y-%m-%d'),
-            'Event-Typ': event.event_type,
-            'Event-Bezeichnung': EVENT_TYPE_LABELS.get(event.event_type, event.event_type),
-            'Beschreibung': event.description or '',
-            'Erstellt': event.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        })
-    
-    df = pd.DataFrame(export_data)
+    if export_req.format in ARROW_FORMATS:
+        content = render_arrow(db, stmt, global_events_schema(), global_event_columns, export_req.format)
+        return export_response(content, filename, export_req.format)
+    
+    df = pd.DataFrame(
+        [global_event_row(row) for row in db.execute(stmt)],
+        columns=GLOBAL_EVENT_HEADERS
+    )
     
     if export_req.format == "excel":
-        return export_to_excel(df, f"events_{export_req.start_date}_{export_req.end_date}")
+        return export_to_excel(df, filename)
     else:
-        return export_to_csv(df, f"events_{export_req.start_date}_{export_req.end_date}")
+        return export_to_csv(df, filename)
 
-def export_to_csv(df: pd.DataFrame, filename: str):
+def export_bundle(export_req: ExportRequest, current_user: User, db: Session):
     """
-    DataFrame als CSV exportieren
+    Monatspaket exportieren: Zusammenfassung, Zeiterfassung, Kinderanzahl und Events
+    in einer Excel-Datei (immer xlsx, unabhängig vom Format)
+    """
+    from openpyxl import Workbook
+    
+    filename = f"monatspaket_{export_req.start_date}_{export_req.end_date}"
+    
+    # Write-only Workbook: Zeilen werden direkt geschrieben, ohne Zellobjekte im Speicher
+    workbook = Workbook(write_only=True)
+    summary_sheet = create_sheet(workbook, "Zusammenfassung", SUMMARY_HEADERS)
+    entries_sheet = create_sheet(workbook, "Zeiterfassung", TIME_ENTRY_HEADERS)
+    counts_sheet = create_sheet(workbook, "Kinderanzahl", CHILD_COUNT_HEADERS)
+    events_sheet = create_sheet(workbook, "Events", GLOBAL_EVENT_HEADERS)
+    
+    # Zeiteinträge schreiben und dabei Monatssummen je Benutzer bilden
+    totals = {}
+    result = db.execute(time_entries_statement(export_req).execution_options(yield_per=ARROW_BATCH_SIZE))
+    for rows in result.partitions():
+        for row in rows:
+            entries_sheet.append(time_entry_row(row))
+            
+            month_totals = totals.setdefault((row.user_id, row.date.year, row.date.month), {
+                "worked_hours": 0.0, "sick_days": 0.0, "vacation_days": 0.0
+            })
+            if row.entry_type == TimeEntryType.ARBEITSZEIT:
+                month_totals["worked_hours"] += row.hours or 0.0
+            elif row.entry_type == TimeEntryType.KRANK:
+                month_totals["sick_days"] += row.days or 0.0
+            elif row.entry_type == TimeEntryType.URLAUB:
+                month_totals["vacation_days"] += row.days or 0.0
+    
+    result = db.execute(child_counts_statement(export_req).execution_options(yield_per=ARROW_BATCH_SIZE))
+    for rows in result.partitions():
+        for row in rows:
+            counts_sheet.append(child_count_row(row))
+    
+    for row in db.execute(global_events_statement(export_req)):
+        events_sheet.append(global_event_row(row))
+    
+    # Zusammenfassung wie in der Monatsstatistik (aktive bzw. ausgewählte Benutzer)
+    users_query = db.query(User)
+    if export_req.user_ids:
+        users_query = users_query.filter(User.id.in_(export_req.user_ids))
+    else:
+        users_query = users_query.filter(User.is_active == True)
+    users = users_query.order_by(User.full_name).all()
+    
+    year, month = export_req.start_date.year, export_req.start_date.month
+    while (year, month) <= (export_req.end_date.year, export_req.end_date.month):
+        # Angebrochene Monate am Rand des Zeitraums: Sollstunden anteilig nach Kalendertagen
+        month_start = date(year, month, 1)
+        month_end = date(year, month, monthrange(year, month)[1])
+        covered_days = (min(export_req.end_date, month_end) - max(export_req.start_date, month_start)).days + 1
+        share = covered_days / month_end.day
+        for user in users:
+            month_totals = totals.get((user.id, year, month), {})
+            worked_hours = month_totals.get("worked_hours", 0.0)
+            target_hours = monthly_target_hours(user, year, month) * share
+            summary_sheet.append((
+                f"{year}-{month:02d}",
+                user.full_name,
+                round(worked_hours, 2),
+                round(target_hours, 2),
+                round(worked_hours - target_hours, 2),
+                month_totals.get("sick_days", 0.0),
+                month_totals.get("vacation_days", 0.0)
+            ))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    
+    output = io.BytesIO()
+    workbook.save(output)
+    return export_response(output.getvalue(), filename, "excel")
+
+def create_sheet(workbook: "Workbook", title: str, headers: List[str]):
+    """
+    Write-only Arbeitsblatt mit Kopfzeile anlegen
+    """
+    from openpyxl.utils import get_column_letter
+    
+    worksheet = workbook.create_sheet(title)
+    # Spaltenbreite muss im write-only Modus vor den Zeilen gesetzt werden
+    for index, header in enumerate(headers, start=1):
+        worksheet.column_dimensions[get_column_letter(index)].width = min(max(len(header) + 2, 12), 50)
+    worksheet.append(headers)
+    return worksheet
+
+def time_entries_statement(export_req: ExportRequest):
+    """
+    Spalten-Select für Zeiteinträge im Exportzeitraum
+    """
+    stmt = select(
+        TimeEntry.date,
+        TimeEntry.user_id,
+        User.full_name,
+        TimeEntry.entry_type,
+        TimeEntry.subtype,
+        TimeEntry.hours,
+        TimeEntry.prep_time_hours,
+        TimeEntry.days,
+        TimeEntry.description,
+        TimeEntry.is_locked,
+        TimeEntry.created_at
+    ).join(User, TimeEntry.user_id == User.id).where(
+        TimeEntry.date >= export_req.start_date,
+        TimeEntry.date <= export_req.end_date
+    )
+    
+    if export_req.user_ids:
+        stmt = stmt.where(TimeEntry.user_id.in_(export_req.user_ids))
+    
+    return stmt.order_by(TimeEntry.date, User.full_name)
+
+def child_counts_statement(export_req: ExportRequest):
+    """
+    Spalten-Select für Kinderanzahl im Exportzeitraum
+    """
+    return select(
+        ChildCount.date,
+        ChildCount.time_slot,
+        ChildCount.under_3_count,
+        ChildCount.over_3_count,
+        ChildCount.created_at
+    ).where(
+        ChildCount.date >= export_req.start_date,
+        ChildCount.date <= export_req.end_date
+    ).order_by(ChildCount.date, ChildCount.time_slot)
+
+def global_events_statement(export_req: ExportRequest):
+    """
+    Spalten-Select für globale Events im Exportzeitraum
+    """
+    return select(
+        GlobalEvent.date,
+        GlobalEvent.event_type,
+        GlobalEvent.description,
+        GlobalEvent.created_at
+    ).where(
+        GlobalEvent.date >= export_req.start_date,
+        GlobalEvent.date <= export_req.end_date
+    ).order_by(GlobalEvent.date)
+
+def time_entry_row(row) -> tuple:
+    """
+    Zeile für CSV/Excel-Export der Zeiterfassung
+    """
+    return (
+        row.date.strftime('%Y-%m-%d'),
+        row.full_name,
+        row.entry_type.value,
+        row.subtype.value if row.subtype else '',
+        row.hours,
+        row.prep_time_hours,
+        (row.hours or 0.0) + (row.prep_time_hours or 0.0),
+        row.days,
+        row.description or '',
+        'Ja' if row.is_locked else 'Nein',
+        row.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    )
+
+def child_count_row(row) -> tuple:
+    """
+    Zeile für CSV/Excel-Export der Kinderanzahl
+    """
+    # Personalbedarfsberechnung
+    required_staff_under_3, required_staff_over_3 = required_staff(row.under_3_count, row.over_3_count)
+    return (
+        row.date.strftime('%Y-%m-%d'),
+        row.time_slot,
+        row.under_3_count,
+        row.over_3_count,
+        row.under_3_count + row.over_3_count,
+        required_staff_under_3,
+        required_staff_over_3,
+        required_staff_under_3 + required_staff_over_3,
+        row.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    )
+
+def global_event_row(row) -> tuple:
+    """
+    Zeile für CSV/Excel-Export der globalen Events
+    """
+    return (
+        row.date.strftime('%Y-%m-%d'),
+        row.event_type,
+        EVENT_TYPE_LABELS.get(row.event_type, row.event_type),
+        row.description or '',
+        row.created_at.strftime('%Y-%m-%d %H:%M:%S')
+    )
+
+def required_staff(under_3_count: int, over_3_count: int):
+    """
+    Personalbedarf nach Fachkraft-Kind-Schlüssel (U3 1:4,25, Ü3 1:10)
+    """
+    required_staff_under_3 = max(1, round(under_3_count / 4.25)) if under_3_count > 0 else 0
+    required_staff_over_3 = max(1, round(over_3_count / 10)) if over_3_count > 0 else 0
+    return required_staff_under_3, required_staff_over_3
+
+def time_entry_columns(rows) -> list:
+    """
+    Zeiteinträge-Batch in Spalten umwandeln
+    """
+    (dates, user_ids, user_names, entry_types, subtypes, hours, prep_time_hours,
+     days, descriptions, is_locked, created_at) = zip(*rows)
+    return [
+        dates,
+        user_ids,
+        user_names,
+        [entry_type.value for entry_type in entry_types],
+        [subtype.value if subtype else None for subtype in subtypes],
+        hours,
+        prep_time_hours,
+        [(h or 0.0) + (p or 0.0) for h, p in zip(hours, prep_time_hours)],
+        days,
+        descriptions,
+        is_locked,
+        created_at,
+    ]
+
+def child_count_columns(rows) -> list:
+    """
+    Kinderanzahl-Batch in Spalten umwandeln
+    """
+    dates, time_slots, under_3_counts, over_3_counts, created_at = zip(*rows)
+    staff = [required_staff(u3, o3) for u3, o3 in zip(under_3_counts, over_3_counts)]
+    return [
+        dates,
+        time_slots,
+        under_3_counts,
+        over_3_counts,
+        [u3 + o3 for u3, o3 in zip(under_3_counts, over_3_counts)],
+        [u3 for u3, _ in staff],
+        [o3 for _, o3 in staff],
+        [u3 + o3 for u3, o3 in staff],
+        created_at,
+    ]
+
+def global_event_columns(rows) -> list:
+    """
+    Event-Batch in Spalten umwandeln
+    """
+    dates, event_types, descriptions, created_at = zip(*rows)
+    return [
+        dates,
+        event_types,
+        [EVENT_TYPE_LABELS.get(event_type, event_type) for event_type in event_types],
+        descriptions,
+        created_at,
+    ]
+
+def render_arrow(db: Session, stmt, schema: "pa.Schema", build_columns, export_format: str) -> bytes:
+    """
+    Query-Ergebnis batchweise als Parquet oder Arrow IPC schreiben
+    """
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+    
+    sink = pa.BufferOutputStream()
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(sink, schema)
+    
+    try:
+        result = db.execute(stmt.execution_options(yield_per=ARROW_BATCH_SIZE))
+        for rows in result.partitions():
+            columns = build_columns(rows)
+            arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+    finally:
+        writer.close()
+    
+    return sink.getvalue().to_pybytes()
+
+def export_response(
+    content: bytes,
+    filename: str,
+    export_format: str,
+    cache_key: Optional[str] = None,
+    lock_state: Optional[list] = None,
+    generations: Optional[dict] = None
+):
+    """
+    Fertiges Export-Artefakt ausliefern und bei abgeschlossenen Monaten cachen
+    """
+    extension, media_type = EXPORT_FORMATS.get(export_format, EXPORT_FORMATS["csv"])
+    filename = f"{filename}.{extension}"
+    
+    if cache_key:
+        export_cache.store(cache_key, content, filename, media_type, lock_state, generations)
+    
+    return StreamingResponse(
+        io.BytesIO(content),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+def render_csv(df: "pd.DataFrame") -> bytes:
+    """
+    DataFrame als CSV-Bytes rendern
     """
     output = io.StringIO()
     df.to_csv(output, index=False, encoding='utf-8', sep=';')
-    output.seek(0)
-    
+    return output.getvalue().encode('utf-8')
+
+def export_to_csv(df: "pd.DataFrame", filename: str):
+    """
+    DataFrame als CSV exportieren
+    """
     response = StreamingResponse(
-        io.BytesIO(output.getvalue().encode('utf-8')),
+        io.BytesIO(render_csv(df)),
         media_type="text/csv",
         headers={
             "Content-Disposition": f"attachment; filename={filename}.csv"
@@ -182,10 +575,12 @@ def export_to_csv(df: pd.DataFrame, filename: str):
     )
     return response
 
-def export_to_excel(df: pd.DataFrame, filename: str):
+def render_excel(df: "pd.DataFrame") -> bytes:
     """
-    DataFrame als Excel exportieren
+    DataFrame als Excel-Bytes rendern
     """
+    import pandas as pd
+    
     output = io.BytesIO()
     
     with pd.ExcelWriter(output, engine='openpyxl') as writer:
@@ -208,17 +603,40 @@ def export_to_excel(df: pd.DataFrame, filename: str):
             adjusted_width = min(max_length + 2, 50)
             worksheet.column_dimensions[column_letter].width = adjusted_width
     
-    output.seek(0)
-    
+    return output.getvalue()
+
+def export_to_excel(df: "pd.DataFrame", filename: str):
+    """
+    DataFrame als Excel exportieren
+    """
     response = StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        io.BytesIO(render_excel(df)),
+        media_type=EXCEL_MEDIA_TYPE,
         headers={
             "Content-Disposition": f"attachment; filename={filename}.xlsx"
         }
     )
     return response
 
+@router.get("/snapshot")
+async def export_snapshot(
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Vollständigen Datenbank-Snapshot als gzip-komprimiertes NDJSON herunterladen
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Nur Administratoren können Snapshots erstellen")
+    
+    filename = f"kita_snapshot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson.gz"
+    return StreamingResponse(
+        iter_snapshot_gzip(),
+        media_type="application/gzip",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}"
+        }
+    )
+
 class ImportResult(BaseModel):
     success: bool
     imported_count: int
@@ -226,7 +644,7 @@ class ImportResult(BaseModel):
     warnings: List[str]
 
 @router.post("/import/time-entries", response_model=ImportResult)
-async def import_time_entries(
+def import_time_entries(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -234,6 +652,8 @@ async def import_time_entries(
     """
     Zeiterfassung aus CSV/Excel importieren
     """
+    import pandas as pd
+    
     if current_user.role == UserRole.FACHKRAFT:
         raise HTTPException(status_code=403, detail="Keine Berechtigung für Import")
     
@@ -242,7 +662,7 @@ async def import_time_entries(
     
     try:
         # Datei lesen
-        contents = await file.read()
+        contents = file.file.read()
         
         if file.filename.endswith('.csv'):
             df = pd.read_csv(io.StringIO(contents.decode('utf-8')), sep=';')
@@ -260,19 +680,22 @@ async def import_time_entries(
             )
         
         # Import durchführen
-        result = await process_time_entries_import(df, current_user, db)
+        result = process_time_entries_import(df, current_user, db)
         return result
         
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Import-Fehler: {str(e)}")
 
-async def process_time_entries_import(df: pd.DataFrame, current_user: User, db: Session) -> ImportResult:
+def process_time_entries_import(df: "pd.DataFrame", current_user: User, db: Session) -> ImportResult:
     """
     Zeiterfassung-Import verarbeiten
     """
+    import pandas as pd
+    
     imported_count = 0
     errors = []
     warnings = []
+    imported_months = set()
     
     # Benutzer-Mapping erstellen
     users = db.query(User).all()
@@ -347,12 +770,17 @@ async def process_time_entries_import(df: pd.DataFrame, current_user: User, db:
             
             db.add(db_entry)
             imported_count += 1
+            imported_months.add((user_id, entry_date.year, entry_date.month))
             
         except Exception as e:
             errors.append(f"Zeile {index + 2}: {str(e)}")
     
     if imported_count > 0:
         db.commit()
+        
+        # Gecachte Exporte der betroffenen Monate verwerfen
+        for user_id, year, month in imported_months:
+            export_cache.invalidate(user_id, year, month)
     
     return ImportResult(
         success=len(errors) == 0,
@@ -362,13 +790,15 @@ async def process_time_entries_import(df: pd.DataFrame, current_user: User, db:
     )
 
 @router.get("/template/time-entries")
-async def get_time_entries_template(
+def get_time_entries_template(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     """
     CSV-Template für Import herunterladen
     """
+    import pandas as pd
+    
     if current_user.role == UserRole.FACHKRAFT:
         raise HTTPException(status_code=403, detail="Keine Berechtigung")
     
@@ -1,10 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy import select
 from typing import List, Optional
 from datetime import date
+from calendar import monthrange
 from pydantic import BaseModel
-from models import User, UserRole, GlobalEvent
-from auth import get_current_active_user, get_db
+from models import User, UserRole, GlobalEvent, SyncTombstone
+from auth import get_current_active_user, get_db, get_read_db
+from conditional import check_conditional, version_stamp
+from fast_json import response_columns, rows_response
 
 router = APIRouter()
 
@@ -22,6 +26,8 @@ class GlobalEventResponse(GlobalEventBase):
     class Config:
         from_attributes = True
 
+GLOBAL_EVENT_COLUMNS = response_columns(GlobalEvent, GlobalEventResponse)
+
 # Erlaubte Event-Typen
 ALLOWED_EVENT_TYPES = [
     "early_closure_staff",      # Früher Betriebsschluss wegen Personalmangel
@@ -45,8 +51,9 @@ EVENT_TYPE_LABELS = {
     "other": "Sonstiges"
 }
 
-@router.get("/", response_model=List[GlobalEventResponse])
-async def get_global_events(
+@router.get("/", responses={200: {"model": List[GlobalEventResponse]}})
+def get_global_events(
+    response: Response,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     event_type: Optional[str] = None,
@@ -56,19 +63,19 @@ async def get_global_events(
     """
     Abrufen der globalen Events
     """
-    query = db.query(GlobalEvent)
+    query = select(*GLOBAL_EVENT_COLUMNS)
     
     if start_date:
-        query = query.filter(GlobalEvent.date >= start_date)
+        query = query.where(GlobalEvent.date >= start_date)
     if end_date:
-        query = query.filter(GlobalEvent.date <= end_date)
+        query = query.where(GlobalEvent.date <= end_date)
     if event_type:
-        query = query.filter(GlobalEvent.event_type == event_type)
+        query = query.where(GlobalEvent.event_type == event_type)
     
-    return query.order_by(GlobalEvent.date.desc()).all()
+    return rows_response(db.execute(query.order_by(GlobalEvent.date.desc())), response)
 
 @router.post("/", response_model=GlobalEventResponse)
-async def create_global_event(
+def create_global_event(
     event: GlobalEventCreate,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -111,7 +118,7 @@ async def create_global_event(
     return db_event
 
 @router.put("/{event_id}", response_model=GlobalEventResponse)
-async def update_global_event(
+def update_global_event(
     event_id: int,
     event: GlobalEventCreate,
     current_user: User = Depends(get_current_active_user),
@@ -144,7 +151,7 @@ async def update_global_event(
     return db_event
 
 @router.delete("/{event_id}")
-async def delete_global_event(
+def delete_global_event(
     event_id: int,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -161,6 +168,7 @@ async def delete_global_event(
         raise HTTPException(status_code=404, detail="Event nicht gefunden")
     
     db.delete(db_event)
+    db.add(SyncTombstone(entity="global_events", entity_id=event_id))
     db.commit()
     return {"message": "Event gelöscht"}
 
@@ -176,19 +184,10 @@ async def get_event_types():
         ]
     }
 
-@router.get("/calendar")
-async def get_calendar_events(
-    year: int,
-    month: Optional[int] = None,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
-):
+def calendar_range(year: int, month: Optional[int]):
     """
-    Events für Kalenderansicht abrufen
+    Zeitraum für die Kalenderansicht (ein Monat oder ganzes Jahr)
     """
-    from datetime import datetime
-    from calendar import monthrange
-    
     if month:
         # Spezifischer Monat
         start_date = date(year, month, 1)
@@ -198,6 +197,39 @@ async def get_calendar_events(
         # Ganzes Jahr
         start_date = date(year, 1, 1)
         end_date = date(year, 12, 31)
+    return start_date, end_date
+
+def calendar_etag(
+    request: Request,
+    response: Response,
+    year: int,
+    month: Optional[int] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    ETag für die Kalenderansicht aus Versionsstempel des Zeitraums
+
+    Vom Primärserver wie die Kalenderdaten selbst: Mit Replikat-Verzögerung
+    bekäme ein Client nach eigener Änderung ein 304 bzw. ein veraltetes ETag.
+    """
+    start_date, end_date = calendar_range(year, month)
+    check_conditional(
+        request, response,
+        *version_stamp(db, GlobalEvent, GlobalEvent.date >= start_date, GlobalEvent.date <= end_date)
+    )
+
+@router.get("/calendar", dependencies=[Depends(calendar_etag)])
+def get_calendar_events(
+    year: int,
+    month: Optional[int] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Events für Kalenderansicht abrufen
+    """
+    start_date, end_date = calendar_range(year, month)
     
     events = db.query(GlobalEvent).filter(
         GlobalEvent.date >= start_date,
@@ -235,10 +267,10 @@ def get_event_color(event_type: str) -> str:
     return colors.get(event_type, "#64748b")
 
 @router.get("/statistics")
-async def get_event_statistics(
+def get_event_statistics(
     year: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Statistiken zu globalen Events für ein Jahr
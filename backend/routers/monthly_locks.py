@@ -1,13 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, func
+from sqlalchemy import and_, func, insert
 from typing import List, Optional
 from datetime import date, datetime
 from pydantic import BaseModel
 import logging
-from models import User, UserRole, MonthlyLock, TimeEntry
+from models import User, UserRole, MonthlyLock, TimeEntry, SyncTombstone
 from auth import get_current_active_user, get_db
 from email_service import email_service
+from export_cache import export_cache
 from routers.push_notifications import send_monthly_lock_push_notification, send_reminder_push_notification
 
 router = APIRouter()
@@ -45,8 +46,30 @@ class BulkLockRequest(BaseModel):
     month: int
     user_ids: Optional[List[int]] = None  # Wenn leer, alle aktiven Benutzer
 
+def _month_locks(db: Session, year: int, month: int) -> List[MonthlyLock]:
+    """
+    Alle Abschlüsse eines Monats (eine Abfrage statt einer je Benutzer)
+    """
+    return db.query(MonthlyLock).filter(
+        and_(MonthlyLock.year == year, MonthlyLock.month == month)
+    ).all()
+
+def _entry_counts(db: Session, user_ids: List[int], year: int, month: int) -> dict:
+    """
+    Anzahl Zeiteinträge je Benutzer im Monat, gruppiert in einer Abfrage
+    """
+    if not user_ids:
+        return {}
+    return dict(db.query(TimeEntry.user_id, func.count(TimeEntry.id)).filter(
+        and_(
+            TimeEntry.user_id.in_(user_ids),
+            func.year(TimeEntry.date) == year,
+            func.month(TimeEntry.date) == month
+        )
+    ).group_by(TimeEntry.user_id).all())
+
 @router.get("/", response_model=List[MonthlyLockResponse])
-async def get_monthly_locks(
+def get_monthly_locks(
     year: Optional[int] = None,
     month: Optional[int] = None,
     user_id: Optional[int] = None,
@@ -72,7 +95,7 @@ async def get_monthly_locks(
     return query.order_by(MonthlyLock.year.desc(), MonthlyLock.month.desc()).all()
 
 @router.get("/status", response_model=List[MonthlyLockStatus])
-async def get_monthly_lock_status(
+def get_monthly_lock_status(
     year: int,
     month: int,
     current_user: User = Depends(get_current_active_user),
@@ -87,31 +110,18 @@ async def get_monthly_lock_status(
     # Alle aktiven Benutzer abrufen
     users = db.query(User).filter(User.is_active == True).all()
     
+    # Abschlüsse, Namen der Sperrenden und Eintragszahlen je eine Abfrage für alle Benutzer
+    locks = {lock.user_id: lock for lock in _month_locks(db, year, month)}
+    locked_by_ids = {lock.locked_by for lock in locks.values()}
+    locked_by_names = dict(
+        db.query(User.id, User.full_name).filter(User.id.in_(locked_by_ids)).all()
+    ) if locked_by_ids else {}
+    entry_counts = _entry_counts(db, [user.id for user in users], year, month)
+    
     status_list = []
     for user in users:
-        # Prüfen ob Monat gesperrt ist
-        lock = db.query(MonthlyLock).filter(
-            and_(
-                MonthlyLock.user_id == user.id,
-                MonthlyLock.year == year,
-                MonthlyLock.month == month
-            )
-        ).first()
-        
-        # Anzahl Zeiteinträge für den Monat zählen
-        entry_count = db.query(TimeEntry).filter(
-            and_(
-                TimeEntry.user_id == user.id,
-                func.year(TimeEntry.date) == year,
-                func.month(TimeEntry.date) == month
-            )
-        ).count()
-        
-        # Locked-by User Info
-        locked_by_name = None
-        if lock:
-            locked_by_user = db.query(User).filter(User.id == lock.locked_by).first()
-            locked_by_name = locked_by_user.full_name if locked_by_user else "Unbekannt"
+        lock = locks.get(user.id)
+        locked_by_name = locked_by_names.get(lock.locked_by, "Unbekannt") if lock else None
         
         status_list.append(MonthlyLockStatus(
             user_id=user.id,
@@ -122,13 +132,13 @@ async def get_monthly_lock_status(
             locked_at=lock.locked_at if lock else None,
             locked_by=lock.locked_by if lock else None,
             locked_by_name=locked_by_name,
-            entry_count=entry_count
+            entry_count=entry_counts.get(user.id, 0)
         ))
     
     return status_list
 
 @router.post("/", response_model=MonthlyLockResponse)
-async def create_monthly_lock(
+def create_monthly_lock(
     lock_data: MonthlyLockCreate,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -211,7 +221,7 @@ async def create_monthly_lock(
             )
         
         # Push-Benachrichtigung
-        await send_monthly_lock_push_notification(
+        send_monthly_lock_push_notification(
             db=db,
             user_id=lock_data.user_id,
             month=lock_data.month,
@@ -225,7 +235,7 @@ async def create_monthly_lock(
     return db_lock
 
 @router.post("/bulk", response_model=List[MonthlyLockResponse])
-async def bulk_create_monthly_locks(
+def bulk_create_monthly_locks(
     bulk_request: BulkLockRequest,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -242,81 +252,62 @@ async def bulk_create_monthly_locks(
     else:
         users = db.query(User).filter(User.is_active == True).all()
     
-    created_locks = []
     errors = []
     
-    for user in users:
-        # Prüfen ob bereits gesperrt
-        existing_lock = db.query(MonthlyLock).filter(
-            and_(
-                MonthlyLock.user_id == user.id,
-                MonthlyLock.year == bulk_request.year,
-                MonthlyLock.month == bulk_request.month
-            )
-        ).first()
-        
-        if existing_lock:
-            errors.append(f"Benutzer {user.full_name} bereits gesperrt")
-            continue
-        
-        # Monatsabschluss erstellen
-        db_lock = MonthlyLock(
-            user_id=user.id,
-            year=bulk_request.year,
-            month=bulk_request.month,
-            locked_by=current_user.id
-        )
-        
-        db.add(db_lock)
-        
-        # Zeiteinträge sperren
+    # Bereits gesperrte Benutzer überspringen
+    locked_user_ids = {lock.user_id for lock in _month_locks(db, bulk_request.year, bulk_request.month)}
+    errors.extend(f"Benutzer {user.full_name} bereits gesperrt" for user in users if user.id in locked_user_ids)
+    # Empfängerdaten vor dem Commit festhalten, danach wären die Objekte abgelaufen
+    recipients = [(user.id, user.email, user.full_name) for user in users if user.id not in locked_user_ids]
+    user_ids = {user_id for user_id, _, _ in recipients}
+    locked_by_name = current_user.full_name
+    
+    created_locks = []
+    entry_counts = {}
+    if user_ids:
+        # Abschlüsse als ein Mehrfach-INSERT anlegen und Zeiteinträge in einem UPDATE sperren
+        db.execute(insert(MonthlyLock), [
+            {"user_id": user_id, "year": bulk_request.year, "month": bulk_request.month, "locked_by": current_user.id}
+            for user_id in sorted(user_ids)
+        ])
         db.query(TimeEntry).filter(
             and_(
-                TimeEntry.user_id == user.id,
+                TimeEntry.user_id.in_(user_ids),
                 func.year(TimeEntry.date) == bulk_request.year,
                 func.month(TimeEntry.date) == bulk_request.month
             )
-        ).update({TimeEntry.is_locked: True})
+        ).update({TimeEntry.is_locked: True}, synchronize_session=False)
         
-        created_locks.append(db_lock)
-    
-    db.commit()
-    
-    for lock in created_locks:
-        db.refresh(lock)
+        db.commit()
+        
+        created_locks = [
+            lock for lock in _month_locks(db, bulk_request.year, bulk_request.month)
+            if lock.user_id in user_ids
+        ]
+        entry_counts = _entry_counts(db, list(user_ids), bulk_request.year, bulk_request.month)
     
     # E-Mail-Benachrichtigungen für alle erfolgreich gesperrten Benutzer senden
-    for lock in created_locks:
+    for user_id, user_email, user_name in recipients:
         try:
-            user = db.query(User).filter(User.id == lock.user_id).first()
-            if user and user.email:
-                # Anzahl Zeiteinträge ermitteln
-                entry_count = db.query(TimeEntry).filter(
-                    and_(
-                        TimeEntry.user_id == user.id,
-                        func.year(TimeEntry.date) == bulk_request.year,
-                        func.month(TimeEntry.date) == bulk_request.month
-                    )
-                ).count()
-                
+            if user_email:
                 email_service.send_monthly_lock_notification(
-                    user_email=user.email,
-                    user_name=user.full_name,
+                    user_email=user_email,
+                    user_name=user_name,
                     year=bulk_request.year,
                     month=bulk_request.month,
-                    locked_by_name=current_user.full_name,
-                    entry_count=entry_count
+                    locked_by_name=locked_by_name,
+                    entry_count=entry_counts.get(user_id, 0)
                 )
                 
                 # Push-Benachrichtigung
-                await send_monthly_lock_push_notification(
+                send_monthly_lock_push_notification(
                     db=db,
-                    user_id=user.id,
+                    user_id=user_id,
                     month=bulk_request.month,
                     year=bulk_request.year
                 )
         except Exception as e:
-            logger.warning(f"E-Mail-Benachrichtigung für Benutzer {lock.user_id} fehlgeschlagen: {str(e)}")
+            logger.warning(f"E-Mail-Benachrichtigung für Benutzer {user_id} fehlgeschlagen: {str(e)}")
     
     if errors:
         # Warnung über bereits gesperrte Benutzer
@@ -324,40 +315,9 @@ async def bulk_create_monthly_locks(
     
     return created_locks
 
-@router.delete("/{lock_id}")
-async def delete_monthly_lock(
-    lock_id: int,
-    current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
-):
-    """
-    Monatsabschluss aufheben (Monat freigeben)
-    """
-    # Nur Leitung und Admin können Abschlüsse aufheben
-    if current_user.role == UserRole.FACHKRAFT:
-        raise HTTPException(status_code=403, detail="Keine Berechtigung")
-    
-    lock = db.query(MonthlyLock).filter(MonthlyLock.id == lock_id).first()
-    if not lock:
-        raise HTTPException(status_code=404, detail="Monatsabschluss nicht gefunden")
-    
-    # Zeiteinträge entsperren
-    db.query(TimeEntry).filter(
-        and_(
-            TimeEntry.user_id == lock.user_id,
-            func.year(TimeEntry.date) == lock.year,
-            func.month(TimeEntry.date) == lock.month
-        )
-    ).update({TimeEntry.is_locked: False})
-    
-    # Abschluss löschen
-    db.delete(lock)
-    db.commit()
-    
-    return {"message": "Monatsabschluss aufgehoben"}
-
+# Vor /{lock_id} registrieren, sonst wird "bulk" als lock_id gelesen (422)
 @router.delete("/bulk")
-async def bulk_delete_monthly_locks(
+def bulk_delete_monthly_locks(
     year: int,
     month: int,
     user_ids: Optional[List[int]] = None,
@@ -381,25 +341,71 @@ async def bulk_delete_monthly_locks(
         query = query.filter(MonthlyLock.user_id.in_(user_ids))
     
     locks = query.all()
+    locked_user_ids = [lock.user_id for lock in locks]
     
-    # Alle Zeiteinträge entsperren
-    for lock in locks:
+    if locks:
+        # Zeiteinträge entsperren, Abschlüsse löschen und Tombstones anlegen: je eine Anweisung
         db.query(TimeEntry).filter(
             and_(
-                TimeEntry.user_id == lock.user_id,
+                TimeEntry.user_id.in_(locked_user_ids),
                 func.year(TimeEntry.date) == year,
                 func.month(TimeEntry.date) == month
             )
-        ).update({TimeEntry.is_locked: False})
+        ).update({TimeEntry.is_locked: False}, synchronize_session=False)
         
-        db.delete(lock)
+        db.query(MonthlyLock).filter(MonthlyLock.id.in_([lock.id for lock in locks])).delete(synchronize_session=False)
+        db.execute(insert(SyncTombstone), [
+            {"entity": "monthly_locks", "entity_id": lock.id, "user_id": lock.user_id} for lock in locks
+        ])
+        
+        db.commit()
     
-    db.commit()
+    # Gecachte Exporte des Monats verwerfen
+    for user_id in locked_user_ids:
+        export_cache.invalidate(user_id, year, month)
     
     return {"message": f"{len(locks)} Monatsabschlüsse aufgehoben"}
 
+@router.delete("/{lock_id}")
+def delete_monthly_lock(
+    lock_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Monatsabschluss aufheben (Monat freigeben)
+    """
+    # Nur Leitung und Admin können Abschlüsse aufheben
+    if current_user.role == UserRole.FACHKRAFT:
+        raise HTTPException(status_code=403, detail="Keine Berechtigung")
+    
+    lock = db.query(MonthlyLock).filter(MonthlyLock.id == lock_id).first()
+    if not lock:
+        raise HTTPException(status_code=404, detail="Monatsabschluss nicht gefunden")
+    
+    # Zeiteinträge entsperren
+    db.query(TimeEntry).filter(
+        and_(
+            TimeEntry.user_id == lock.user_id,
+            func.year(TimeEntry.date) == lock.year,
+            func.month(TimeEntry.date) == lock.month
+        )
+    ).update({TimeEntry.is_locked: False})
+    
+    lock_scope = (lock.user_id, lock.year, lock.month)
+    
+    # Abschluss löschen
+    db.delete(lock)
+    db.add(SyncTombstone(entity="monthly_locks", entity_id=lock_id, user_id=lock_scope[0]))
+    db.commit()
+    
+    # Gecachte Exporte des Monats verwerfen
+    export_cache.invalidate(*lock_scope)
+    
+    return {"message": "Monatsabschluss aufgehoben"}
+
 @router.post("/send-reminders")
-async def send_monthly_lock_reminders(
+def send_monthly_lock_reminders(
     year: int,
     month: int,
     days_until_deadline: int = 3,
@@ -420,21 +426,13 @@ async def send_monthly_lock_reminders(
         query = query.filter(User.id.in_(user_ids))
     
     users = query.all()
+    locked_user_ids = {lock.user_id for lock in _month_locks(db, year, month)}
     
     sent_count = 0
     errors = []
     
     for user in users:
-        # Prüfen ob bereits gesperrt
-        existing_lock = db.query(MonthlyLock).filter(
-            and_(
-                MonthlyLock.user_id == user.id,
-                MonthlyLock.year == year,
-                MonthlyLock.month == month
-            )
-        ).first()
-        
-        if existing_lock:
+        if user.id in locked_user_ids:
             continue  # Bereits gesperrt, keine Erinnerung nötig
         
         # E-Mail-Erinnerung senden
@@ -451,7 +449,7 @@ async def send_monthly_lock_reminders(
                     sent_count += 1
                     
                     # Auch Push-Benachrichtigung senden
-                    await send_reminder_push_notification(
+                    send_reminder_push_notification(
                         db=db,
                         user_id=user.id,
                         month=month,
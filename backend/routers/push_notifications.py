@@ -7,7 +7,6 @@ from pydantic import BaseModel
 import json
 import os
 import logging
-from pywebpush import webpush, WebPushException
 from models import User, UserRole, Base
 from auth import get_current_active_user, get_db
 from database import engine
@@ -84,7 +83,7 @@ VAPID_PUBLIC_KEY = os.getenv("VAPID_PUBLIC_KEY", "")
 VAPID_CONTACT = os.getenv("VAPID_CONTACT", "mailto:admin@kita-dienstplan.de")
 
 @router.post("/subscribe", response_model=PushSubscriptionResponse)
-async def subscribe_to_push(
+def subscribe_to_push(
     request: PushSubscriptionRequest,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -143,7 +142,7 @@ async def subscribe_to_push(
         raise HTTPException(status_code=500, detail="Subscription fehlgeschlagen")
 
 @router.delete("/unsubscribe")
-async def unsubscribe_from_push(
+def unsubscribe_from_push(
     endpoint: str,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -165,7 +164,7 @@ async def unsubscribe_from_push(
     return {"message": "Push-Benachrichtigungen deaktiviert"}
 
 @router.post("/send", response_model=PushNotificationResponse)
-async def send_push_notification(
+def send_push_notification(
     notification: PushNotificationRequest,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -183,6 +182,9 @@ async def send_push_notification(
             detail="VAPID-Keys nicht konfiguriert"
         )
     
+    # pywebpush (inkl. Krypto-Bibliotheken) erst beim ersten Versand laden
+    from pywebpush import webpush, WebPushException
+    
     # Notification in DB speichern
     db_notification = PushNotification(
         user_id=notification.user_ids[0] if notification.user_ids and len(notification.user_ids) == 1 else None,
@@ -257,7 +259,7 @@ async def send_push_notification(
     return db_notification
 
 @router.get("/subscriptions", response_model=List[PushSubscriptionResponse])
-async def get_user_subscriptions(
+def get_user_subscriptions(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
@@ -272,7 +274,7 @@ async def get_user_subscriptions(
     return subscriptions
 
 @router.get("/notifications", response_model=List[PushNotificationResponse])
-async def get_notifications_history(
+def get_notifications_history(
     limit: int = 50,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -301,7 +303,7 @@ async def get_vapid_public_key():
     return {"publicKey": VAPID_PUBLIC_KEY}
 
 # Convenience Functions für andere Module
-async def send_monthly_lock_push_notification(
+def send_monthly_lock_push_notification(
     db: Session,
     user_id: int,
     month: int,
@@ -314,6 +316,8 @@ async def send_monthly_lock_push_notification(
         logger.warning("VAPID keys not configured, skipping push notification")
         return False
     
+    from pywebpush import webpush, WebPushException
+    
     try:
         month_names = [
             "Januar", "Februar", "März", "April", "Mai", "Juni",
@@ -377,7 +381,7 @@ async def send_monthly_lock_push_notification(
         logger.error(f"Failed to send monthly lock push notification: {str(e)}")
         return False
 
-async def send_reminder_push_notification(
+def send_reminder_push_notification(
     db: Session,
     user_id: int,
     month: int,
@@ -391,6 +395,8 @@ async def send_reminder_push_notification(
         logger.warning("VAPID keys not configured, skipping push notification")
         return False
     
+    from pywebpush import webpush, WebPushException
+    
     try:
         month_names = [
             "Januar", "Februar", "März", "April", "Mai", "Juni",
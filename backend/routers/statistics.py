@@ -4,11 +4,20 @@ from sqlalchemy import func, and_
 from typing import Dict, List, Optional
 from datetime import date, datetime, timedelta
 from pydantic import BaseModel
+import calendar
 from models import User, UserRole, TimeEntry, TimeEntryType, WorkTimeSubtype, ChildCount, GlobalEvent
-from auth import get_current_active_user, get_db
+from auth import get_current_active_user, get_read_db
 
 router = APIRouter()
 
+def monthly_target_hours(user: User, year: int, month: int) -> float:
+    """
+    Sollstunden eines Benutzers für einen Monat (vereinfacht)
+    """
+    days_in_month = calendar.monthrange(year, month)[1]
+    work_days_in_month = days_in_month * user.work_days_per_week / 7
+    return (user.weekly_hours + user.additional_hours) * work_days_in_month / user.work_days_per_week
+
 class WeeklyStatistics(BaseModel):
     user_id: int
     user_name: str
@@ -42,29 +51,32 @@ class UserAnnualStatistics(BaseModel):
     praktikum_days: float
 
 @router.get("/weekly", response_model=List[WeeklyStatistics])
-async def get_weekly_statistics(
+def get_weekly_statistics(
     week_start: date,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     if current_user.role == UserRole.FACHKRAFT:
+        # current_user ist ein Principal mit der Arbeitszeit-Konfiguration
         users = [current_user]
     else:
         users = db.query(User).filter(User.is_active == True).all()
     
     week_end = week_start + timedelta(days=6)
-    statistics = []
     
+    # Gearbeitete Stunden aller Benutzer für die Woche in einer gruppierten Abfrage
+    worked_by_user = dict(db.query(TimeEntry.user_id, func.sum(TimeEntry.hours)).filter(
+        and_(
+            TimeEntry.user_id.in_([user.id for user in users]),
+            TimeEntry.date >= week_start,
+            TimeEntry.date <= week_end,
+            TimeEntry.entry_type == TimeEntryType.ARBEITSZEIT
+        )
+    ).group_by(TimeEntry.user_id).all())
+    
+    statistics = []
     for user in users:
-        # Berechne gearbeitete Stunden für die Woche
-        worked_hours = db.query(func.sum(TimeEntry.hours)).filter(
-            and_(
-                TimeEntry.user_id == user.id,
-                TimeEntry.date >= week_start,
-                TimeEntry.date <= week_end,
-                TimeEntry.entry_type == TimeEntryType.ARBEITSZEIT
-            )
-        ).scalar() or 0.0
+        worked_hours = worked_by_user.get(user.id) or 0.0
         
         # Berechne Sollstunden (Wochenstunden + Sonderstunden)
         target_hours = user.weekly_hours + user.additional_hours
@@ -82,55 +94,41 @@ async def get_weekly_statistics(
     return statistics
 
 @router.get("/monthly", response_model=List[MonthlyStatistics])
-async def get_monthly_statistics(
+def get_monthly_statistics(
     year: int,
     month: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     if current_user.role == UserRole.FACHKRAFT:
+        # current_user ist ein Principal mit der Arbeitszeit-Konfiguration
         users = [current_user]
     else:
         users = db.query(User).filter(User.is_active == True).all()
     
-    statistics = []
-    
-    for user in users:
-        # Gearbeitete Stunden im Monat
-        worked_hours = db.query(func.sum(TimeEntry.hours)).filter(
-            and_(
-                TimeEntry.user_id == user.id,
-                func.year(TimeEntry.date) == year,
-                func.month(TimeEntry.date) == month,
-                TimeEntry.entry_type == TimeEntryType.ARBEITSZEIT
-            )
-        ).scalar() or 0.0
-        
-        # Kranktage
-        sick_days = db.query(func.sum(TimeEntry.days)).filter(
-            and_(
-                TimeEntry.user_id == user.id,
-                func.year(TimeEntry.date) == year,
-                func.month(TimeEntry.date) == month,
-                TimeEntry.entry_type == TimeEntryType.KRANK
-            )
-        ).scalar() or 0.0
-        
-        # Urlaubstage
-        vacation_days = db.query(func.sum(TimeEntry.days)).filter(
+    # Arbeitsstunden, Krank- und Urlaubstage aller Benutzer in einer gruppierten Abfrage
+    totals = {
+        (user_id, entry_type): (hours or 0.0, days or 0.0)
+        for user_id, entry_type, hours, days in db.query(
+            TimeEntry.user_id, TimeEntry.entry_type, func.sum(TimeEntry.hours), func.sum(TimeEntry.days)
+        ).filter(
             and_(
-                TimeEntry.user_id == user.id,
+                TimeEntry.user_id.in_([user.id for user in users]),
                 func.year(TimeEntry.date) == year,
                 func.month(TimeEntry.date) == month,
-                TimeEntry.entry_type == TimeEntryType.URLAUB
+                TimeEntry.entry_type.in_([TimeEntryType.ARBEITSZEIT, TimeEntryType.KRANK, TimeEntryType.URLAUB])
             )
-        ).scalar() or 0.0
+        ).group_by(TimeEntry.user_id, TimeEntry.entry_type).all()
+    }
+    
+    statistics = []
+    for user in users:
+        worked_hours = totals.get((user.id, TimeEntryType.ARBEITSZEIT), (0.0, 0.0))[0]
+        sick_days = totals.get((user.id, TimeEntryType.KRANK), (0.0, 0.0))[1]
+        vacation_days = totals.get((user.id, TimeEntryType.URLAUB), (0.0, 0.0))[1]
         
         # Berechne Sollstunden für den Monat (vereinfacht)
-        import calendar
-        days_in_month = calendar.monthrange(year, month)[1]
-        work_days_in_month = days_in_month * user.work_days_per_week / 7
-        target_hours = (user.weekly_hours + user.additional_hours) * work_days_in_month / user.work_days_per_week
+        target_hours = monthly_target_hours(user, year, month)
         
         overtime = worked_hours - target_hours
         
@@ -149,11 +147,11 @@ async def get_monthly_statistics(
     return statistics
 
 @router.get("/annual/{user_id}", response_model=UserAnnualStatistics)
-async def get_user_annual_statistics(
+def get_user_annual_statistics(
     user_id: int,
     year: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     # Rechteverwaltung
     if current_user.role == UserRole.FACHKRAFT and user_id != current_user.id:
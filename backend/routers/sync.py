@@ -0,0 +1,201 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, or_, select
+from typing import List, Optional
+from datetime import date, datetime, timedelta
+from pydantic import BaseModel
+import base64
+import binascii
+import os
+from models import User, UserRole, TimeEntry, GlobalEvent, MonthlyLock, SyncTombstone
+from auth import get_current_active_user, get_db
+from routers.time_entries import TimeEntryResponse, MAX_PAGE_SIZE
+from routers.global_events import GlobalEventResponse
+from routers.monthly_locks import MonthlyLockResponse
+
+router = APIRouter()
+
+# Überlappung zwischen zwei Sync-Läufen, damit spät committete Änderungen nicht verloren gehen
+SYNC_OVERLAP_SECONDS = 5
+# Tombstones werden nach dieser Zeit gelöscht - ältere Tokens erzwingen eine Vollsynchronisation
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("SYNC_TOMBSTONE_RETENTION_DAYS", "90"))
+
+class SyncTimeEntry(TimeEntryResponse):
+    updated_at: Optional[datetime] = None
+
+class SyncGlobalEvent(GlobalEventResponse):
+    updated_at: Optional[datetime] = None
+
+class SyncChanges(BaseModel):
+    updated: list
+    deleted: List[int]
+
+class SyncResponse(BaseModel):
+    token: str
+    reset: bool  # True: Client muss seinen lokalen Bestand vollständig ersetzen
+    time_entries: SyncChanges
+    global_events: SyncChanges
+    monthly_locks: SyncChanges
+    next_cursor: Optional[str] = None  # Weitere Seite mit Zeiteinträgen vorhanden
+
+def encode_sync_token(timestamp: datetime) -> str:
+    return base64.urlsafe_b64encode(timestamp.isoformat().encode()).decode()
+
+def decode_sync_token(token: str) -> datetime:
+    try:
+        return datetime.fromisoformat(base64.urlsafe_b64decode(token.encode()).decode())
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+def encode_sync_cursor(token_time: datetime, entry_date: date, entry_id: int) -> str:
+    """
+    Cursor für die nächste Seite: Zeitpunkt des Sync-Laufs und (date, id) des letzten Eintrags
+    """
+    return base64.urlsafe_b64encode(
+        f"{token_time.isoformat()}|{entry_date.isoformat()}|{entry_id}".encode()
+    ).decode()
+
+def decode_sync_cursor(cursor: str):
+    try:
+        token_time, entry_date, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(token_time), date.fromisoformat(entry_date), int(entry_id)
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def purge_tombstones(db: Session) -> int:
+    """
+    Tombstones außerhalb des Aufbewahrungszeitraums löschen
+    """
+    # Zeitstempel der Datenbank, wie deleted_at und die Prüfung in sync_changes
+    now = db.execute(select(func.now())).scalar()
+    cutoff = now - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    deleted = db.query(SyncTombstone).filter(SyncTombstone.deleted_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+@router.get("/", response_model=SyncResponse)
+def sync_changes(
+    since: Optional[str] = None,
+    start_date: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Änderungen seit dem letzten Sync-Token abrufen
+
+    Ohne Token (oder bei abgelaufenem Token) wird der vollständige Bestand ab
+    start_date (Standard: 1. Januar des laufenden Jahres) geliefert und
+    reset=true gesetzt. Das zurückgegebene Token wird beim nächsten Aufruf als
+    since übergeben.
+
+    Zeiteinträge werden in Seiten zu limit Einträgen nach (date, id) geliefert.
+    Ist next_cursor gesetzt, holt der Client mit denselben Parametern und
+    cursor=next_cursor die nächste Seite. Folgeseiten enthalten nur
+    Zeiteinträge, reset=false und dasselbe Token wie die erste Seite.
+    """
+    cursor_date = cursor_id = None
+    if cursor:
+        # Folgeseite: Zeitpunkt des Sync-Laufs aus dem Cursor, damit das Token gleich bleibt
+        now, cursor_date, cursor_id = decode_sync_cursor(cursor)
+    else:
+        # Zeitstempel der Datenbank verwenden - updated_at wird ebenfalls dort gesetzt
+        now = db.execute(select(func.now())).scalar()
+
+    changed_since = None
+    if since:
+        changed_since = decode_sync_token(since) - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+        if changed_since < now - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+            changed_since = None
+    reset = changed_since is None
+    if reset and not start_date:
+        start_date = date(now.year, 1, 1)
+
+    is_fachkraft = current_user.role == UserRole.FACHKRAFT
+
+    # Zeiteinträge
+    entries_query = db.query(TimeEntry)
+    if is_fachkraft:
+        entries_query = entries_query.filter(TimeEntry.user_id == current_user.id)
+    if start_date:
+        entries_query = entries_query.filter(TimeEntry.date >= start_date)
+    if changed_since:
+        entries_query = entries_query.filter(TimeEntry.updated_at >= changed_since)
+    if cursor:
+        entries_query = entries_query.filter(or_(
+            TimeEntry.date > cursor_date,
+            and_(TimeEntry.date == cursor_date, TimeEntry.id > cursor_id)
+        ))
+    time_entries = entries_query.order_by(TimeEntry.date, TimeEntry.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(time_entries) > limit:
+        time_entries = time_entries[:limit]
+        next_cursor = encode_sync_cursor(now, time_entries[-1].date, time_entries[-1].id)
+
+    if cursor:
+        # Events, Abschlüsse und Löschungen kamen mit der ersten Seite
+        return SyncResponse(
+            token=encode_sync_token(now),
+            reset=False,
+            time_entries=SyncChanges(
+                updated=[SyncTimeEntry.model_validate(entry) for entry in time_entries],
+                deleted=[]
+            ),
+            global_events=SyncChanges(updated=[], deleted=[]),
+            monthly_locks=SyncChanges(updated=[], deleted=[]),
+            next_cursor=next_cursor
+        )
+
+    # Globale Events (alte Zeilen ohne updated_at werden über created_at erkannt)
+    events_query = db.query(GlobalEvent)
+    if start_date:
+        events_query = events_query.filter(GlobalEvent.date >= start_date)
+    if changed_since:
+        events_query = events_query.filter(
+            func.coalesce(GlobalEvent.updated_at, GlobalEvent.created_at) >= changed_since
+        )
+    global_events = events_query.order_by(GlobalEvent.date, GlobalEvent.id).all()
+
+    # Monatsabschlüsse
+    locks_query = db.query(MonthlyLock)
+    if is_fachkraft:
+        locks_query = locks_query.filter(MonthlyLock.user_id == current_user.id)
+    if start_date:
+        locks_query = locks_query.filter(MonthlyLock.year >= start_date.year)
+    if changed_since:
+        locks_query = locks_query.filter(MonthlyLock.locked_at >= changed_since)
+    monthly_locks = locks_query.order_by(MonthlyLock.year, MonthlyLock.month, MonthlyLock.id).all()
+
+    # Löschungen
+    deleted = {"time_entries": [], "global_events": [], "monthly_locks": []}
+    if changed_since:
+        tombstones_query = db.query(SyncTombstone.entity, SyncTombstone.entity_id).filter(
+            SyncTombstone.deleted_at >= changed_since
+        )
+        if is_fachkraft:
+            tombstones_query = tombstones_query.filter(
+                (SyncTombstone.user_id == current_user.id) | (SyncTombstone.user_id.is_(None))
+            )
+        for entity, entity_id in tombstones_query.all():
+            if entity in deleted:
+                deleted[entity].append(entity_id)
+
+    return SyncResponse(
+        token=encode_sync_token(now),
+        reset=reset,
+        time_entries=SyncChanges(
+            updated=[SyncTimeEntry.model_validate(entry) for entry in time_entries],
+            deleted=deleted["time_entries"]
+        ),
+        global_events=SyncChanges(
+            updated=[SyncGlobalEvent.model_validate(event) for event in global_events],
+            deleted=deleted["global_events"]
+        ),
+        monthly_locks=SyncChanges(
+            updated=[MonthlyLockResponse.model_validate(lock) for lock in monthly_locks],
+            deleted=deleted["monthly_locks"]
+        ),
+        next_cursor=next_cursor
+    )
@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Request, Response
 from sqlalchemy.orm import Session
+from sqlalchemy import and_, insert, or_, select
 from typing import List, Optional
 from datetime import date
 from pydantic import BaseModel
-from models import User, UserRole, TimeEntry, TimeEntryType, WorkTimeSubtype, MonthlyLock
+import base64
+import binascii
+from models import User, UserRole, TimeEntry, TimeEntryType, WorkTimeSubtype, MonthlyLock, SyncTombstone
 from auth import get_current_active_user, get_db
+from export_cache import export_cache
+from conditional import check_conditional, version_stamp, version_etag, check_if_match, flush_versioned
+from fast_json import FastJSONResponse
 
 router = APIRouter()
 
@@ -25,35 +31,163 @@ class TimeEntryResponse(TimeEntryBase):
     is_locked: bool
     prep_time_hours: float = 0.0
     total_hours: float = 0.0
+    version: int = 1
     
     class Config:
         from_attributes = True
 
-@router.get("/", response_model=List[TimeEntryResponse])
-async def get_time_entries(
+class TimeEntryPatch(BaseModel):
+    id: int
+    version: Optional[int] = None  # Erwartete Version, bei Abweichung 412
+    date: Optional[date] = None
+    entry_type: Optional[TimeEntryType] = None
+    subtype: Optional[WorkTimeSubtype] = None
+    hours: Optional[float] = None
+    days: Optional[float] = None
+    description: Optional[str] = None
+
+class BulkTimeEntryCreate(BaseModel):
+    entries: List[TimeEntryCreate]
+
+class BulkTimeEntryPatch(BaseModel):
+    entries: List[TimeEntryPatch]
+
+CONFLICT_DETAIL = "Time entry was modified by another user"
+
+# Maximale Anzahl Einträge pro Bulk-Request (z.B. eine ganze Woche)
+MAX_BULK_ENTRIES = 100
+
+# Seitengröße für GET /time-entries (Fortsetzung über X-Next-Cursor)
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 2000
+
+TIME_ENTRY_FIELDS = list(TimeEntryResponse.model_fields)
+
+def encode_cursor(entry_date: date, entry_id: int) -> str:
+    """
+    Keyset-Cursor aus (date, id) des letzten Eintrags erzeugen
+    """
+    return base64.urlsafe_b64encode(f"{entry_date.isoformat()}|{entry_id}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        entry_date, entry_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(entry_date), int(entry_id)
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def time_entry_scope(
+    current_user: User,
+    user_id: Optional[int],
+    start_date: Optional[date],
+    end_date: Optional[date]
+) -> list:
+    """
+    Filter für den sichtbaren Bereich von GET /time-entries
+    """
+    filters = []
+    
+    # Rechteverwaltung: Fachkräfte sehen nur ihre eigenen Einträge
+    if current_user.role == UserRole.FACHKRAFT:
+        filters.append(TimeEntry.user_id == current_user.id)
+    elif user_id:
+        filters.append(TimeEntry.user_id == user_id)
+    
+    if start_date:
+        filters.append(TimeEntry.date >= start_date)
+    if end_date:
+        filters.append(TimeEntry.date <= end_date)
+    
+    return filters
+
+def time_entries_etag(
+    request: Request,
+    response: Response,
     user_id: Optional[int] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    query = db.query(TimeEntry)
+    """
+    ETag für GET /time-entries (eine Aggregat-Abfrage über den sichtbaren Bereich)
+
+    Ab- und Aufschließen eines Monats ändert is_locked der betroffenen Einträge
+    und damit den Stempel, Monatsabschlüsse selbst müssen nicht abgefragt werden.
+    """
+    filters = time_entry_scope(current_user, user_id, start_date, end_date)
+    check_conditional(
+        request, response,
+        current_user.id, current_user.role.value,
+        *version_stamp(db, TimeEntry, *filters)
+    )
+
+@router.get("/", responses={200: {"model": List[TimeEntryResponse]}}, dependencies=[Depends(time_entries_etag)])
+def get_time_entries(
+    response: Response,
+    user_id: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Zeiteinträge seitenweise nach (date, id) abrufen
+
+    Ist eine weitere Seite vorhanden, enthält der Header X-Next-Cursor den Cursor dafür.
+    Mit fields (kommagetrennt) werden nur die angegebenen Felder geladen und geliefert,
+    sonst alle Felder von TimeEntryResponse.
+    Bei unverändertem Bestand (If-None-Match) wird ohne Abfrage mit 304 geantwortet.
+    """
+    filters = time_entry_scope(current_user, user_id, start_date, end_date)
     
-    # Rechteverwaltung: Fachkräfte sehen nur ihre eigenen Einträge
-    if current_user.role == UserRole.FACHKRAFT:
-        query = query.filter(TimeEntry.user_id == current_user.id)
-    elif user_id:
-        query = query.filter(TimeEntry.user_id == user_id)
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        filters.append(or_(
+            TimeEntry.date > cursor_date,
+            and_(TimeEntry.date == cursor_date, TimeEntry.id > cursor_id)
+        ))
     
-    if start_date:
-        query = query.filter(TimeEntry.date >= start_date)
-    if end_date:
-        query = query.filter(TimeEntry.date <= end_date)
+    requested_fields = TIME_ENTRY_FIELDS
+    if fields:
+        requested_fields = [field.strip() for field in fields.split(",") if field.strip()]
+        invalid = [field for field in requested_fields if field not in TIME_ENTRY_FIELDS]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(invalid)}")
+    
+    # Projektion: nur benötigte Spalten laden, ohne ORM-Objekte und Response-Validierung
+    column_names = {"id", "date"} | set(requested_fields)
+    if "total_hours" in column_names:
+        column_names |= {"hours", "prep_time_hours"}
+        column_names.discard("total_hours")
+    columns = [getattr(TimeEntry, name) for name in TIME_ENTRY_FIELDS if name in column_names]
+    
+    rows = db.execute(
+        select(*columns).where(*filters).order_by(TimeEntry.date, TimeEntry.id).limit(limit + 1)
+    ).all()
+    
+    # ETag/Cache-Control aus der Abhängigkeit übernehmen
+    headers = dict(response.headers)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].date, rows[-1].id)
+    
+    keys = [column.key for column in columns]
+    with_total = "total_hours" in requested_fields
+    items = []
+    for row in rows:
+        values = dict(zip(keys, row))
+        if with_total:
+            values["total_hours"] = (values["hours"] or 0.0) + (values["prep_time_hours"] or 0.0)
+        items.append({field: values[field] for field in requested_fields})
     
-    return query.all()
+    return FastJSONResponse(content=items, headers=headers)
 
 @router.post("/", response_model=TimeEntryResponse)
-async def create_time_entry(
+def create_time_entry(
     entry: TimeEntryCreate,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -89,13 +223,185 @@ async def create_time_entry(
     db.refresh(db_entry)
     return db_entry
 
+def ensure_months_unlocked(db: Session, scopes: set):
+    """
+    Monatsabschluss für eine Menge von (user_id, year, month) mit einer Abfrage prüfen
+    """
+    if not scopes:
+        return
+    
+    user_ids = {user_id for user_id, _, _ in scopes}
+    years = {year for _, year, _ in scopes}
+    locks = db.query(MonthlyLock.user_id, MonthlyLock.year, MonthlyLock.month).filter(
+        MonthlyLock.user_id.in_(user_ids),
+        MonthlyLock.year.in_(years)
+    ).all()
+    
+    locked = {(lock.user_id, lock.year, lock.month) for lock in locks} & scopes
+    if locked:
+        months = ", ".join(f"{month}/{year}" for _, year, month in sorted(locked))
+        raise HTTPException(status_code=400, detail=f"Month is already locked for this user: {months}")
+
+def check_bulk_size(count: int):
+    if count == 0:
+        raise HTTPException(status_code=400, detail="No entries given")
+    if count > MAX_BULK_ENTRIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ENTRIES} entries per request")
+
+def load_entries_for_change(db: Session, entry_ids: List[int], current_user: User) -> dict:
+    """
+    Einträge für Bulk-Änderungen laden und Berechtigungen prüfen
+    """
+    entries = db.query(TimeEntry).filter(TimeEntry.id.in_(entry_ids)).all()
+    entries_by_id = {entry.id: entry for entry in entries}
+    
+    missing = [str(entry_id) for entry_id in entry_ids if entry_id not in entries_by_id]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Time entries not found: {', '.join(missing)}")
+    
+    # Rechteverwaltung
+    if current_user.role == UserRole.FACHKRAFT:
+        for entry in entries:
+            if entry.user_id != current_user.id:
+                raise HTTPException(status_code=403, detail="Not enough permissions")
+            if entry.is_locked:
+                raise HTTPException(status_code=400, detail=f"Entry {entry.id} is locked")
+    
+    return entries_by_id
+
+@router.post("/bulk", response_model=List[TimeEntryResponse])
+def bulk_create_time_entries(
+    bulk_request: BulkTimeEntryCreate,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Mehrere Zeiteinträge (z.B. eine ganze Woche) atomar anlegen
+    """
+    check_bulk_size(len(bulk_request.entries))
+    
+    # Monatsabschluss einmal pro betroffenem Monat prüfen
+    ensure_months_unlocked(db, {
+        (current_user.id, entry.date.year, entry.date.month) for entry in bulk_request.entries
+    })
+    
+    db_entries = []
+    for entry in bulk_request.entries:
+        db_entry = TimeEntry(
+            user_id=current_user.id,
+            date=entry.date,
+            entry_type=entry.entry_type,
+            subtype=entry.subtype,
+            hours=entry.hours,
+            days=entry.days,
+            description=entry.description,
+            is_locked=False
+        )
+        # Automatische Vorbereitungszeit berechnen
+        db_entry.calculate_prep_time()
+        db_entries.append(db_entry)
+    
+    db.add_all(db_entries)
+    db.flush()
+    
+    # Antwort vor dem Commit aufbauen, damit nicht jeder Eintrag neu geladen werden muss
+    result = [TimeEntryResponse.model_validate(db_entry) for db_entry in db_entries]
+    db.commit()
+    return result
+
+@router.patch("/bulk", response_model=List[TimeEntryResponse])
+def bulk_update_time_entries(
+    bulk_request: BulkTimeEntryPatch,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Mehrere Zeiteinträge atomar ändern (nur übergebene Felder werden gesetzt)
+    """
+    check_bulk_size(len(bulk_request.entries))
+    
+    entry_ids = [patch.id for patch in bulk_request.entries]
+    entries_by_id = load_entries_for_change(db, entry_ids, current_user)
+    
+    # Alte und neue Monate einmal pro (Benutzer, Monat) prüfen
+    scopes = set()
+    for patch in bulk_request.entries:
+        db_entry = entries_by_id[patch.id]
+        scopes.add((db_entry.user_id, db_entry.date.year, db_entry.date.month))
+        if patch.date:
+            scopes.add((db_entry.user_id, patch.date.year, patch.date.month))
+    
+    if current_user.role == UserRole.FACHKRAFT:
+        ensure_months_unlocked(db, scopes)
+    
+    for patch in bulk_request.entries:
+        db_entry = entries_by_id[patch.id]
+        if patch.version is not None and patch.version != db_entry.version:
+            raise HTTPException(status_code=412, detail=f"{CONFLICT_DETAIL}: {patch.id}")
+        for field, value in patch.model_dump(exclude_unset=True, exclude={"id", "version"}).items():
+            # Pflichtfelder lassen sich nicht auf null setzen
+            if value is None and field not in ("subtype", "description"):
+                continue
+            setattr(db_entry, field, value)
+        
+        # Automatische Vorbereitungszeit neu berechnen
+        db_entry.calculate_prep_time()
+    
+    flush_versioned(db, CONFLICT_DETAIL)
+    result = [TimeEntryResponse.model_validate(entries_by_id[entry_id]) for entry_id in entry_ids]
+    db.commit()
+    
+    # Gecachte Exporte der betroffenen Monate verwerfen
+    for user_id, year, month in scopes:
+        export_cache.invalidate(user_id, year, month)
+    return result
+
+@router.delete("/bulk")
+def bulk_delete_time_entries(
+    ids: List[int] = Query(...),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Mehrere Zeiteinträge atomar löschen
+    """
+    check_bulk_size(len(ids))
+    
+    entries_by_id = load_entries_for_change(db, ids, current_user)
+    scopes = {(entry.user_id, entry.date.year, entry.date.month) for entry in entries_by_id.values()}
+    
+    if current_user.role == UserRole.FACHKRAFT:
+        ensure_months_unlocked(db, scopes)
+    
+    db.query(TimeEntry).filter(TimeEntry.id.in_(list(entries_by_id))).delete(synchronize_session=False)
+    
+    # Löschungen für die Delta-Synchronisation vormerken (ein Mehrfach-INSERT statt einem je Eintrag)
+    db.execute(insert(SyncTombstone), [
+        {"entity": "time_entries", "entity_id": entry.id, "user_id": entry.user_id}
+        for entry in entries_by_id.values()
+    ])
+    db.commit()
+    
+    # Gecachte Exporte der betroffenen Monate verwerfen
+    for user_id, year, month in scopes:
+        export_cache.invalidate(user_id, year, month)
+    return {"message": f"{len(entries_by_id)} time entries deleted"}
+
 @router.put("/{entry_id}", response_model=TimeEntryResponse)
-async def update_time_entry(
+def update_time_entry(
     entry_id: int,
     entry: TimeEntryCreate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
+    """
+    Zeiteintrag ändern
+
+    Mit If-Match (Version aus der Antwort bzw. dem ETag) wird nur geändert, wenn
+    der Eintrag seitdem nicht von jemand anderem geändert wurde, sonst 412.
+    """
     db_entry = db.query(TimeEntry).filter(TimeEntry.id == entry_id).first()
     if not db_entry:
         raise HTTPException(status_code=404, detail="Time entry not found")
@@ -108,6 +414,10 @@ async def update_time_entry(
     if db_entry.is_locked and current_user.role == UserRole.FACHKRAFT:
         raise HTTPException(status_code=400, detail="Entry is locked")
     
+    check_if_match(if_match, db_entry.version, CONFLICT_DETAIL)
+    
+    previous_date = db_entry.date
+    
     db_entry.date = entry.date
     db_entry.entry_type = entry.entry_type
     db_entry.subtype = entry.subtype
@@ -118,12 +428,19 @@ async def update_time_entry(
     # Automatische Vorbereitungszeit neu berechnen
     db_entry.calculate_prep_time()
     
+    # UPDATE ... WHERE id=? AND version=? - parallele Änderung ergibt 412
+    flush_versioned(db, CONFLICT_DETAIL)
     db.commit()
     db.refresh(db_entry)
+    response.headers["ETag"] = version_etag(db_entry.version)
+    
+    # Gecachte Exporte der betroffenen Monate verwerfen
+    export_cache.invalidate(db_entry.user_id, previous_date.year, previous_date.month)
+    export_cache.invalidate(db_entry.user_id, db_entry.date.year, db_entry.date.month)
     return db_entry
 
 @router.delete("/{entry_id}")
-async def delete_time_entry(
+def delete_time_entry(
     entry_id: int,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -140,6 +457,12 @@ async def delete_time_entry(
     if db_entry.is_locked and current_user.role == UserRole.FACHKRAFT:
         raise HTTPException(status_code=400, detail="Entry is locked")
     
+    user_id, entry_date = db_entry.user_id, db_entry.date
+    
     db.delete(db_entry)
+    db.add(SyncTombstone(entity="time_entries", entity_id=entry_id, user_id=user_id))
     db.commit()
+    
+    # Gecachte Exporte des Monats verwerfen
+    export_cache.invalidate(user_id, entry_date.year, entry_date.month)
     return {"message": "Time entry deleted"}
\ No newline at end of file
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response
 from sqlalchemy.orm import Session
+from sqlalchemy import select
 from typing import List
 from pydantic import BaseModel
-from models import User, UserRole
-from auth import get_current_active_user, get_db, get_password_hash
+from models import User, UserRole, RefreshToken
+from auth import get_current_active_user, get_db, get_password_hash_limited
+from fast_json import response_columns, rows_response
 
 router = APIRouter()
 
@@ -27,23 +29,26 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+USER_COLUMNS = response_columns(User, UserResponse)
+
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_active_user)):
+def read_users_me(current_user: User = Depends(get_current_active_user)):
+    # current_user (Principal aus dem Anmelde-Cache) enthält alle Felder von UserResponse
     return current_user
 
-@router.get("/", response_model=List[UserResponse])
-async def read_users(
+@router.get("/", responses={200: {"model": List[UserResponse]}})
+def read_users(
+    response: Response,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
     if current_user.role not in [UserRole.LEITUNG, UserRole.ADMIN]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    users = db.query(User).all()
-    return users
+    return rows_response(db.execute(select(*USER_COLUMNS)), response)
 
 @router.post("/", response_model=UserResponse)
-async def create_user(
+def create_user(
     user: UserCreate,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -55,7 +60,7 @@ async def create_user(
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = get_password_hash_limited(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -73,7 +78,7 @@ async def create_user(
     return db_user
 
 @router.delete("/{user_id}")
-async def delete_user(
+def delete_user(
     user_id: int,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -88,6 +93,8 @@ async def delete_user(
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    db.query(RefreshToken).filter(RefreshToken.user_id == user_id).delete(synchronize_session=False)
+    # Zwischengespeicherte Anmeldungen verwirft der Commit (auth.invalidate_changed_principals)
     db.delete(db_user)
     db.commit()
     return {"message": "User deleted successfully"}
\ No newline at end of file
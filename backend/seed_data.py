@@ -0,0 +1,395 @@
+"""
+Synthetischer Datenbestand für Last- und Performance-Tests
+
+    python seed_data.py --staff 20 --years 2 --seed 42
+
+Legt Fachkräfte mit unterschiedlichen Stundenmodellen an und erzeugt für den
+Zeitraum bis --end (Standard: heute) tägliche Zeiteinträge mit realistischer
+Verteilung (Stunden am Kind, Vorbereitung, Teamsitzungen, Urlaub in Blöcken,
+Krankheitsphasen, Bildungsurlaub), 17 Kinderanzahl-Slots pro Öffnungstag,
+Feiertage und Schließzeiten als Events sowie Monatsabschlüsse für alle
+vergangenen Monate. Gleicher Seed ergibt denselben Datenbestand.
+
+Geschrieben wird in die Datenbank aus DATABASE_URL (ohne: SQLite-Fallback).
+Enthält sie bereits Zeiteinträge, bricht das Skript ab. Mit --append kommen
+nur weitere Fachkräfte mit ihren Einträgen und Monatsabschlüssen hinzu.
+"""
+import argparse
+import logging
+import random
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import func, insert, select
+from database import engine
+from models import (
+    User, UserRole, TimeEntry, TimeEntryType, WorkTimeSubtype, ChildCount,
+    GlobalEvent, MonthlyLock
+)
+from auth import get_password_hash
+from migrate import ensure_schema
+
+logger = logging.getLogger(__name__)
+
+# 08:00 bis 16:00 in 30-Minuten-Schritten (wie in routers/child_counts.py)
+TIME_SLOTS = [f"{hour:02d}:{minute:02d}" for hour in range(8, 17) for minute in (0, 30)][:17]
+# Anteil der angemeldeten Kinder, die im jeweiligen Slot anwesend sind
+SLOT_ATTENDANCE = [0.45, 0.75, 0.95, 1.0, 1.0, 1.0, 1.0, 1.0, 0.95, 0.9, 0.85, 0.75, 0.65, 0.5, 0.35, 0.25, 0.15]
+
+# (Wochenstunden, Arbeitstage pro Woche, Gewicht)
+STAFF_MODELS = [(39.0, 5, 5), (35.0, 5, 3), (30.0, 5, 3), (30.0, 4, 2), (25.0, 5, 2), (20.0, 4, 1)]
+FIRST_NAMES = [
+    "Anna", "Lena", "Sophie", "Marie", "Julia", "Laura", "Sarah", "Katharina", "Miriam", "Nina",
+    "Jana", "Lisa", "Sandra", "Petra", "Tobias", "Jonas", "Felix", "Lukas", "Murat", "Elif"
+]
+LAST_NAMES = [
+    "Müller", "Schmidt", "Schneider", "Fischer", "Weber", "Meyer", "Wagner", "Becker", "Schulz",
+    "Hoffmann", "Koch", "Richter", "Klein", "Wolf", "Neumann", "Schwarz", "Yılmaz", "Kaya"
+]
+CHUNK_SIZE = 5000
+# Benutzernamen der Testbenutzer (fachkraft001, fachkraft002, ...), siehe load_test.py
+STAFF_PREFIX = "fachkraft"
+
+def easter_sunday(year: int) -> date:
+    """Ostersonntag nach der Gauß'schen Osterformel (anonymer gregorianischer Algorithmus)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def public_holidays(year: int) -> dict:
+    """Bundesweite Feiertage"""
+    easter = easter_sunday(year)
+    return {
+        date(year, 1, 1): "Neujahr",
+        easter - timedelta(days=2): "Karfreitag",
+        easter + timedelta(days=1): "Ostermontag",
+        date(year, 5, 1): "Tag der Arbeit",
+        easter + timedelta(days=39): "Christi Himmelfahrt",
+        easter + timedelta(days=50): "Pfingstmontag",
+        date(year, 10, 3): "Tag der Deutschen Einheit",
+        date(year, 12, 25): "1. Weihnachtstag",
+        date(year, 12, 26): "2. Weihnachtstag",
+    }
+
+def weekdays(start: date, end: date):
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+def month_starts(start: date, end: date):
+    current = date(start.year, start.month, 1)
+    while current <= end:
+        yield current
+        current = date(current.year + (current.month == 12), current.month % 12 + 1, 1)
+
+class Calendar:
+    """
+    Feiertage, Schließzeiten und besondere Tage im Zeitraum
+    """
+
+    def __init__(self, rng: random.Random, start: date, end: date):
+        self.events = []  # (Datum, Event-Typ, Beschreibung)
+        self.holidays = set()
+        self.closures = set()  # Einrichtung geschlossen, Personal hat Urlaub
+        self.team_days = set()  # Einrichtung geschlossen, Personal im Haus
+        self.early_closures = set()
+
+        for year in range(start.year, end.year + 1):
+            for day, name in public_holidays(year).items():
+                if start <= day <= end:
+                    self.holidays.add(day)
+                    self.events.append((day, "holiday", name))
+
+            # Sommerschließzeit: zwei Wochen ab dem ersten Montag im August
+            summer = date(year, 8, 1) + timedelta(days=(7 - date(year, 8, 1).weekday()) % 7)
+            closed = list(weekdays(summer, summer + timedelta(days=11)))
+            # Zwischen den Jahren
+            closed += list(weekdays(date(year, 12, 24), date(year, 12, 31)))
+            for day in closed:
+                if start <= day <= end and day not in self.holidays:
+                    self.closures.add(day)
+                    self.events.append((day, "closure", "Schließzeit"))
+
+            for month in (2, 10):
+                day = rng.choice(list(weekdays(date(year, month, 1), date(year, month, 28))))
+                if start <= day <= end and day not in self.holidays:
+                    self.team_days.add(day)
+                    self.events.append((day, "team_development", "Konzeptionstag"))
+
+        for day in weekdays(start, end):
+            if not self.is_open(day):
+                continue
+            roll = rng.random()
+            if roll < 0.02:
+                self.early_closures.add(day)
+                self.events.append((day, "early_closure_staff", "Personalmangel, Schließung 14:00"))
+            elif roll < 0.03:
+                self.early_closures.add(day)
+                self.events.append((day, "early_closure_event", "Sommerfest / Elternabend"))
+            elif roll < 0.045:
+                self.events.append((day, "staff_meeting", "Personalversammlung"))
+
+    def is_open(self, day: date) -> bool:
+        return (
+            day.weekday() < 5
+            and day not in self.holidays
+            and day not in self.closures
+            and day not in self.team_days
+        )
+
+class Generator:
+    def __init__(self, seed: int, staff: int, start: date, end: date):
+        self.rng = random.Random(seed)
+        self.staff = staff
+        self.start = start
+        self.end = end
+        self.calendar = Calendar(self.rng, start, end)
+
+    def users(self, password_hash: str, first_number: int) -> list:
+        models = [model for model in STAFF_MODELS for _ in range(model[2])]
+        rows = []
+        for number in range(first_number, first_number + self.staff):
+            weekly_hours, work_days, _ = self.rng.choice(models)
+            rows.append({
+                "username": f"{STAFF_PREFIX}{number:03d}",
+                "email": f"{STAFF_PREFIX}{number:03d}@kita.test",
+                "hashed_password": password_hash,
+                "full_name": f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}",
+                "role": UserRole.FACHKRAFT,
+                "is_active": True,
+                "weekly_hours": weekly_hours,
+                "additional_hours": self.rng.choice([0.0, 0.0, 0.0, 2.0, 5.0]),
+                "work_days_per_week": work_days,
+                "vacation_days_per_year": self.rng.choice([30, 30, 31, 32]),
+            })
+        return rows
+
+    def _absences(self, user: dict, workdays: list) -> dict:
+        """Abwesenheiten je Arbeitstag: Urlaub in Blöcken, Krankheitsphasen, Bildungsurlaub"""
+        absences = {}
+        by_year = {}
+        for day in workdays:
+            by_year.setdefault(day.year, []).append(day)
+
+        for year, days in by_year.items():
+            # Schließtage werden mit Urlaub verrechnet
+            closures = sum(1 for day in self.calendar.closures if day.year == year)
+            remaining = round((user["vacation_days_per_year"] - closures) * len(days) / 230)
+            while remaining > 0 and len(days) > 15:
+                length = min(remaining, self.rng.choice([3, 5, 5, 10]))
+                first = self.rng.randrange(len(days) - length)
+                for day in days[first:first + length]:
+                    absences.setdefault(day, TimeEntryType.URLAUB)
+                remaining -= length
+
+            if self.rng.random() < 0.3 and len(days) > 10:
+                first = self.rng.randrange(len(days) - 5)
+                for day in days[first:first + 5]:
+                    absences.setdefault(day, TimeEntryType.BILDUNGSURLAUB)
+
+        index = 0
+        while index < len(workdays):
+            roll = self.rng.random()
+            if roll < 0.012:
+                kind, length = TimeEntryType.KRANK, self.rng.choice([1, 2, 3, 3, 5, 10])
+            elif roll < 0.016:
+                kind, length = TimeEntryType.KINDKRANK, self.rng.choice([1, 1, 2])
+            else:
+                index += 1
+                continue
+            for day in workdays[index:index + length]:
+                absences.setdefault(day, kind)
+            index += length
+        return absences
+
+    def _work_entries(self, user: dict, day: date) -> list:
+        """Arbeitszeit eines Tages, aufgeteilt auf Untertypen"""
+        daily = user["weekly_hours"] / user["work_days_per_week"]
+        if day in self.calendar.team_days:
+            return [(WorkTimeSubtype.TEAMENTWICKLUNG, daily)]
+        if self.rng.random() < 0.01:
+            return [(WorkTimeSubtype.FORTBILDUNG, daily)]
+
+        other = []
+        if day.weekday() == 0:
+            other.append((WorkTimeSubtype.KLEINTEAM, 1.0))
+        if day.weekday() == 2 and day.isocalendar()[1] % 2 == 0:
+            other.append((WorkTimeSubtype.KONFERENZ, 1.5))
+        if self.rng.random() < 0.08:
+            other.append((WorkTimeSubtype.ELTERNGESPRAECH, self.rng.choice([0.5, 1.0])))
+        if self.rng.random() < 0.05:
+            other.append((WorkTimeSubtype.SPRACHFOERDERUNG, 1.0))
+        if self.rng.random() < 0.03:
+            other.append((WorkTimeSubtype.ANLEITUNG, 1.0))
+
+        # Stunden am Kind zählen mit Faktor 1,5 (automatische Vorbereitungszeit)
+        at_child = (daily - sum(hours for _, hours in other)) / 1.5
+        at_child = max(round(at_child * 4) / 4, 1.0)
+        return [(WorkTimeSubtype.STUNDEN_AM_KIND, at_child)] + other
+
+    def time_entries(self, user_id: int, user: dict, locked_months: set) -> list:
+        workdays = [
+            day for day in weekdays(self.start, self.end)
+            if day not in self.calendar.holidays
+            and (user["work_days_per_week"] == 5 or day.weekday() < user["work_days_per_week"])
+        ]
+        absences = self._absences(user, workdays)
+        rows = []
+        for day in workdays:
+            stamp = datetime.combine(day, datetime.min.time()) + timedelta(hours=17)
+            base = {
+                "user_id": user_id,
+                "date": day,
+                "hours": 0.0,
+                "days": 0.0,
+                "prep_time_hours": 0.0,
+                "subtype": None,
+                "description": None,
+                "is_locked": (day.year, day.month) in locked_months,
+                "created_at": stamp,
+                "updated_at": stamp,
+                "version": 1,
+            }
+            if day in self.calendar.closures:
+                rows.append({**base, "entry_type": TimeEntryType.URLAUB, "days": 1.0, "description": "Schließzeit"})
+            elif day in absences:
+                rows.append({**base, "entry_type": absences[day], "days": 1.0})
+            elif self.rng.random() < 0.003:
+                rows.append({**base, "entry_type": TimeEntryType.HOSPITATION, "hours": 4.0})
+            else:
+                for subtype, hours in self._work_entries(user, day):
+                    prep = round(hours * 0.5, 2) if subtype == WorkTimeSubtype.STUNDEN_AM_KIND else 0.0
+                    rows.append({
+                        **base,
+                        "entry_type": TimeEntryType.ARBEITSZEIT,
+                        "subtype": subtype,
+                        "hours": hours,
+                        "prep_time_hours": prep,
+                    })
+        return rows
+
+    def child_counts(self) -> list:
+        rows = []
+        for day in weekdays(self.start, self.end):
+            if not self.calendar.is_open(day):
+                continue
+            # Weniger Kinder freitags, in den Sommerferien und rund um den Jahreswechsel
+            presence = self.rng.uniform(0.8, 1.0)
+            if day.weekday() == 4:
+                presence *= 0.85
+            if day.month in (7, 8) or (day.month == 1 and day.day < 7):
+                presence *= 0.7
+            under_3 = 12 * presence
+            over_3 = 35 * presence
+            stamp = datetime.combine(day, datetime.min.time()) + timedelta(hours=17)
+            for slot, share in zip(TIME_SLOTS, SLOT_ATTENDANCE):
+                if day in self.calendar.early_closures and slot >= "14:00":
+                    share = 0.0
+                rows.append({
+                    "date": day,
+                    "time_slot": slot,
+                    "under_3_count": min(30, max(0, round(under_3 * share + self.rng.gauss(0, 0.8)))),
+                    "over_3_count": min(50, max(0, round(over_3 * share + self.rng.gauss(0, 1.5)))),
+                    "created_at": stamp,
+                    "updated_at": stamp,
+                    "version": 1,
+                })
+        return rows
+
+    def global_events(self) -> list:
+        return [
+            {"date": day, "event_type": event_type, "description": description}
+            for day, event_type, description in sorted(self.calendar.events)
+        ]
+
+    def locked_months(self) -> list:
+        """Alle Monate vor dem Monat von --end sind abgeschlossen"""
+        current = date(self.end.year, self.end.month, 1)
+        return [(month.year, month.month) for month in month_starts(self.start, self.end) if month < current]
+
+def insert_chunked(connection, table, rows: list):
+    for offset in range(0, len(rows), CHUNK_SIZE):
+        connection.execute(insert(table), rows[offset:offset + CHUNK_SIZE])
+
+def seed(staff: int, years: int, end: date, seed_value: int, password: str, append: bool) -> dict:
+    ensure_schema()
+    start = date(end.year - years, end.month, 1)
+    generator = Generator(seed_value, staff, start, end)
+    locked_months = generator.locked_months()
+    counts = {}
+
+    with engine.begin() as connection:
+        if not append and connection.execute(select(func.count(TimeEntry.id))).scalar():
+            raise SystemExit("Database already contains time entries, use --append to add more")
+
+        admin_id = connection.execute(
+            select(User.id).where(User.role == UserRole.ADMIN).order_by(User.id)
+        ).scalar()
+        first_number = connection.execute(
+            select(func.count(User.id)).where(User.username.like(f"{STAFF_PREFIX}%"))
+        ).scalar() + 1
+
+        # Ein Hash für alle Testbenutzer (bcrypt pro Benutzer wäre der langsamste Schritt)
+        users = generator.users(get_password_hash(password), first_number)
+        user_ids = [
+            connection.execute(insert(User.__table__).values(**user)).inserted_primary_key[0]
+            for user in users
+        ]
+        counts["users"] = len(users)
+
+        entries = []
+        for user_id, user in zip(user_ids, users):
+            entries += generator.time_entries(user_id, user, set(locked_months))
+        insert_chunked(connection, TimeEntry.__table__, entries)
+        counts["time_entries"] = len(entries)
+
+        child_counts = generator.child_counts() if not append else []
+        insert_chunked(connection, ChildCount.__table__, child_counts)
+        counts["child_counts"] = len(child_counts)
+
+        events = generator.global_events() if not append else []
+        insert_chunked(connection, GlobalEvent.__table__, events)
+        counts["global_events"] = len(events)
+
+        locks = [
+            {
+                "user_id": user_id,
+                "year": year,
+                "month": month,
+                "locked_at": datetime(year + (month == 12), month % 12 + 1, 3, 9),
+                "locked_by": admin_id,
+            }
+            for user_id in user_ids
+            for year, month in locked_months
+        ]
+        insert_chunked(connection, MonthlyLock.__table__, locks)
+        counts["monthly_locks"] = len(locks)
+
+    return counts
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Synthetischen Datenbestand erzeugen")
+    parser.add_argument("--staff", type=int, default=20, help="Anzahl Fachkräfte")
+    parser.add_argument("--years", type=int, default=2, help="Zeitraum in Jahren bis --end")
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today(), help="Letzter Tag (YYYY-MM-DD)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--password", default="test1234", help="Passwort aller Testbenutzer")
+    parser.add_argument("--append", action="store_true", help="Weitere Fachkräfte zu vorhandenen Daten hinzufügen")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = seed(args.staff, args.years, args.end, args.seed, args.password, args.append)
+    for name, count in counts.items():
+        print(f"{name:15s} {count:8d}")
+    print(f"Seeded in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,194 @@
+"""
+Protokoll langsamer Datenbankabfragen mit EXPLAIN-Plänen
+
+Listener auf before_cursor_execute/after_cursor_execute messen jede Abfrage.
+Abfragen über SLOW_QUERY_THRESHOLD_MS werden mit normalisiertem SQL, den Typen
+der gebundenen Parameter (keine Werte), der Dauer und der auslösenden Route
+geloggt und in einem Ringpuffer je Worker abgelegt.
+
+Für die SLOW_QUERY_EXPLAIN_TOP Abfragemuster mit der höchsten Gesamtdauer wird
+einmalig ein EXPLAIN in einem eigenen Thread ausgeführt, damit der Request
+nicht zusätzlich wartet. Nur SELECT-Abfragen werden erklärt.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from query_counter import fingerprint
+from route_templates import route_templates
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+SLOW_QUERY_EXPLAIN_TOP = int(os.getenv("SLOW_QUERY_EXPLAIN_TOP", "10"))
+# Obergrenze für unterschiedliche Abfragemuster in der Statistik
+MAX_FINGERPRINTS = 500
+
+# Request, in dem die Abfrage läuft (wird an den Thread-Pool weitergegeben)
+_current_scope: ContextVar[Optional[dict]] = ContextVar("slow_query_scope", default=None)
+# Abfragen des EXPLAIN-Threads selbst nicht erfassen
+_explaining: ContextVar[bool] = ContextVar("slow_query_explaining", default=False)
+
+def parameter_shape(parameters, executemany: bool = False) -> str:
+    """
+    Typen der gebundenen Parameter, z.B. "(int, date, str)" oder "10x (int, str)"
+    """
+    if executemany:
+        if not parameters:
+            return "0x ()"
+        return f"{len(parameters)}x {parameter_shape(parameters[0])}"
+    if not parameters:
+        return "()"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+
+def _is_explainable(statement: str) -> bool:
+    return statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "WITH")
+
+class SlowQueryLog:
+    """
+    Ringpuffer der langsamen Abfragen und Statistik je Abfragemuster
+    """
+
+    def __init__(self, size: int, explain_top: int):
+        self.entries = deque(maxlen=size)
+        self.patterns = {}
+        self.explain_top = explain_top
+        self._lock = threading.Lock()
+        self._explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+
+    def record(self, engine, statement: str, parameters, executemany: bool, duration_ms: float):
+        scope = _current_scope.get()
+        route = f"{scope['method']} {route_templates.resolve(scope)}" if scope else "-"
+        sql = fingerprint(statement)
+        shape = parameter_shape(parameters, executemany)
+
+        logger.warning(f"Slow query ({duration_ms:.0f} ms) in {route}: {sql} {shape}")
+
+        with self._lock:
+            self.entries.append({
+                "timestamp": datetime.now(),
+                "duration_ms": round(duration_ms, 1),
+                "route": route,
+                "sql": sql,
+                "parameters": shape,
+            })
+            pattern = self.patterns.get(sql)
+            if pattern is None:
+                if len(self.patterns) >= MAX_FINGERPRINTS:
+                    # Muster mit der geringsten Gesamtdauer verdrängen
+                    del self.patterns[min(self.patterns, key=lambda key: self.patterns[key]["total_ms"])]
+                pattern = self.patterns[sql] = {
+                    "sql": sql,
+                    "count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "routes": set(),
+                    "plan": None,
+                    "explain_pending": False,
+                }
+            pattern["count"] += 1
+            pattern["total_ms"] += duration_ms
+            pattern["max_ms"] = max(pattern["max_ms"], duration_ms)
+            pattern["routes"].add(route)
+
+            explain = (
+                pattern["plan"] is None
+                and not pattern["explain_pending"]
+                and not executemany
+                and _is_explainable(statement)
+                and sql in self._top_patterns()
+            )
+            if explain:
+                pattern["explain_pending"] = True
+
+        if explain:
+            self._explainer.submit(self._explain, engine, sql, statement, parameters)
+
+    def _top_patterns(self) -> set:
+        ranked = sorted(self.patterns.values(), key=lambda pattern: pattern["total_ms"], reverse=True)
+        return {pattern["sql"] for pattern in ranked[:self.explain_top]}
+
+    def _explain(self, engine, sql: str, statement: str, parameters):
+        _explaining.set(True)
+        prefix = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+        try:
+            with engine.connect() as connection:
+                result = connection.exec_driver_sql(f"{prefix} {statement}", parameters)
+                plan = [dict(row._mapping) for row in result]
+        except Exception as e:
+            logger.warning(f"EXPLAIN failed for {sql}: {e}")
+            plan = [{"error": str(e)}]
+
+        with self._lock:
+            pattern = self.patterns.get(sql)
+            if pattern is not None:
+                pattern["plan"] = plan
+                pattern["explain_pending"] = False
+
+    def report(self) -> dict:
+        with self._lock:
+            entries = list(reversed(self.entries))
+            patterns = [
+                {
+                    "sql": pattern["sql"],
+                    "count": pattern["count"],
+                    "total_ms": round(pattern["total_ms"], 1),
+                    "max_ms": round(pattern["max_ms"], 1),
+                    "routes": sorted(pattern["routes"]),
+                    "plan": pattern["plan"],
+                }
+                for pattern in sorted(self.patterns.values(), key=lambda pattern: pattern["total_ms"], reverse=True)
+            ]
+        return {
+            "pid": os.getpid(),
+            "threshold_ms": SLOW_QUERY_THRESHOLD_MS,
+            "entries": entries,
+            "patterns": patterns,
+        }
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_LOG_SIZE, SLOW_QUERY_EXPLAIN_TOP)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    duration_ms = (time.perf_counter() - conn.info["slow_query_start"].pop()) * 1000
+    if duration_ms >= SLOW_QUERY_THRESHOLD_MS and not _explaining.get():
+        slow_query_log.record(conn.engine, statement, parameters, executemany, duration_ms)
+
+@event.listens_for(Engine, "handle_error")
+def discard_query_timer(exception_context):
+    # Bei Fehlern wird after_cursor_execute nicht aufgerufen
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("slow_query_start"):
+        connection.info["slow_query_start"].pop()
+
+class SlowQueryMiddleware:
+    """
+    Merkt sich den Request, damit langsame Abfragen ihrer Route zugeordnet werden
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        token = _current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
@@ -0,0 +1,234 @@
+"""
+Datenbank-Snapshot als gzip-komprimiertes NDJSON exportieren und wiederherstellen.
+
+Der Export liest jede Tabelle in Primärschlüssel-Reihenfolge mit Keyset-Pagination,
+die Wiederherstellung lädt die Zeilen batchweise in FK-sicherer Reihenfolge. Der
+Speicherbedarf hängt nur von der Batch-Größe ab, nicht von der Datenbankgröße.
+
+Verwendung (z.B. Umzug von SQLite nach MySQL):
+    DATABASE_URL=sqlite:///./kita_dienstplan.db python snapshot.py export -o kita.ndjson.gz
+    DATABASE_URL=mysql+pymysql://... python snapshot.py restore kita.ndjson.gz --replace
+"""
+import argparse
+import enum
+import gzip
+import json
+import logging
+import sys
+import zlib
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional
+from sqlalchemy import Date, DateTime, Enum, select
+from sqlalchemy.engine import Connection
+from database import engine
+from models import Base
+# Push-Tabellen registrieren, damit sie Teil des Snapshots sind
+from routers.push_notifications import PushSubscription, PushNotification
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+BATCH_SIZE = 1000
+
+# Nicht im Snapshot: Refresh-Tokens (Zugangsdaten), gespeicherte Antworten
+# wiederholter Requests und Anmeldeversuche sind flüchtig und gehören nicht in
+# eine herunterladbare Datei. Beim Ersetzen werden sie trotzdem geleert.
+EXCLUDED_TABLES = {"refresh_tokens", "idempotency_keys", "login_attempts"}
+
+def snapshot_tables():
+    """
+    Alle Tabellen außer EXCLUDED_TABLES in FK-sicherer Reihenfolge (referenzierte Tabellen zuerst)
+    """
+    return [table for table in Base.metadata.sorted_tables if table.name not in EXCLUDED_TABLES]
+
+def _encode_value(column, value):
+    if value is None:
+        return None
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def _decode_value(column, value):
+    if value is None:
+        return None
+    if isinstance(column.type, Enum) and column.type.enum_class is not None:
+        return column.type.enum_class(value)
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value)
+    return value
+
+def iter_snapshot_lines(connection: Connection, batch_size: int = BATCH_SIZE) -> Iterator[str]:
+    """
+    Snapshot als NDJSON-Zeilen erzeugen
+
+    Die erste Zeile ist ein Header mit Version und Tabellenliste, danach folgt
+    eine Zeile pro Datensatz: {"table": ..., "row": {...}}
+    """
+    tables = snapshot_tables()
+    yield json.dumps({
+        "snapshot": SNAPSHOT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "tables": [table.name for table in tables]
+    }) + "\n"
+
+    for table in tables:
+        pk = list(table.primary_key.columns)[0]
+        last_id = None
+
+        while True:
+            stmt = select(table).order_by(pk).limit(batch_size)
+            if last_id is not None:
+                stmt = stmt.where(pk > last_id)
+
+            rows = connection.execute(stmt).mappings().all()
+            if not rows:
+                break
+
+            for row in rows:
+                encoded = {
+                    column.name: _encode_value(column, row[column.name])
+                    for column in table.columns
+                }
+                yield json.dumps({"table": table.name, "row": encoded}, ensure_ascii=False) + "\n"
+
+            last_id = rows[-1][pk.name]
+            if len(rows) < batch_size:
+                break
+
+def iter_snapshot_gzip(batch_size: int = BATCH_SIZE) -> Iterator[bytes]:
+    """
+    Snapshot als gzip-Stream erzeugen (eigene Verbindung, unabhängig von der Request-Session)
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: gzip-Container
+    with engine.connect() as connection:
+        buffer = []
+        buffered = 0
+        for line in iter_snapshot_lines(connection, batch_size):
+            data = line.encode("utf-8")
+            buffer.append(data)
+            buffered += len(data)
+            if buffered >= 64 * 1024:
+                chunk = compressor.compress(b"".join(buffer))
+                buffer, buffered = [], 0
+                if chunk:
+                    yield chunk
+
+        if buffer:
+            chunk = compressor.compress(b"".join(buffer))
+            if chunk:
+                yield chunk
+    yield compressor.flush()
+
+def restore_snapshot(
+    connection: Connection,
+    lines: Iterable[str],
+    batch_size: int = BATCH_SIZE,
+    replace: bool = False
+) -> dict:
+    """
+    Snapshot batchweise in die Datenbank laden
+
+    Args:
+        connection: Verbindung innerhalb einer Transaktion
+        lines: NDJSON-Zeilen des Snapshots
+        batch_size: Anzahl Zeilen pro INSERT
+        replace: Vorhandene Daten vorher löschen (sonst müssen alle Tabellen leer sein)
+
+    Returns:
+        Anzahl geladener Zeilen pro Tabelle
+    """
+    tables = {table.name: table for table in snapshot_tables()}
+    line_iter = iter(lines)
+
+    header = json.loads(next(line_iter))
+    if header.get("snapshot") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {header.get('snapshot')}")
+
+    unknown = [name for name in header.get("tables", []) if name not in tables and name not in EXCLUDED_TABLES]
+    if unknown:
+        raise ValueError(f"Unknown tables in snapshot: {', '.join(unknown)}")
+
+    if replace:
+        # Abhängige Tabellen zuerst leeren (auch die ausgeschlossenen, z.B. Refresh-Tokens der alten Benutzer)
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(table.delete())
+    else:
+        for table in tables.values():
+            if connection.execute(select(table).limit(1)).first() is not None:
+                raise ValueError(f"Table '{table.name}' is not empty, use replace to overwrite")
+
+    counts = {name: 0 for name in tables}
+    current_table: Optional[str] = None
+    batch = []
+
+    def flush():
+        if batch:
+            connection.execute(tables[current_table].insert(), batch)
+            counts[current_table] += len(batch)
+            batch.clear()
+
+    for line in line_iter:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if record["table"] in EXCLUDED_TABLES:
+            continue  # Ältere Snapshots enthalten sie noch
+        if record["table"] != current_table:
+            flush()
+            current_table = record["table"]
+            if current_table not in tables:
+                raise ValueError(f"Unknown table in snapshot: {current_table}")
+
+        table = tables[current_table]
+        batch.append({
+            column.name: _decode_value(column, record["row"].get(column.name))
+            for column in table.columns
+        })
+        if len(batch) >= batch_size:
+            flush()
+
+    flush()
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Kita Dienstplan Datenbank-Snapshot")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Snapshot exportieren")
+    export_parser.add_argument("-o", "--output", default="-", help="Zieldatei (Standard: stdout)")
+    export_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    restore_parser = subparsers.add_parser("restore", help="Snapshot wiederherstellen")
+    restore_parser.add_argument("input", help="Snapshot-Datei (.ndjson.gz)")
+    restore_parser.add_argument("--replace", action="store_true", help="Vorhandene Daten ersetzen")
+    restore_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+        try:
+            for chunk in iter_snapshot_gzip(args.batch_size):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        logger.info(f"Snapshot written to {args.output}")
+    else:
+        Base.metadata.create_all(bind=engine)
+        try:
+            with gzip.open(args.input, "rt", encoding="utf-8") as snapshot_file:
+                with engine.begin() as connection:
+                    counts = restore_snapshot(connection, snapshot_file, args.batch_size, args.replace)
+        except ValueError as e:
+            logger.error(f"Restore failed: {str(e)}")
+            sys.exit(1)
+        for table_name, count in counts.items():
+            logger.info(f"Restored {count} rows into {table_name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Regressionsprüfung für den Worker-Start
+
+    python startup_check.py
+
+Importiert main in einem neuen Interpreter mit "python -X importtime" und
+schlägt fehl (Exit-Code 1), wenn eine der schweren Abhängigkeiten schon beim
+Start geladen wird, der Import länger als IMPORT_BUDGET_SECONDS dauert oder
+der Prozess danach mehr als RSS_BUDGET_MB Speicher belegt (Spitzenwert, bei
+vier Workern fällt er viermal an).
+Diese Module dürfen nur innerhalb der Funktionen importiert werden, die sie
+benötigen (Export/Import, Web-Push, E-Mail-Vorlagen).
+"""
+import os
+import subprocess
+import sys
+
+LAZY_MODULES = ("pandas", "pyarrow", "openpyxl", "pywebpush", "jinja2")
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "2.0"))
+RSS_BUDGET_MB = float(os.getenv("RSS_BUDGET_MB", "100"))
+
+# ru_maxrss: Linux in KiB, macOS in Bytes
+MEASURE_RSS = (
+    "import resource, sys; "
+    "rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; "
+    "print(rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024)"
+)
+
+def import_profile() -> tuple:
+    """
+    Kumulierte Importzeit (Mikrosekunden) je Modul und Spitzen-RSS (MB) beim Import von main
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import main; {MEASURE_RSS}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times, float(result.stdout.strip().splitlines()[-1])
+
+def main() -> int:
+    times, rss = import_profile()
+    failures = [f"{name} is imported at startup" for name in LAZY_MODULES if name in times]
+
+    total = times.get("main", 0) / 1_000_000
+    if total > IMPORT_BUDGET_SECONDS:
+        failures.append(f"import main took {total:.2f}s (budget {IMPORT_BUDGET_SECONDS:.2f}s)")
+    if rss > RSS_BUDGET_MB:
+        failures.append(f"peak RSS after import main is {rss:.0f} MB (budget {RSS_BUDGET_MB:.0f} MB)")
+
+    slowest = sorted(
+        ((value, name) for name, value in times.items() if "." not in name and name != "main"),
+        reverse=True
+    )[:10]
+    print(f"import main: {total:.2f}s, peak RSS {rss:.0f} MB")
+    for value, name in slowest:
+        print(f"  {value / 1000:8.1f} ms  {name}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
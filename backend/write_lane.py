@@ -0,0 +1,116 @@
+"""
+Serialisierte Schreibzugriffe für den SQLite-Betrieb
+
+SQLite erlaubt nur einen Schreiber gleichzeitig. Starten mehrere Worker parallel
+Schreib-Transaktionen, scheitert ein Teil mit "database is locked" (u.a. wenn eine
+lesende Transaktion zur schreibenden werden will). Die Write-Lane lässt
+Schreib-Transaktionen nacheinander laufen: innerhalb des Prozesses über ein Lock,
+zwischen den Workern über ein flock auf eine Lock-Datei neben der Datenbank.
+
+Die Lane hängt an der Verbindung, nicht am Request: Sie wird mit der ersten
+schreibenden Anweisung (INSERT/UPDATE/DELETE) belegt und freigegeben, sobald die
+Verbindung nach Commit bzw. Rollback in den Pool zurückgeht. Lesende Requests,
+bcrypt bei der Anmeldung oder das Erzeugen eines Exports warten damit nicht
+hinter den Schreibern.
+"""
+import os
+import re
+import threading
+import time
+from sqlalchemy import event
+
+try:
+    import fcntl
+except ImportError:  # Windows: nur prozessinterne Serialisierung
+    fcntl = None
+
+WRITE_LANE_TIMEOUT_SECONDS = int(os.getenv("SQLITE_WRITE_LANE_TIMEOUT", "30"))
+WRITE_STATEMENT = re.compile(r"\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+class WriteLaneTimeout(Exception):
+    """
+    Die Write-Lane wurde innerhalb von WRITE_LANE_TIMEOUT_SECONDS nicht frei
+    """
+
+class WriteLane:
+    """
+    Exklusives Schreibrecht über alle Verbindungen und Worker-Prozesse
+
+    Ein threading.Lock statt RLock, weil die Verbindung ggf. in einem anderen
+    Thread des Thread-Pools zurückgegeben wird als dem, der geschrieben hat.
+    """
+
+    def __init__(self, lock_path: str, timeout: float = WRITE_LANE_TIMEOUT_SECONDS):
+        self.lock_path = lock_path
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._lock_file = None
+
+    def _acquire_file_lock(self, deadline: float) -> bool:
+        if self._lock_file is None:
+            self._lock_file = open(self.lock_path, "a")
+        delay = 0.001
+        while True:
+            try:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return True
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(delay)
+                delay = min(delay * 2, 0.01)
+
+    def acquire(self) -> bool:
+        deadline = time.monotonic() + self.timeout
+        if not self._lock.acquire(timeout=self.timeout):
+            return False
+        if fcntl is None:
+            return True
+
+        try:
+            acquired = self._acquire_file_lock(deadline)
+        except BaseException:
+            self._lock.release()
+            raise
+        if not acquired:
+            self._lock.release()
+        return acquired
+
+    def release(self):
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+        self._lock.release()
+
+    def install(self, engine):
+        """
+        Lane für alle Schreib-Transaktionen der Engine belegen
+        """
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "checkin", self._checkin)
+        event.listen(engine, "invalidate", self._invalidate)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get("write_lane") or not _is_write(statement, context):
+            return
+        if not self.acquire():
+            raise WriteLaneTimeout(f"SQLite write lane busy for {self.timeout}s")
+        conn.info["write_lane"] = True
+
+    def _checkin(self, dbapi_connection, connection_record):
+        if connection_record.info.pop("write_lane", False):
+            self.release()
+
+    def _invalidate(self, dbapi_connection, connection_record, exception):
+        self._checkin(dbapi_connection, connection_record)
+
+def _is_write(statement: str, context) -> bool:
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        return True
+    return WRITE_STATEMENT.match(statement) is not None
+
+def sqlite_lock_path(database_url: str, suffix: str = "write-lock") -> str:
+    """
+    Pfad einer Lock-Datei neben der SQLite-Datenbank
+    """
+    path = database_url.partition(":///")[2] or "kita_dienstplan.db"
+    return f"{path}.{suffix}"
@@ -111,8 +111,8 @@ fi
 log_info "Warte auf Datenbankverbindung..."
 sleep 10
 
-# Initial Setup wird automatisch beim App-Start durchgeführt
-log_info "Datenbank wird automatisch beim App-Start initialisiert..."
+# Schema-Einrichtung (migrate.py) läuft beim Container-Start vor den Workern
+log_info "Datenbank wird beim Container-Start einmalig initialisiert (migrate.py)..."
 
 # Status prüfen
 log_info "Prüfe Container Status..."
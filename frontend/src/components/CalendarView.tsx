@@ -1,6 +1,6 @@
 import React, { useState } from 'react'
 import { useQuery } from '@tanstack/react-query'
-import { timeEntriesAPI } from '../services/api'
+import { loadTimeEntries } from '../services/sync'
 import { TimeEntry } from '../types'
 import { ChevronLeft, ChevronRight, Calendar as CalendarIcon, Plus } from 'lucide-react'
 import { 
@@ -37,7 +37,7 @@ const CalendarView: React.FC<CalendarViewProps> = ({ userId }) => {
 
   const { data: entries = [] } = useQuery({
     queryKey: ['timeEntries', format(monthStart, 'yyyy-MM-dd'), format(monthEnd, 'yyyy-MM-dd'), userId],
-    queryFn: () => timeEntriesAPI.getTimeEntries({
+    queryFn: () => loadTimeEntries({
       start_date: format(monthStart, 'yyyy-MM-dd'),
       end_date: format(monthEnd, 'yyyy-MM-dd'),
       user_id: userId
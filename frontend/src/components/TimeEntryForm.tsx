@@ -1,7 +1,7 @@
 import React, { useState } from 'react'
 import { useForm } from 'react-hook-form'
 import { useMutation, useQueryClient } from '@tanstack/react-query'
-import { timeEntriesAPI } from '../services/api'
+import { saveTimeEntry } from '../services/sync'
 import { TimeEntry } from '../types'
 import { Calendar, Clock, FileText } from 'lucide-react'
 
@@ -59,7 +59,7 @@ const TimeEntryForm: React.FC<TimeEntryFormProps> = ({ onSuccess, editEntry }) =
   })
 
   const createMutation = useMutation({
-    mutationFn: timeEntriesAPI.createTimeEntry,
+    mutationFn: (data: Omit<TimeEntry, 'id' | 'user_id' | 'is_locked'>) => saveTimeEntry(data),
     onSuccess: () => {
       queryClient.invalidateQueries({ queryKey: ['timeEntries'] })
       onSuccess?.()
@@ -67,8 +67,8 @@ const TimeEntryForm: React.FC<TimeEntryFormProps> = ({ onSuccess, editEntry }) =
   })
 
   const updateMutation = useMutation({
-    mutationFn: ({ id, data }: { id: number, data: Omit<TimeEntry, 'id' | 'user_id' | 'is_locked'> }) =>
-      timeEntriesAPI.updateTimeEntry(id, data),
+    mutationFn: ({ entry, data }: { entry: TimeEntry, data: Omit<TimeEntry, 'id' | 'user_id' | 'is_locked'> }) =>
+      saveTimeEntry(data, entry),
     onSuccess: () => {
       queryClient.invalidateQueries({ queryKey: ['timeEntries'] })
       onSuccess?.()
@@ -90,7 +90,7 @@ const TimeEntryForm: React.FC<TimeEntryFormProps> = ({ onSuccess, editEntry }) =
     }
 
     if (editEntry) {
-      updateMutation.mutate({ id: editEntry.id, data: entryData })
+      updateMutation.mutate({ entry: editEntry, data: entryData })
     } else {
       createMutation.mutate(entryData)
     }
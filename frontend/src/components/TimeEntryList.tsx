@@ -1,6 +1,6 @@
 import React, { useState } from 'react'
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query'
-import { timeEntriesAPI } from '../services/api'
+import { loadTimeEntries, deleteTimeEntry } from '../services/sync'
 import { TimeEntry } from '../types'
 import { Edit2, Trash2, Clock, Calendar, Lock } from 'lucide-react'
 import { format } from 'date-fns'
@@ -20,11 +20,11 @@ const TimeEntryList: React.FC<TimeEntryListProps> = ({ startDate, endDate, userI
 
   const { data: entries = [], isLoading } = useQuery({
     queryKey: ['timeEntries', { startDate, endDate, userId }],
-    queryFn: () => timeEntriesAPI.getTimeEntries({ start_date: startDate, end_date: endDate, user_id: userId })
+    queryFn: () => loadTimeEntries({ start_date: startDate, end_date: endDate, user_id: userId })
   })
 
   const deleteMutation = useMutation({
-    mutationFn: timeEntriesAPI.deleteTimeEntry,
+    mutationFn: deleteTimeEntry,
     onSuccess: () => {
       queryClient.invalidateQueries({ queryKey: ['timeEntries'] })
     }
@@ -1,6 +1,7 @@
 import React, { createContext, useContext, useState, useEffect } from 'react'
 import { User, AuthContextType } from '../types'
 import { authAPI, usersAPI } from '../services/api'
+import { resetSync } from '../services/sync'
 
 const AuthContext = createContext<AuthContextType | undefined>(undefined)
 
@@ -30,6 +31,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
           localStorage.setItem('user', JSON.stringify(currentUser))
         } catch (error) {
           localStorage.removeItem('token')
+          localStorage.removeItem('refresh_token')
           localStorage.removeItem('user')
           setToken(null)
           setUser(null)
@@ -44,9 +46,10 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
   const login = async (username: string, password: string) => {
     try {
       const response = await authAPI.login(username, password)
-      const { access_token } = response
+      const { access_token, refresh_token } = response
       
       localStorage.setItem('token', access_token)
+      localStorage.setItem('refresh_token', refresh_token)
       setToken(access_token)
       
       const currentUser = await usersAPI.getCurrentUser()
@@ -58,7 +61,13 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
   }
 
   const logout = () => {
+    const refreshToken = localStorage.getItem('refresh_token')
+    if (refreshToken) {
+      authAPI.logout(refreshToken).catch(() => {})
+    }
+    resetSync()
     localStorage.removeItem('token')
+    localStorage.removeItem('refresh_token')
     localStorage.removeItem('user')
     setToken(null)
     setUser(null)
@@ -18,14 +18,53 @@ api.interceptors.request.use((config) => {
   if (token) {
     config.headers.Authorization = `Bearer ${token}`
   }
+  // Schreib-Requests erhalten einen Idempotency-Key; Wiederholungen mit derselben
+  // Config senden denselben Schlüssel und werden vom Server nur einmal ausgeführt
+  const method = config.method?.toUpperCase()
+  if ((method === 'POST' || method === 'PUT' || method === 'PATCH') && !config.headers['Idempotency-Key']) {
+    config.headers['Idempotency-Key'] = crypto.randomUUID()
+  }
   return config
 })
 
+// Access-Token über das Refresh-Token erneuern; parallele 401 teilen sich einen Request
+let refreshPromise: Promise<string | null> | null = null
+
+const refreshAccessToken = (): Promise<string | null> => {
+  const refreshToken = localStorage.getItem('refresh_token')
+  if (!refreshToken) {
+    return Promise.resolve(null)
+  }
+  if (!refreshPromise) {
+    refreshPromise = axios.post(`${API_URL}/api/auth/refresh`, { refresh_token: refreshToken })
+      .then((response) => {
+        localStorage.setItem('token', response.data.access_token)
+        localStorage.setItem('refresh_token', response.data.refresh_token)
+        return response.data.access_token as string
+      })
+      .catch(() => null)
+      .finally(() => {
+        refreshPromise = null
+      })
+  }
+  return refreshPromise
+}
+
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const original = error.config
+    if (error.response?.status === 401 && original && !original._retried && !original.url?.startsWith('/auth/')) {
+      original._retried = true
+      const accessToken = await refreshAccessToken()
+      if (accessToken) {
+        original.headers.Authorization = `Bearer ${accessToken}`
+        return api(original)
+      }
+    }
     if (error.response?.status === 401) {
       localStorage.removeItem('token')
+      localStorage.removeItem('refresh_token')
       localStorage.removeItem('user')
       window.location.href = '/login'
     }
@@ -46,6 +85,10 @@ export const authAPI = {
     })
     return response.data
   },
+
+  logout: async (refreshToken: string) => {
+    await api.post('/auth/logout', { refresh_token: refreshToken })
+  },
 }
 
 export const usersAPI = {
@@ -75,8 +118,15 @@ export const timeEntriesAPI = {
     start_date?: string
     end_date?: string
   }): Promise<TimeEntry[]> => {
-    const response = await api.get('/time-entries/', { params })
-    return response.data
+    // Seitenweise laden, solange der Server einen Folge-Cursor liefert
+    const entries: TimeEntry[] = []
+    let cursor: string | undefined
+    do {
+      const response = await api.get('/time-entries/', { params: { ...params, cursor } })
+      entries.push(...response.data)
+      cursor = response.headers['x-next-cursor'] || undefined
+    } while (cursor)
+    return entries
   },
   
   createTimeEntry: async (entry: Omit<TimeEntry, 'id' | 'user_id' | 'is_locked'>): Promise<TimeEntry> => {
@@ -84,14 +134,60 @@ export const timeEntriesAPI = {
     return response.data
   },
   
-  updateTimeEntry: async (id: number, entry: Omit<TimeEntry, 'id' | 'user_id' | 'is_locked'>): Promise<TimeEntry> => {
-    const response = await api.put(`/time-entries/${id}`, entry)
+  // Mit version antwortet der Server mit 412, falls der Eintrag inzwischen geändert wurde
+  updateTimeEntry: async (id: number, entry: Omit<TimeEntry, 'id' | 'user_id' | 'is_locked'>, version?: number): Promise<TimeEntry> => {
+    const response = await api.put(`/time-entries/${id}`, entry, {
+      headers: version !== undefined ? { 'If-Match': `"${version}"` } : undefined
+    })
     return response.data
   },
   
   deleteTimeEntry: async (id: number): Promise<void> => {
     await api.delete(`/time-entries/${id}`)
   },
+
+  // Bulk-Varianten: eine ganze Woche in einem Request, atomar
+  createTimeEntries: async (entries: Omit<TimeEntry, 'id' | 'user_id' | 'is_locked'>[]): Promise<TimeEntry[]> => {
+    const response = await api.post('/time-entries/bulk', { entries })
+    return response.data
+  },
+
+  updateTimeEntries: async (entries: (Partial<Omit<TimeEntry, 'user_id' | 'is_locked'>> & { id: number; version?: number })[]): Promise<TimeEntry[]> => {
+    const response = await api.patch('/time-entries/bulk', { entries })
+    return response.data
+  },
+
+  deleteTimeEntries: async (ids: number[]): Promise<void> => {
+    await api.delete('/time-entries/bulk', {
+      params: { ids },
+      paramsSerializer: { indexes: null },
+    })
+  },
+}
+
+export interface SyncChanges<T> {
+  updated: T[]
+  deleted: number[]
+}
+
+export interface SyncResponse {
+  token: string
+  reset: boolean
+  time_entries: SyncChanges<TimeEntry & { updated_at?: string }>
+  global_events: SyncChanges<{ id: number; date: string; event_type: string; description?: string; updated_at?: string }>
+  monthly_locks: SyncChanges<{ id: number; user_id: number; year: number; month: number; locked_by: number; locked_at: string }>
+  next_cursor?: string
+}
+
+export const syncAPI = {
+  // Nur Änderungen seit dem letzten Token laden (ohne Token: vollständiger Bestand).
+  // Mit cursor (next_cursor der vorigen Antwort) die nächste Seite Zeiteinträge
+  getChanges: async (since?: string, startDate?: string, cursor?: string): Promise<SyncResponse> => {
+    const response = await api.get('/sync/', {
+      params: { since, start_date: startDate, cursor }
+    })
+    return response.data
+  },
 }
 
 export const statisticsAPI = {
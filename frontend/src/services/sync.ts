@@ -0,0 +1,317 @@
+// Delta-Synchronisation und Offline-Bearbeitung für die PWA
+//
+// Der lokale Bestand wird in localStorage gehalten und über /api/sync nur um
+// die Änderungen seit dem letzten Token ergänzt. Offline-Änderungen landen in
+// einer Warteschlange und werden beim nächsten Sync nach folgender Regel
+// eingespielt:
+//
+//   - Der Server gewinnt, wenn der Monat inzwischen abgeschlossen ist, der
+//     Eintrag auf dem Server gelöscht wurde oder seit der Offline-Änderung
+//     auf dem Server geändert wurde (updated_at weicht ab). Die lokale
+//     Änderung wird verworfen und als Konflikt gemeldet.
+//   - Andernfalls wird die Änderung unverändert an den Server geschickt.
+//
+// Bestand und Warteschlange sind pro Benutzer abgelegt, damit nach einem
+// Benutzerwechsel keine fremden Änderungen mit dem neuen Token eingespielt werden.
+
+import { timeEntriesAPI, syncAPI, SyncChanges, SyncResponse } from './api'
+import { TimeEntry } from '../types'
+
+const STORE_KEY = 'sync_store'
+const QUEUE_KEY = 'sync_queue'
+
+// Lokal gehalten werden Einträge ab dem 1. Januar des Vorjahres, ältere Zeiträume kommen direkt vom Server
+export const SYNC_START_DATE = `${new Date().getFullYear() - 1}-01-01`
+
+type SyncedTimeEntry = TimeEntry & { updated_at?: string }
+type TimeEntryInput = Omit<TimeEntry, 'id' | 'user_id' | 'is_locked'>
+
+interface SyncStore {
+  token?: string
+  time_entries: Record<number, SyncedTimeEntry>
+  global_events: Record<number, SyncResponse['global_events']['updated'][number]>
+  monthly_locks: Record<number, SyncResponse['monthly_locks']['updated'][number]>
+}
+
+export type OfflineEdit =
+  | { op: 'create'; local_id: number; entry: TimeEntryInput; user_id: number; queued_at: string }
+  | { op: 'update'; id: number; entry: TimeEntryInput; base_updated_at?: string; queued_at: string }
+  | { op: 'delete'; id: number; base_updated_at?: string; queued_at: string }
+
+export interface SyncConflict {
+  edit: OfflineEdit
+  reason: 'locked' | 'deleted' | 'modified' | 'rejected'
+  server?: SyncedTimeEntry
+}
+
+const emptyStore = (): SyncStore => ({ time_entries: {}, global_events: {}, monthly_locks: {} })
+
+const currentUserId = (): number | undefined => {
+  const raw = localStorage.getItem('user')
+  return raw ? JSON.parse(raw).id : undefined
+}
+
+const userKey = (key: string): string => `${key}_${currentUserId()}`
+
+const loadStore = (): SyncStore => {
+  const raw = localStorage.getItem(userKey(STORE_KEY))
+  return raw ? JSON.parse(raw) : emptyStore()
+}
+
+const saveStore = (store: SyncStore) => {
+  localStorage.setItem(userKey(STORE_KEY), JSON.stringify(store))
+}
+
+const loadQueue = (): OfflineEdit[] => {
+  const raw = localStorage.getItem(userKey(QUEUE_KEY))
+  return raw ? JSON.parse(raw) : []
+}
+
+const saveQueue = (queue: OfflineEdit[]) => {
+  localStorage.setItem(userKey(QUEUE_KEY), JSON.stringify(queue))
+}
+
+// Löschungen zuerst: eine gelöschte ID kann im selben Delta für eine neue Zeile stehen
+const mergeChanges = <T extends { id: number }>(
+  target: Record<number, T>,
+  changes: SyncChanges<T>
+) => {
+  for (const id of changes.deleted) {
+    delete target[id]
+  }
+  for (const row of changes.updated) {
+    target[row.id] = row
+  }
+}
+
+const isNetworkError = (error: any): boolean => !error.response
+
+const isMonthLocked = (store: SyncStore, userId: number, date: string): boolean => {
+  const [year, month] = date.split('-').map(Number)
+  return Object.values(store.monthly_locks).some(
+    lock => lock.user_id === userId && lock.year === year && lock.month === month
+  )
+}
+
+let runningPull: Promise<SyncStore> | null = null
+let runningSync: Promise<SyncConflict[]> | null = null
+
+// Änderungen vom Server holen und in den lokalen Bestand übernehmen
+// (gleichzeitige Aufrufe mehrerer Ansichten teilen sich eine Anfrage)
+export const pull = (startDate: string = SYNC_START_DATE): Promise<SyncStore> => {
+  if (!runningPull) {
+    runningPull = fetchChanges(startDate).finally(() => {
+      runningPull = null
+    })
+  }
+  return runningPull
+}
+
+// Folgeseiten (next_cursor) werden vollständig geholt, bevor das Token gespeichert wird
+const fetchChanges = async (startDate: string): Promise<SyncStore> => {
+  let store = loadStore()
+  const since = store.token
+  let changes = await syncAPI.getChanges(since, startDate)
+
+  if (changes.reset) {
+    store = emptyStore()
+  }
+  mergeChanges(store.global_events, changes.global_events)
+  mergeChanges(store.monthly_locks, changes.monthly_locks)
+  mergeChanges(store.time_entries, changes.time_entries)
+  while (changes.next_cursor) {
+    changes = await syncAPI.getChanges(since, startDate, changes.next_cursor)
+    mergeChanges(store.time_entries, changes.time_entries)
+  }
+  store.token = changes.token
+
+  saveStore(store)
+  return store
+}
+
+// Offline-Änderung vormerken; der aktuelle Serverstand dient als Basis für die Konfliktprüfung.
+// Änderungen an einem noch nicht gesendeten Eintrag (negative ID) ändern dessen Vormerkung.
+export const queueEdit = (edit: OfflineEdit) => {
+  let queue = loadQueue()
+  if (edit.op !== 'create' && edit.id < 0) {
+    const id = edit.id
+    queue = edit.op === 'delete'
+      ? queue.filter(queued => !(queued.op === 'create' && queued.local_id === id))
+      : queue.map(queued => queued.op === 'create' && queued.local_id === id ? { ...queued, entry: edit.entry } : queued)
+    saveQueue(queue)
+    return
+  }
+  if (edit.op !== 'create' && edit.base_updated_at === undefined) {
+    edit.base_updated_at = loadStore().time_entries[edit.id]?.updated_at
+  }
+  queue.push(edit)
+  saveQueue(queue)
+}
+
+// Lokaler Bestand mit den vorgemerkten Offline-Änderungen
+export const getLocalTimeEntries = (): SyncedTimeEntry[] => {
+  const entries = { ...loadStore().time_entries }
+  for (const edit of loadQueue()) {
+    if (edit.op === 'create') {
+      entries[edit.local_id] = { ...edit.entry, id: edit.local_id, user_id: edit.user_id, is_locked: false }
+    } else if (edit.op === 'update' && entries[edit.id]) {
+      entries[edit.id] = { ...entries[edit.id], ...edit.entry }
+    } else if (edit.op === 'delete') {
+      delete entries[edit.id]
+    }
+  }
+  return Object.values(entries)
+}
+
+// Zeiteinträge für die Ansichten: vorgemerkte Änderungen einspielen bzw. das Delta
+// holen und lokal filtern. Ohne Verbindung wird der letzte Stand angezeigt.
+export const loadTimeEntries = async (params: {
+  user_id?: number
+  start_date?: string
+  end_date?: string
+}): Promise<TimeEntry[]> => {
+  if (!params.start_date || params.start_date < SYNC_START_DATE) {
+    return timeEntriesAPI.getTimeEntries(params)
+  }
+
+  try {
+    if (loadQueue().length > 0) {
+      const conflicts = await sync()
+      if (conflicts.length > 0) {
+        console.warn('Offline changes discarded due to conflicts:', conflicts)
+      }
+    } else {
+      await pull()
+    }
+  } catch (error: any) {
+    if (!isNetworkError(error)) {
+      throw error
+    }
+  }
+
+  return getLocalTimeEntries()
+    .filter(entry =>
+      (params.user_id === undefined || entry.user_id === params.user_id) &&
+      entry.date >= params.start_date! &&
+      (!params.end_date || entry.date <= params.end_date)
+    )
+    .sort((a, b) => a.date.localeCompare(b.date) || a.id - b.id)
+}
+
+// Speichern für die Ansichten: ohne Verbindung wird die Änderung vorgemerkt
+export const saveTimeEntry = async (entry: TimeEntryInput, editEntry?: TimeEntry): Promise<void> => {
+  try {
+    if (editEntry && editEntry.id > 0) {
+      await timeEntriesAPI.updateTimeEntry(editEntry.id, entry)
+    } else if (!editEntry) {
+      await timeEntriesAPI.createTimeEntry(entry)
+    } else {
+      queueEdit({ op: 'update', id: editEntry.id, entry, queued_at: new Date().toISOString() })
+    }
+  } catch (error: any) {
+    if (!isNetworkError(error)) {
+      throw error
+    }
+    const queued_at = new Date().toISOString()
+    queueEdit(editEntry
+      ? { op: 'update', id: editEntry.id, entry, queued_at }
+      : { op: 'create', local_id: -Date.now(), entry, user_id: currentUserId()!, queued_at })
+  }
+}
+
+export const deleteTimeEntry = async (id: number): Promise<void> => {
+  try {
+    if (id < 0) {
+      queueEdit({ op: 'delete', id, queued_at: new Date().toISOString() })
+    } else {
+      await timeEntriesAPI.deleteTimeEntry(id)
+    }
+  } catch (error: any) {
+    if (!isNetworkError(error)) {
+      throw error
+    }
+    queueEdit({ op: 'delete', id, queued_at: new Date().toISOString() })
+  }
+}
+
+const checkConflict = (store: SyncStore, edit: OfflineEdit): SyncConflict | null => {
+  if (edit.op === 'create') {
+    return isMonthLocked(store, edit.user_id, edit.entry.date) ? { edit, reason: 'locked' } : null
+  }
+
+  const server = store.time_entries[edit.id]
+  if (!server) {
+    return { edit, reason: 'deleted' }
+  }
+  if (server.is_locked || isMonthLocked(store, server.user_id, server.date)) {
+    return { edit, reason: 'locked', server }
+  }
+  if (edit.op === 'update' && isMonthLocked(store, server.user_id, edit.entry.date)) {
+    return { edit, reason: 'locked', server }
+  }
+  if (server.updated_at !== edit.base_updated_at) {
+    return { edit, reason: 'modified', server }
+  }
+  return null
+}
+
+// Warteschlange einspielen und anschließend den Bestand erneut abgleichen
+// (ohne vorgemerkte Änderungen kein Abruf, die Ansichten holen das Delta selbst)
+export const sync = (): Promise<SyncConflict[]> => {
+  if (loadQueue().length === 0) {
+    return Promise.resolve([])
+  }
+  if (!runningSync) {
+    runningSync = replayQueue().finally(() => {
+      runningSync = null
+    })
+  }
+  return runningSync
+}
+
+const replayQueue = async (): Promise<SyncConflict[]> => {
+  const store = await pull()
+  const conflicts: SyncConflict[] = []
+  const queue = loadQueue()
+
+  for (const edit of queue) {
+    const conflict = checkConflict(store, edit)
+    if (conflict) {
+      conflicts.push(conflict)
+      continue
+    }
+
+    try {
+      if (edit.op === 'create') {
+        await timeEntriesAPI.createTimeEntry(edit.entry)
+      } else if (edit.op === 'update') {
+        await timeEntriesAPI.updateTimeEntry(edit.id, edit.entry, store.time_entries[edit.id].version)
+      } else {
+        await timeEntriesAPI.deleteTimeEntry(edit.id)
+      }
+    } catch (error: any) {
+      // Ablehnungen durch den Server (z.B. inzwischen abgeschlossen) sind Konflikte,
+      // Netzwerkfehler brechen ab und lassen den Rest in der Warteschlange
+      const status = error.response?.status
+      if (status && status >= 400 && status < 500) {
+        conflicts.push({ edit, reason: 'rejected', server: store.time_entries[(edit as any).id] })
+        continue
+      }
+      saveQueue(queue.slice(queue.indexOf(edit)))
+      throw error
+    }
+  }
+
+  // Während des Einspielens neu vorgemerkte Änderungen bleiben erhalten
+  saveQueue(loadQueue().slice(queue.length))
+  await pull()
+  return conflicts
+}
+
+// Lokalen Bestand des angemeldeten Benutzers verwerfen (beim Logout, vor dem Entfernen von 'user')
+export const resetSync = () => {
+  localStorage.removeItem(userKey(STORE_KEY))
+  localStorage.removeItem(userKey(QUEUE_KEY))
+  localStorage.removeItem(STORE_KEY)
+  localStorage.removeItem(QUEUE_KEY)
+}
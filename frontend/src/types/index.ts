@@ -21,6 +21,7 @@ export interface TimeEntry {
   days: number
   description?: string
   is_locked: boolean
+  version?: number
 }
 
 export interface WeeklyStatistics {
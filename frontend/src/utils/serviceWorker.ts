@@ -1,5 +1,7 @@
 // Service Worker Manager für Kita Dienstplan PWA
 
+import { sync } from '../services/sync';
+
 const isLocalhost = Boolean(
   window.location.hostname === 'localhost' ||
   window.location.hostname === '[::1]' ||
@@ -206,6 +208,17 @@ class ServiceWorkerManager {
   
   // Offline-Aktionen synchronisieren
   private async syncOfflineActions(): Promise<void> {
+    if (localStorage.getItem('token')) {
+      try {
+        const conflicts = await sync();
+        if (conflicts.length > 0) {
+          console.warn('Offline changes discarded due to conflicts:', conflicts);
+        }
+      } catch (error) {
+        console.error('Delta sync failed:', error);
+      }
+    }
+    
     if (this.registration && 'sync' in this.registration) {
       try {
         await this.registration.sync.register('sync-offline-actions');